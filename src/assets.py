@@ -0,0 +1,196 @@
+import os
+import shutil
+
+from manifest import hash_file
+
+
+def check_tree_paths(source, destination):
+    # Normalize to absolute paths once per tree, not once per file.
+    source_abs = os.path.abspath(source)
+    dest_abs = os.path.abspath(destination)
+    cwd = os.path.abspath(os.curdir)
+
+    # Safety: Both must be inside cwd
+    if not source_abs.startswith(cwd + os.sep):
+        raise ValueError(f"source outside project: {source_abs}")
+    if not dest_abs.startswith(cwd + os.sep):
+        raise ValueError(f"destination outside project: {dest_abs}")
+
+    # Safety: destination must not *contain* source (would recurse into itself)
+    if source_abs.startswith(dest_abs + os.sep):
+        raise ValueError("destination may not be an ancestor of source")
+    if dest_abs.startswith(source_abs + os.sep):
+        raise ValueError("destination may not be inside source")
+
+
+def walk_files(root):
+    # Relative paths of every file under root, in a stable order.
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            paths.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return paths
+
+
+def copy_file(source, destination):
+    # copy_file_range keeps the data in the kernel and lets filesystems that
+    # support it (btrfs, xfs, nfs) share extents instead of copying bytes.
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        copied = False
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                    pass
+                copied = True
+            except OSError:
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        if not copied:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    # Matching mtimes is what lets the next sync skip this file.
+    shutil.copystat(source, destination)
+
+
+def place_file(source, destination, *, link=False):
+    # The file is put together next to destination and renamed over it, so
+    # nothing ever sees it half written.
+    parent = os.path.dirname(destination)
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = destination + ".tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    if link:
+        try:
+            os.link(source, tmp_path)
+            os.replace(tmp_path, destination)
+            return
+        except OSError:
+            # Different filesystem, or links not supported: copy instead.
+            pass
+    copy_file(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def same_contents(path, other):
+    # Sizes first, so most changed files are told apart without reading them.
+    try:
+        if os.path.getsize(path) != os.path.getsize(other):
+            return False
+    except FileNotFoundError:
+        return False
+    return hash_file(path) == hash_file(other)
+
+
+def replace_if_changed(tmp_path, path):
+    # Renames a freshly written tmp_path over path, unless path already has
+    # the same bytes: then path is left alone, mtime and all, so deploys that
+    # compare files see nothing to upload. Returns whether path changed.
+    if same_contents(tmp_path, path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def is_unchanged(
+    source_stat, destination, previous=None, *, verify_hash=False, source=None
+):
+    try:
+        dest_stat = os.stat(destination)
+    except FileNotFoundError:
+        return False
+    if dest_stat.st_size != source_stat.st_size:
+        return False
+    if dest_stat.st_mtime_ns != output_mtime(source_stat, previous):
+        return False
+    if verify_hash:
+        return hash_file(source) == hash_file(destination)
+    return True
+
+
+def output_mtime(source_stat, previous):
+    # An output is normally stamped with its source's mtime. One left in
+    # place because its source was only touched keeps its own, which the
+    # entry records as "output_mtime" for as long as the source stays put.
+    if (
+        previous is not None
+        and "output_mtime" in previous
+        and previous.get("size") == source_stat.st_size
+        and previous.get("mtime") == source_stat.st_mtime_ns
+    ):
+        return previous["output_mtime"]
+    return source_stat.st_mtime_ns
+
+
+def sync_file(source, destination, previous=None, *, verify_hash=False, link=False):
+    # Returns the manifest entry for the asset and whether it was copied.
+    source_stat = os.stat(source)
+    entry = {
+        "kind": "asset",
+        "source": source,
+        "size": source_stat.st_size,
+        "mtime": source_stat.st_mtime_ns,
+    }
+    unchanged = is_unchanged(
+        source_stat, destination, previous, verify_hash=verify_hash, source=source
+    )
+    if unchanged:
+        mtime = output_mtime(source_stat, previous)
+        if mtime != source_stat.st_mtime_ns:
+            entry["output_mtime"] = mtime
+        # The hash is reused while the source's size and mtime match.
+        if (
+            previous is not None
+            and previous.get("size") == entry["size"]
+            and previous.get("mtime") == entry["mtime"]
+            and previous.get("hash")
+        ):
+            entry["hash"] = previous["hash"]
+        else:
+            entry["hash"] = hash_file(source)
+        return entry, False
+
+    entry["hash"] = hash_file(source)
+    try:
+        dest_stat = os.stat(destination)
+    except FileNotFoundError:
+        dest_stat = None
+    # A file that was only touched keeps its old output, mtime and all, so
+    # deploys don't see it as changed. The entry remembers that output's
+    # mtime, so it isn't compared again on every later sync.
+    copied = not (
+        dest_stat is not None
+        and dest_stat.st_size == source_stat.st_size
+        and hash_file(destination) == entry["hash"]
+    )
+    if copied:
+        place_file(source, destination, link=link)
+    elif dest_stat.st_mtime_ns != source_stat.st_mtime_ns:
+        entry["output_mtime"] = dest_stat.st_mtime_ns
+    return entry, copied
+
+
+def sync_filetree(
+    source, destination, previous=None, *, skip=(), verify_hash=False, link=False
+):
+    # Brings destination up to date with source and returns the manifest
+    # entries keyed by relative path. Removing outputs whose sources are
+    # gone is left to the caller, which knows what else lives in
+    # destination.
+    check_tree_paths(source, destination)
+    previous = previous or {}
+    entries = {}
+    for rel_path in walk_files(source):
+        if rel_path in skip:
+            continue
+        entries[rel_path], _ = sync_file(
+            os.path.join(source, rel_path),
+            os.path.join(destination, rel_path),
+            previous.get(rel_path),
+            verify_hash=verify_hash,
+            link=link,
+        )
+    return entries
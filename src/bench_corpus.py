@@ -0,0 +1,116 @@
+import os
+import random
+
+# Deterministic markdown for the benchmarks: the same seed and size always
+# give the same bytes, so timings from different runs and machines compare
+# like with like.
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog elf ring tower river forge "
+    "mountain shadow king queen sword lantern road journey council fellowship "
+    "wizard hobbit dragon gold silver mirror star forest bridge gate"
+).split()
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def inline_text(rng, words=24):
+    # Dense inline markup: most runs of a few words get bold, italic, code,
+    # a link or an image.
+    parts = []
+    remaining = words
+    while remaining > 0:
+        run = sentence(rng, min(remaining, rng.randint(1, 4)))
+        remaining -= 4
+        kind = rng.randrange(6)
+        if kind == 0:
+            run = f"**{run}**"
+        elif kind == 1:
+            run = f"_{run}_"
+        elif kind == 2:
+            run = f"`{run}`"
+        elif kind == 3:
+            run = f"[{run}](/blog/{rng.choice(WORDS)})"
+        elif kind == 4:
+            run = f"![{run}](/images/{rng.choice(WORDS)}.png)"
+        parts.append(run)
+    return " ".join(parts)
+
+
+def paragraph(rng):
+    lines = [inline_text(rng) for _ in range(rng.randint(2, 5))]
+    return "\n".join(lines)
+
+
+def unordered_list(rng, items=40):
+    return "\n".join(f"- {inline_text(rng, 8)}" for _ in range(items))
+
+
+def ordered_list(rng, items=40):
+    return "\n".join(f"{i}. {inline_text(rng, 8)}" for i in range(1, items + 1))
+
+
+def quote(rng):
+    return "\n".join(f"> {inline_text(rng, 16)}" for _ in range(rng.randint(2, 6)))
+
+
+def code(rng):
+    body = "\n".join(
+        f"    {rng.choice(WORDS)}({i}, [link](/x)) # **not bold**"
+        for i in range(rng.randint(3, 15))
+    )
+    return f"```python\n{body}\n\n    return None\n```"
+
+
+def section(rng):
+    blocks = [f"## {sentence(rng, 4)}"]
+    for _ in range(rng.randint(3, 8)):
+        kind = rng.randrange(10)
+        if kind < 5:
+            blocks.append(paragraph(rng))
+        elif kind == 5:
+            blocks.append(unordered_list(rng, rng.randint(5, 60)))
+        elif kind == 6:
+            blocks.append(ordered_list(rng, rng.randint(5, 60)))
+        elif kind == 7:
+            blocks.append(quote(rng))
+        else:
+            blocks.append(code(rng))
+    return "\n\n".join(blocks)
+
+
+def make_document(size, seed=0):
+    # A page of at least size bytes, cut at a section boundary.
+    rng = random.Random(seed)
+    parts = [f"# {sentence(rng, 5)}"]
+    total = len(parts[0])
+    while total < size:
+        part = section(rng)
+        parts.append(part)
+        total += len(part) + 2
+    return "\n\n".join(parts) + "\n"
+
+
+def write_site(root, pages, seed=0, page_size=4096):
+    # content/, static/ and template.html under root, laid out the way
+    # main.py expects, with pages spread over nested directories.
+    rng = random.Random(seed)
+    for index in range(pages):
+        directory = os.path.join(
+            root, "content", f"section-{index % 50:02}", f"page-{index:06}"
+        )
+        os.makedirs(directory, exist_ok=True)
+        size = rng.randint(page_size // 2, page_size * 2)
+        with open(os.path.join(directory, "index.md"), "w") as f:
+            f.write(make_document(size, seed=rng.getrandbits(32)))
+    os.makedirs(os.path.join(root, "static"), exist_ok=True)
+    with open(os.path.join(root, "static", "index.css"), "w") as f:
+        f.write("body { font-family: serif; }\n" * 64)
+    with open(os.path.join(root, "template.html"), "w") as f:
+        f.write(
+            "<!doctype html>\n<html>\n<head><title>{{ Title }}</title>"
+            '<link href="/index.css" rel="stylesheet" /></head>\n'
+            "<body><article>{{ Content }}</article></body>\n</html>\n"
+        )
@@ -0,0 +1,77 @@
+import sys
+import tracemalloc
+
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+
+# Bytes per node for a large tree, with the slotted node classes against
+# the same classes given back a per-instance __dict__.
+#
+#   python3 src/bench_memory.py [nodes]
+
+
+class DictLeafNode(LeafNode):
+    pass
+
+
+class DictParentNode(ParentNode):
+    pass
+
+
+class DictTextNode(TextNode):
+    pass
+
+
+def build_tree(count, leaf_cls, parent_cls):
+    # Paragraphs of ten leaves, with a link every so often, the shape
+    # markdown_to_html_node produces for long pages.
+    paragraphs = []
+    built = 0
+    while built < count:
+        children = []
+        for index in range(9):
+            if index == 4:
+                children.append(leaf_cls("a", "a link", {"href": "/blog/tom"}))
+            else:
+                children.append(leaf_cls(None, "some text"))
+        paragraphs.append(parent_cls("p", children))
+        built += 10
+    return parent_cls("div", paragraphs), built + 1
+
+
+def build_text_nodes(count, text_cls):
+    return [text_cls("some text", TextType.TEXT) for _ in range(count)], count
+
+
+def measure(build, *args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree, nodes = build(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tree
+    return (after - before) / nodes
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 100_000
+    rows = [
+        (
+            "HTML tree",
+            measure(build_tree, count, DictLeafNode, DictParentNode),
+            measure(build_tree, count, LeafNode, ParentNode),
+        ),
+        (
+            "TextNodes",
+            measure(build_text_nodes, count, DictTextNode),
+            measure(build_text_nodes, count, TextNode),
+        ),
+    ]
+    print(f"{count} nodes, bytes per node")
+    print(f"{'':12} {'__dict__':>10} {'__slots__':>10}")
+    for name, before, after in rows:
+        print(f"{name:12} {before:10.1f} {after:10.1f}  {1 - after / before:6.1%} less")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,106 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+from htmlnode import ParentNode
+from textnode import markdown_to_html_node
+
+# Compares the streaming serializer against the recursive string
+# concatenation that ParentNode.to_html used to do.
+#
+#   python3 src/bench_serializer.py [megabytes]
+
+
+def make_document(megabytes):
+    paragraph = (
+        "This is **bold text** with an _italic_ word, some `inline code` and a "
+        "[link to the blog](/blog/tom) next to ![an image](/images/tom.png).\n"
+        "The paragraph keeps going on a second line so it has some weight.\n\n"
+    )
+    items = "".join(f"- list item number {i} with **markup**\n" for i in range(20))
+    section = "## A section heading\n\n" + paragraph * 8 + items + "\n"
+    target = megabytes * 1024 * 1024
+    return "# Benchmark\n\n" + section * (target // len(section) + 1)
+
+
+def concat_to_html(node):
+    if not isinstance(node, ParentNode):
+        return node.to_html()
+    children_html = ""
+    for child in node.children:
+        children_html += concat_to_html(child)
+    return f"<{node.tag}{node.props_to_html()}>{children_html}</{node.tag}>"
+
+
+def best_of(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def nest(node, depth):
+    # Wrapping the document in a few levels of sections is where recursive
+    # concatenation hurts: every level copies everything below it again.
+    for _ in range(depth):
+        node = ParentNode("section", [node])
+    return node
+
+
+def run(label, node):
+    expected = concat_to_html(node)
+    assert node.to_html() == expected
+
+    def write_html():
+        stream = io.StringIO()
+        node.write_html(stream)
+        return stream
+
+    assert write_html().getvalue() == expected
+
+    def write_file():
+        with open(os.devnull, "w") as f:
+            node.write_html(f)
+
+    cases = [
+        ("recursive concat", lambda: concat_to_html(node)),
+        ("to_html", node.to_html),
+        ("write_html(StringIO)", write_html),
+        ("write_html(file)", write_file),
+    ]
+    print(f"{label}: {len(expected) / 1e6:.1f} MB html")
+    baseline = None
+    for name, func in cases:
+        seconds = best_of(func)
+        peak = peak_memory(func)
+        baseline = baseline or seconds
+        print(
+            f"  {name:22} {seconds * 1000:8.1f} ms  {baseline / seconds:5.2f}x"
+            f"  peak {peak / 1e6:7.1f} MB"
+        )
+
+
+def main(argv):
+    megabytes = int(argv[0]) if argv else 4
+    markdown = make_document(megabytes)
+    node = markdown_to_html_node(markdown)
+    print(f"markdown: {len(markdown) / 1e6:.1f} MB")
+    run("flat document", node)
+    run("nested 32 deep", nest(node, 32))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
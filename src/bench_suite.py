@@ -0,0 +1,263 @@
+import argparse
+import fnmatch
+import gc
+import io
+import itertools
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import main as site
+from bench_corpus import make_document, write_site
+from textnode import markdown_to_html_node
+
+# Times the markdown pipeline on a generated corpus and compares the results
+# with the baseline stored next to this file.
+#
+#   python3 src/bench_suite.py                  # quick cases, print timings
+#   python3 src/bench_suite.py --check          # fail on regressions
+#   python3 src/bench_suite.py --update         # record a new baseline
+#   python3 src/bench_suite.py --scale full     # add 100k pages and 50 MB
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json"
+)
+
+KB = 1024
+MB = 1024 * KB
+DOCUMENT_SIZES = {
+    "quick": [1 * KB, 64 * KB, 1 * MB],
+    "full": [1 * KB, 64 * KB, 1 * MB, 50 * MB],
+}
+SITE_SIZES = {
+    "quick": [10, 1000],
+    "full": [10, 1000, 100_000],
+}
+
+
+def size_label(size):
+    if size >= MB:
+        return f"{size // MB}MB"
+    return f"{size // KB}KB"
+
+
+def best_of(func, repeat, min_sample=0.05):
+    # Seconds per call: the fastest of repeat samples, where quick functions
+    # are called in a loop until a sample is long enough to time reliably.
+    # Like timeit, the cyclic garbage collector is kept out of the samples.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _best_of(func, repeat, min_sample)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _best_of(func, repeat, min_sample):
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+    loops = max(1, int(min_sample / max(first, 1e-9)))
+    best = first
+    for _ in range(repeat - 1 if loops == 1 else repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = (time.perf_counter() - start) / loops
+        best = min(best, elapsed)
+    return best
+
+
+def repeats_for(size):
+    # Enough samples to get a steady minimum without the big cases taking
+    # minutes.
+    if size <= 1 * MB:
+        return 7
+    return 1
+
+
+def calibrate():
+    # A fixed chunk of pure Python work. Timings are stored relative to it,
+    # so a baseline recorded on one machine still means something on a
+    # faster or slower one.
+    def work():
+        total = 0
+        parts = []
+        for i in range(200_000):
+            total += i % 7
+            parts.append(str(i))
+        return "".join(parts), total
+
+    return best_of(work, 3)
+
+
+def wanted(name, pattern):
+    return pattern is None or fnmatch.fnmatch(name, pattern)
+
+
+def document_cases(sizes, workdir, pattern):
+    template_path = os.path.join(workdir, "template.html")
+    with open(template_path, "w") as f:
+        f.write("<html><head><title>{{ Title }}</title></head>")
+        f.write("<body>{{ Content }}</body></html>\n")
+    for size in sizes:
+        label = size_label(size)
+        if not any(
+            wanted(f"{stage}/doc-{label}", pattern)
+            for stage in ["markdown_to_html_node", "to_html", "generate_page"]
+        ):
+            continue
+        markdown = make_document(size)
+        repeat = repeats_for(size)
+        node = markdown_to_html_node(markdown)
+        source = os.path.join(workdir, f"doc-{label}.md")
+        with open(source, "w") as f:
+            f.write(markdown)
+        dest = os.path.join(workdir, f"doc-{label}.html")
+        yield f"markdown_to_html_node/doc-{label}", repeat, lambda m=markdown: (
+            markdown_to_html_node(m)
+        )
+        yield f"to_html/doc-{label}", repeat, node.to_html
+        yield f"generate_page/doc-{label}", repeat, lambda s=source, d=dest: (
+            site.generate_page(s, template_path, d, "/")
+        )
+
+
+def site_cases(sizes, workdir, jobs, pattern):
+    for pages in sizes:
+        if not wanted(f"main/site-{pages}", pattern):
+            continue
+        root = os.path.join(workdir, f"site-{pages}")
+        write_site(root, pages)
+        repeat = 5 if pages <= 10 else 2 if pages <= 1000 else 1
+        argv = ["/"] if jobs == 1 else ["/", "--jobs", str(jobs)]
+
+        def build(root=root, argv=argv):
+            cwd = os.getcwd()
+            os.chdir(root)
+            try:
+                with redirect_stdout(io.StringIO()):
+                    site.main(argv)
+            finally:
+                os.chdir(cwd)
+
+        yield f"main/site-{pages}", repeat, build
+
+
+def run_cases(cases, pattern, rounds):
+    # Cases are generated lazily, so each corpus is only written when it is
+    # about to be timed. A busy machine speeds up and slows down by a third
+    # over a run, so every round calibrates right before timing the case
+    # and the case keeps the median of its times relative to that. Returns
+    # the results and the median calibration they are scaled back by.
+    relative = {}
+    calibrations = []
+    for name, repeat, func in cases:
+        if not wanted(name, pattern):
+            continue
+        ratios = []
+        for _ in range(rounds):
+            calibrations.append(calibrate())
+            ratios.append(best_of(func, repeat) / calibrations[-1])
+        relative[name] = statistics.median(ratios)
+        seconds = relative[name] * statistics.median(calibrations)
+        print(f"  {name:36} {seconds * 1000:10.1f} ms", flush=True)
+    calibration = statistics.median(calibrations or [calibrate()])
+    results = {name: ratio * calibration for name, ratio in relative.items()}
+    return results, calibration
+
+
+def compare(results, calibration, baseline, tolerance):
+    # Returns the cases that got slower than the baseline allows, after
+    # scaling the baseline by how fast this machine is.
+    scale = calibration / baseline["calibration"]
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        expected = baseline["cases"].get(name)
+        if expected is None:
+            continue
+        ratio = seconds / (expected * scale)
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="bench_suite.py")
+    parser.add_argument("--scale", choices=["quick", "full"], default="quick")
+    parser.add_argument(
+        "--case", metavar="PATTERN", help="only run cases matching this glob"
+    )
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N")
+    parser.add_argument(
+        "--check", action="store_true", help="exit 1 if a case regressed"
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="store the results as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline (default 0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=3,
+        metavar="N",
+        help="time every case N times and keep the median (default 3)",
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH, metavar="FILE")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    # The builds' own summaries would drown out the timings.
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = itertools.chain(
+            document_cases(DOCUMENT_SIZES[args.scale], workdir, args.case),
+            site_cases(SITE_SIZES[args.scale], workdir, args.jobs, args.case),
+        )
+        results, calibration = run_cases(cases, args.case, args.rounds)
+    print(f"calibration: {calibration * 1000:.1f} ms")
+
+    if args.update:
+        cases = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                old = json.load(f)
+            # Keep the cases that weren't rerun, rescaled to this machine.
+            scale = calibration / old["calibration"]
+            cases = {name: seconds * scale for name, seconds in old["cases"].items()}
+        cases.update(results)
+        baseline = {"calibration": calibration, "cases": dict(sorted(cases.items()))}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Wrote baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --update")
+        return 1 if args.check else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, calibration, baseline, args.tolerance)
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x the baseline")
+    if args.check and regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,70 @@
+import json
+import os
+
+from assets import walk_files
+from manifest import MANIFEST_NAME
+
+# What a build changed in its output root, so deploys can upload just that
+# (rsync --files-from, object store syncs) instead of the whole site.
+# Outputs whose bytes didn't change are never rewritten (see
+# replace_if_changed), so any file whose size, mtime or inode moved between
+# the snapshots before and after a build was really written.
+
+CHANGES_NAME = ".changes.json"
+
+
+def snapshot_outputs(dest_path):
+    files = {}
+    if not os.path.isdir(dest_path):
+        return files
+    for rel_path in walk_files(dest_path):
+        if rel_path in (MANIFEST_NAME, CHANGES_NAME):
+            continue
+        stat = os.stat(os.path.join(dest_path, rel_path))
+        files[rel_path.replace(os.sep, "/")] = (
+            stat.st_size,
+            stat.st_mtime_ns,
+            stat.st_ino,
+        )
+    return files
+
+
+def refresh_outputs(files, dest_path, rel_paths):
+    # For a process that keeps the snapshot of its output root between
+    # builds (--watch, the daemon): re-stats just the outputs a build
+    # touched, updates files to match and returns what changed, without
+    # walking the rest of the tree.
+    before = {}
+    after = {}
+    for rel_path in rel_paths:
+        rel_path = rel_path.replace(os.sep, "/")
+        if rel_path in files:
+            before[rel_path] = files.pop(rel_path)
+        try:
+            stat = os.stat(os.path.join(dest_path, rel_path))
+        except FileNotFoundError:
+            continue
+        after[rel_path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    files.update(after)
+    return diff_outputs(before, after)
+
+
+def diff_outputs(before, after):
+    return {
+        "added": sorted(set(after) - set(before)),
+        "modified": sorted(
+            rel_path
+            for rel_path, stat in after.items()
+            if rel_path in before and before[rel_path] != stat
+        ),
+        "deleted": sorted(set(before) - set(after)),
+    }
+
+
+def write_changes(dest_path, changes):
+    path = os.path.join(dest_path, CHANGES_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(changes, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,143 @@
+import gzip
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from assets import replace_if_changed, walk_files
+
+# Sibling suffix and compressor for each precompressed variant. gzip gets a
+# fixed mtime so unchanged inputs give byte-identical .gz files.
+VARIANTS = [
+    (".gz", lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)),
+    (".zz", lambda data, level: zlib.compress(data, level)),
+]
+VARIANT_SUFFIXES = tuple(suffix for suffix, _ in VARIANTS)
+
+# Only text formats are worth it; images and fonts are already compressed.
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".html",
+    ".js",
+    ".json",
+    ".map",
+    ".svg",
+    ".txt",
+    ".xml",
+}
+
+
+def is_compressible(rel_path):
+    name = os.path.basename(rel_path)
+    if name.startswith("."):
+        return False
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def compress_file(path, level, suffixes=VARIANT_SUFFIXES):
+    # Returns the suffixes of the variants that were worth writing.
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for suffix, compress in VARIANTS:
+        if suffix not in suffixes:
+            continue
+        compressed = compress(data, level)
+        if len(compressed) >= len(data):
+            # No gain, so don't make clients decode it.
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            continue
+        tmp_path = path + suffix + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        replace_if_changed(tmp_path, path + suffix)
+        written.append(suffix)
+    return written
+
+
+def remove_variants(path, suffixes=VARIANT_SUFFIXES):
+    for suffix in suffixes:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def precompress_tree(
+    root, previous=None, outputs=(), *, paths=None, level=9, min_size=1024, jobs=1
+):
+    # Writes .gz/.zz siblings for text outputs of at least min_size bytes and
+    # returns what was compressed, keyed by relative path, for the build
+    # manifest. Outputs whose size, mtime and level match previous are
+    # skipped; variants left behind by deleted or shrunk outputs are removed.
+    # A variant listed in outputs was written by the build itself (a .gz
+    # shipped as a static asset, say), so it is never replaced or removed.
+    # With paths, only those outputs (and their variants) are looked at and
+    # the rest keep their entries from previous, so a rebuild that touched
+    # a few outputs doesn't walk the whole tree.
+    previous = previous or {}
+    compressed = {}
+    if paths is None:
+        rel_paths = walk_files(root)
+    else:
+        paths = set(paths)
+        compressed = {
+            rel_path: entry
+            for rel_path, entry in previous.items()
+            if rel_path not in paths
+        }
+        rel_paths = sorted(
+            {
+                candidate
+                for rel_path in paths
+                for candidate in [rel_path]
+                + [rel_path + suffix for suffix in VARIANT_SUFFIXES]
+                if os.path.isfile(os.path.join(root, candidate))
+            }
+        )
+    pending = []
+    for rel_path in rel_paths:
+        path = os.path.join(root, rel_path)
+        if rel_path.endswith(VARIANT_SUFFIXES):
+            base = path[: path.rindex(".")]
+            if (
+                rel_path not in outputs
+                and is_compressible(base)
+                and not os.path.exists(base)
+            ):
+                os.remove(path)
+            continue
+        if not is_compressible(rel_path):
+            continue
+        suffixes = tuple(
+            suffix for suffix in VARIANT_SUFFIXES if rel_path + suffix not in outputs
+        )
+        stat = os.stat(path)
+        if stat.st_size < min_size:
+            remove_variants(path, suffixes)
+            continue
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "level": level}
+        old = previous.get(rel_path)
+        if (
+            old is not None
+            and all(old.get(key) == value for key, value in entry.items())
+            and all(os.path.exists(path + suffix) for suffix in old["variants"])
+            and all(suffix in suffixes for suffix in old["variants"])
+        ):
+            compressed[rel_path] = old
+            continue
+        compressed[rel_path] = entry
+        pending.append((rel_path, path, suffixes))
+
+    # zlib releases the GIL while it works, so threads compress in parallel
+    # without shipping file contents to other processes.
+    def run(job):
+        _, path, suffixes = job
+        return compress_file(path, level, suffixes)
+
+    if jobs > 1 and len(pending) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(run, pending))
+    else:
+        results = [run(job) for job in pending]
+    for (rel_path, _, _), variants in zip(pending, results):
+        compressed[rel_path]["variants"] = variants
+    return compressed
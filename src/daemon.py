@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+from render_cache import MEMORY_CACHE, block_cache_stats
+from watch import changed_paths, snapshot
+
+# A long-running builder for one site, driven over a Unix domain socket.
+# Requests and responses are single lines of JSON:
+#
+#   {"command": "build"}
+#   {"command": "rebuild-path", "paths": ["/abs/content/blog/tom/index.md"]}
+#   {"command": "status"}
+#   {"command": "stop"}
+#
+#   python3 src/main.py daemon start httpserver/ &
+#   python3 src/main.py daemon build
+#
+# The client side doesn't import the generator, so sending a command
+# costs little more than starting Python.
+
+DEFAULT_SOCKET = os.path.join(".cache", "build.sock")
+
+
+class BuildDaemon:
+    # Keeps what a fresh process would have to rebuild on every run: the
+    # build manifest, an index of the inputs' mtimes and sizes, and (in the
+    # modules' own process-wide caches) compiled templates, URL rewriters
+    # and rendered blocks (in memory unless --cache-dir puts them on disk),
+    # and a snapshot of the outputs. A build only stats the inputs and hands
+    # what changed to rebuild_paths, then precompresses and reports on just
+    # the outputs it touched, as --watch does.
+    def __init__(self, site, args):
+        self.site = site
+        self.args = args
+        self.inputs = [site.CONTENT_PATH, site.STATIC_PATH, site.TEMPLATE_PATH]
+        self.manifest = None
+        self.index = {}
+        self.files = None
+        # Set while a build runs, so the one after a failed build goes over
+        # the whole output tree: nobody knows what the failed one wrote.
+        self.running = False
+        self.started = time.time()
+        self.builds = 0
+        self.last_build = None
+
+    def build_options(self):
+        options = self.site.build_options(self.args)
+        if options["cache_dir"] is None:
+            options["cache_dir"] = MEMORY_CACHE
+        return options
+
+    def build(self):
+        site = self.site
+        start = time.perf_counter()
+        # Indexed before building, so edits made during the build are
+        # picked up by the next one.
+        index = snapshot(self.inputs)
+        previous = self.manifest
+        touched = None
+        failed, self.running = self.running, True
+        if self.manifest is None:
+            self.files = site.snapshot_outputs(site.DEST_PATH)
+            previous = site.load_manifest(site.DEST_PATH)
+            self.manifest = site.build_incremental(
+                site.STATIC_PATH,
+                site.CONTENT_PATH,
+                site.TEMPLATE_PATH,
+                site.DEST_PATH,
+                self.args.basepath,
+                verify_hash=self.args.verify_hash,
+                precompressed=self.args.precompress,
+                **self.build_options(),
+            )
+            changed = None
+            rendered = None
+        else:
+            changed = changed_paths(self.index, index)
+            rendered, touched = self.rebuild(changed)
+        self.index = index
+        self.finish(start, previous, None if failed else touched)
+        return self.finished(start, changed, rendered)
+
+    def rebuild_path(self, paths):
+        # Like build, but only for the paths the caller says changed.
+        if self.manifest is None:
+            return self.build()
+        start = time.perf_counter()
+        index = snapshot(paths)
+        # rebuild_paths works on files, so a directory stands for the files
+        # under it now and the ones the index had under it, which are gone.
+        known = [
+            indexed
+            for indexed in self.index
+            for path in paths
+            if indexed == path or indexed.startswith(path + os.sep)
+        ]
+        files = set(index) | set(known)
+        files.update(
+            path
+            for path in paths
+            if not os.path.isdir(path)
+            and not any(indexed.startswith(path + os.sep) for indexed in known)
+        )
+        failed, self.running = self.running, True
+        rendered, touched = self.rebuild(sorted(files))
+        for indexed in known:
+            self.index.pop(indexed, None)
+        self.index.update(index)
+        self.finish(start, self.manifest, None if failed else touched)
+        return self.finished(start, paths, rendered)
+
+    def rebuild(self, paths):
+        if not paths:
+            return [], []
+        site = self.site
+        return site.rebuild_paths(
+            self.manifest,
+            paths,
+            site.STATIC_PATH,
+            site.CONTENT_PATH,
+            site.TEMPLATE_PATH,
+            site.DEST_PATH,
+            self.args.basepath,
+            **self.build_options(),
+        )
+
+    def finish(self, start, previous, touched):
+        site = self.site
+        site.finish_build(
+            self.args, site.DEST_PATH, previous, self.manifest, touched=touched
+        )
+        site.report_build(self.args, site.DEST_PATH, self.files, start, touched)
+        self.running = False
+
+    def finished(self, start, changed, rendered):
+        self.builds += 1
+        self.last_build = {
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+            "changed": changed,
+            "pages": None if rendered is None else [dest for _, dest in rendered],
+        }
+        return self.last_build
+
+    def status(self):
+        outputs = self.manifest["outputs"] if self.manifest else {}
+        return {
+            "pid": os.getpid(),
+            "cwd": os.getcwd(),
+            "basepath": self.args.basepath,
+            "uptime_s": round(time.time() - self.started, 3),
+            "builds": self.builds,
+            "last_build": self.last_build,
+            "indexed_files": len(self.index),
+            "pages": sum(1 for entry in outputs.values() if entry["kind"] == "page"),
+            "outputs": len(outputs),
+            "block_cache": block_cache_stats(),
+        }
+
+    def handle(self, request):
+        command = request.get("command")
+        if command == "build":
+            return self.build()
+        if command == "rebuild-path":
+            paths = request.get("paths")
+            if not isinstance(paths, list) or not paths:
+                raise ValueError("rebuild-path needs a non-empty list of paths")
+            return self.rebuild_path([os.path.relpath(path) for path in paths])
+        if command == "status":
+            return self.status()
+        raise ValueError(f"unknown command: {command!r}")
+
+
+async def handle_connection(daemon, stop, reader, writer):
+    # Commands run one at a time on the event loop, so builds never overlap.
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+                if request.get("command") == "stop":
+                    response = {"ok": True}
+                    stop.set()
+                else:
+                    response = {"ok": True, "result": daemon.handle(request)}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+            if stop.is_set():
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def claim_socket(socket_path):
+    # A socket file nobody answers on is left over from a daemon that
+    # died; one that answers belongs to a running daemon.
+    if not os.path.exists(socket_path):
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+        return
+    raise Exception(f"a daemon is already listening on {socket_path}")
+
+
+async def run_daemon(daemon, socket_path, ready=None):
+    claim_socket(socket_path)
+    stop = asyncio.Event()
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_connection(daemon, stop, reader, writer),
+        socket_path,
+    )
+    if ready is not None:
+        ready()
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def start(socket_path, argv):
+    # Imported here rather than at the top so the client commands start fast.
+    import main as site
+
+    args = site.parse_args(argv)
+    daemon = BuildDaemon(site, args)
+    print(f"Build daemon for {os.getcwd()} listening on {socket_path}")
+    try:
+        asyncio.run(run_daemon(daemon, socket_path))
+    except KeyboardInterrupt:
+        pass
+
+
+def send_command(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise ConnectionError("daemon closed the connection without answering")
+    return json.loads(data)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="main.py daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start_parser = commands.add_parser(
+        "start", help="run the daemon; further arguments are main.py build options"
+    )
+    start_parser.add_argument("build_args", nargs=argparse.REMAINDER)
+    commands.add_parser("build", help="bring the site up to date")
+    rebuild = commands.add_parser("rebuild-path", help="rebuild for changed paths")
+    rebuild.add_argument("paths", nargs="+")
+    commands.add_parser("status", help="show what the daemon has loaded")
+    commands.add_parser("stop", help="shut the daemon down")
+    args = parser.parse_args(argv)
+
+    if args.command == "start":
+        start(args.socket, args.build_args)
+        return 0
+
+    request = {"command": args.command}
+    if args.command == "rebuild-path":
+        request["paths"] = [os.path.abspath(path) for path in args.paths]
+    try:
+        response = send_command(args.socket, request)
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"no daemon listening on {args.socket}", file=sys.stderr)
+        return 1
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        return 1
+    if "result" in response:
+        print(json.dumps(response["result"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,160 @@
+import datetime
+import os
+from xml.sax.saxutils import XMLGenerator
+
+from assets import replace_if_changed
+from manifest import hash_file
+from search import page_url
+
+# sitemap.xml and an Atom feed of the posts (feed.xml), written from the
+# pages a build already knows about rather than by crawling its output.
+# Both are streamed out element by element.
+#
+# A page's lastmod is kept in its manifest entry: the mtime its source
+# had when its contents last changed, so rebuilding an unchanged site
+# gives byte-identical files. Above MAX_URLS pages, sitemap.xml becomes
+# an index of sitemap-<n>.xml files holding MAX_URLS each.
+
+SITEMAP_NAME = "sitemap.xml"
+FEED_NAME = "feed.xml"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+MAX_URLS = 50000
+FEED_LENGTH = 20
+
+
+def lastmod(timestamp):
+    # W3C / RFC 3339 time in UTC, to the second.
+    moment = datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def is_sitemap(rel_path):
+    return rel_path == SITEMAP_NAME or (
+        rel_path.startswith("sitemap-") and rel_path.endswith(".xml")
+    )
+
+
+def is_feeds_file(rel_path):
+    return rel_path == FEED_NAME or is_sitemap(rel_path)
+
+
+def absolute_url(site_url, rel_path, basepath):
+    return site_url.rstrip("/") + page_url(rel_path, basepath)
+
+
+class XMLFile:
+    # An XMLGenerator writing to a temporary file that replaces path when
+    # closed, unless it came out the same.
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.xml = XMLGenerator(self.file, "utf-8", short_empty_elements=True)
+        self.xml.startDocument()
+
+    def start(self, name, attributes=None):
+        self.xml.startElement(name, attributes or {})
+
+    def end(self, name):
+        self.xml.endElement(name)
+
+    def element(self, name, text=None, attributes=None):
+        self.start(name, attributes)
+        if text is not None:
+            self.xml.characters(text)
+        self.end(name)
+
+    def close(self):
+        self.xml.endDocument()
+        self.file.write("\n")
+        self.file.close()
+        replace_if_changed(self.tmp_path, self.path)
+        return {"kind": "generated", "hash": hash_file(self.path)}
+
+
+def _write_urlset(path, urls):
+    out = XMLFile(path)
+    out.start("urlset", {"xmlns": SITEMAP_NS})
+    for url, modified in urls:
+        out.start("url")
+        out.element("loc", url)
+        if modified is not None:
+            out.element("lastmod", modified)
+        out.end("url")
+    out.end("urlset")
+    return out.close()
+
+
+def write_sitemaps(dest_path, site_url, basepath, pages):
+    # pages maps the output path of every page to list to its lastmod, or
+    # None. Returns the manifest entries.
+    urls = [
+        (absolute_url(site_url, rel_path, basepath), pages[rel_path])
+        for rel_path in sorted(pages)
+    ]
+    if len(urls) <= MAX_URLS:
+        return {
+            SITEMAP_NAME: _write_urlset(os.path.join(dest_path, SITEMAP_NAME), urls)
+        }
+
+    entries = {}
+    out = XMLFile(os.path.join(dest_path, SITEMAP_NAME))
+    out.start("sitemapindex", {"xmlns": SITEMAP_NS})
+    for number, start in enumerate(range(0, len(urls), MAX_URLS), start=1):
+        chunk = urls[start : start + MAX_URLS]
+        name = f"sitemap-{number}.xml"
+        entries[name] = _write_urlset(os.path.join(dest_path, name), chunk)
+        out.start("sitemap")
+        out.element("loc", absolute_url(site_url, name, basepath))
+        modified = [modified for _, modified in chunk if modified is not None]
+        if modified:
+            out.element("lastmod", max(modified))
+        out.end("sitemap")
+    out.end("sitemapindex")
+    entries[SITEMAP_NAME] = out.close()
+    return entries
+
+
+def write_feed(dest_path, site_url, basepath, title, posts, lastmods):
+    # An Atom feed of the newest posts (see listings.collect_posts), each
+    # updated at its page's lastmod. posts mustn't be empty: a feed has
+    # to say when it was last updated. Returns the manifest entry.
+    posts = posts[:FEED_LENGTH]
+    home = absolute_url(site_url, "index.html", basepath)
+    updated = []
+    for post in posts:
+        published = post["date"] + "T00:00:00Z"
+        updated.append(max(published, lastmods.get(post["path"]) or published))
+
+    out = XMLFile(os.path.join(dest_path, FEED_NAME))
+    out.start("feed", {"xmlns": ATOM_NS})
+    out.element("title", title)
+    out.element("id", home)
+    out.element("link", attributes={"href": home})
+    out.element(
+        "link",
+        attributes={
+            "rel": "self",
+            "href": absolute_url(site_url, FEED_NAME, basepath),
+        },
+    )
+    out.element("updated", max(updated))
+    out.start("author")
+    out.element("name", title)
+    out.end("author")
+    for post, modified in zip(posts, updated):
+        url = absolute_url(site_url, post["path"], basepath)
+        out.start("entry")
+        out.element("title", post["title"])
+        out.element("id", url)
+        out.element("link", attributes={"href": url})
+        out.element("published", post["date"] + "T00:00:00Z")
+        out.element("updated", modified)
+        if post["summary"]:
+            out.element("summary", post["summary"])
+        for tag in post["tags"]:
+            out.element("category", attributes={"term": tag})
+        out.end("entry")
+    out.end("feed")
+    return out.close()
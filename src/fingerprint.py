@@ -0,0 +1,196 @@
+import json
+import os
+
+from assets import (
+    check_tree_paths,
+    place_file,
+    replace_if_changed,
+    sync_file,
+    walk_files,
+)
+from manifest import hash_bytes, hash_file
+
+FINGERPRINT_LENGTH = 10
+ASSETS_NAME = ".assets.json"
+HEADERS_NAME = "_headers"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Files that are only ever reached through links a build rewrites. Anything
+# else (html, favicon.ico, robots.txt, ...) keeps its name, since something
+# outside the site may ask for it by that name.
+FINGERPRINT_EXTENSIONS = {
+    ".avif",
+    ".css",
+    ".gif",
+    ".jpeg",
+    ".jpg",
+    ".js",
+    ".png",
+    ".svg",
+    ".webp",
+    ".woff",
+    ".woff2",
+}
+
+
+def is_fingerprinted(rel_path):
+    return os.path.splitext(rel_path)[1].lower() in FINGERPRINT_EXTENSIONS
+
+
+def fingerprinted_path(rel_path, digest):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def site_url(rel_path):
+    return "/" + rel_path.replace(os.sep, "/")
+
+
+class AssetRewriter:
+    # URL hook that points links at fingerprinted assets, after an optional
+    # further hook. It is picklable for worker processes, and hashes by the
+    # asset map so it can key the rewriter, template and block caches.
+    def __init__(self, assets, rewrite_url=None):
+        self.assets = assets
+        self.rewrite_url = rewrite_url
+        hook = ""
+        if rewrite_url is not None:
+            hook = f"{rewrite_url.__module__}.{rewrite_url.__qualname__}"
+        self.cache_key = hash_bytes(json.dumps([assets, hook], sort_keys=True).encode())
+
+    def __call__(self, url):
+        if self.rewrite_url is not None:
+            url = self.rewrite_url(url)
+        end = len(url)
+        for mark in "?#":
+            index = url.find(mark)
+            if index != -1 and index < end:
+                end = index
+        fingerprinted = self.assets.get(url[:end])
+        if fingerprinted is None:
+            return url
+        return fingerprinted + url[end:]
+
+    def __eq__(self, other):
+        return isinstance(other, AssetRewriter) and self.cache_key == other.cache_key
+
+    def __hash__(self):
+        return hash(self.cache_key)
+
+
+def fingerprint_file(source, dest_root, rel_path, previous=None, *, link=False):
+    # Places source under its fingerprinted name and returns that relative
+    # path with the manifest entry. The hash is reused while the source's
+    # size and mtime match previous.
+    source_stat = os.stat(source)
+    if (
+        previous is not None
+        and previous.get("size") == source_stat.st_size
+        and previous.get("mtime") == source_stat.st_mtime_ns
+        and previous.get("hash")
+    ):
+        digest = previous["hash"]
+    else:
+        digest = hash_file(source)
+    out_rel = fingerprinted_path(rel_path, digest)
+    destination = os.path.join(dest_root, out_rel)
+    # The name says what the contents are, so an output of the right size
+    # is already right, even when the source was only touched.
+    try:
+        placed = os.path.getsize(destination) == source_stat.st_size
+    except FileNotFoundError:
+        placed = False
+    if not placed:
+        place_file(source, destination, link=link)
+    entry = {
+        "kind": "asset",
+        "source": source,
+        "size": source_stat.st_size,
+        "mtime": source_stat.st_mtime_ns,
+        "hash": digest,
+        "immutable": True,
+    }
+    return out_rel, entry
+
+
+def fingerprint_filetree(
+    source, destination, previous=None, *, skip=(), verify_hash=False, link=False
+):
+    # sync_filetree, except that assets of the fingerprinted types land at
+    # name.<hash>.ext. Returns the manifest entries keyed by output path and
+    # the asset map from original to fingerprinted site URLs.
+    check_tree_paths(source, destination)
+    previous = previous or {}
+    by_source = {
+        entry["source"]: entry
+        for entry in previous.values()
+        if entry.get("kind") == "asset" and entry.get("immutable")
+    }
+    entries = {}
+    assets = {}
+    for rel_path in walk_files(source):
+        if rel_path in skip:
+            continue
+        path = os.path.join(source, rel_path)
+        if not is_fingerprinted(rel_path):
+            entries[rel_path], _ = sync_file(
+                path,
+                os.path.join(destination, rel_path),
+                previous.get(rel_path),
+                verify_hash=verify_hash,
+                link=link,
+            )
+            continue
+        out_rel, entries[out_rel] = fingerprint_file(
+            path, destination, rel_path, by_source.get(path), link=link
+        )
+        assets[site_url(rel_path)] = site_url(out_rel)
+    return entries, assets
+
+
+def headers_file(assets):
+    # Netlify / Cloudflare Pages _headers format, with paths relative to the
+    # output root.
+    lines = ["# Fingerprinted assets never change under the same name."]
+    for url in sorted(assets.values()):
+        lines.append(url)
+        lines.append(f"  Cache-Control: {IMMUTABLE}")
+    return "\n".join(lines) + "\n"
+
+
+def write_asset_files(dest_path, assets):
+    # Writes the asset map and the _headers file and returns their manifest
+    # entries.
+    files = {
+        ASSETS_NAME: json.dumps(assets, indent=2, sort_keys=True) + "\n",
+        HEADERS_NAME: headers_file(assets),
+    }
+    entries = {}
+    for name, text in files.items():
+        path = os.path.join(dest_path, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        replace_if_changed(tmp_path, path)
+        entries[name] = {"kind": "generated", "hash": hash_bytes(text.encode())}
+    return entries
+
+
+def load_assets(dest_path):
+    try:
+        with open(os.path.join(dest_path, ASSETS_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_map(source):
+    # The asset map fingerprint_filetree would return, without copying
+    # anything, for builds that only place some of the assets themselves.
+    return {
+        site_url(rel_path): site_url(
+            fingerprinted_path(rel_path, hash_file(os.path.join(source, rel_path)))
+        )
+        for rel_path in walk_files(source)
+        if is_fingerprinted(rel_path)
+    }
@@ -0,0 +1,112 @@
+import datetime
+import itertools
+
+from textnode import markdown_lines, page_title
+
+# Pages can start with a block of metadata between two "---" lines, in a
+# small subset of YAML:
+#
+#   ---
+#   date: 2024-03-01
+#   tags: [tolkien, elves]
+#   summary: "Why Glorfindel outshines Legolas"
+#   draft: false
+#   ---
+#
+# Values are plain or quoted strings, true/false, or lists, written inline
+# as above or as "- item" lines under the key. Only the keys in FIELDS are
+# allowed, so a misspelled one is an error rather than quietly ignored.
+
+FENCE = "---"
+FIELDS = ("date", "tags", "summary", "draft")
+
+
+def _scalar(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    return text
+
+
+def _value(text):
+    text = text.strip()
+    if text.startswith("[") and text.endswith("]"):
+        inner = text[1:-1].strip()
+        return [_scalar(item) for item in inner.split(",")] if inner else []
+    return _scalar(text)
+
+
+def _check(key, value, where):
+    if key == "date":
+        try:
+            return datetime.date.fromisoformat(str(value)).isoformat()
+        except ValueError:
+            raise ValueError(f"{where}: date should look like 2024-03-01")
+    if key == "tags":
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not all(
+            isinstance(tag, str) and tag for tag in value
+        ):
+            raise ValueError(f"{where}: tags should be a list of names")
+        return list(dict.fromkeys(value))
+    if key == "draft":
+        if not isinstance(value, bool):
+            raise ValueError(f"{where}: draft should be true or false")
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"{where}: {key} should be text")
+    return value
+
+
+def split_front_matter(lines, path="<page>"):
+    # Reads the front matter off the start of lines, an iterable of lines
+    # without their newlines. Returns the fields it set and an iterator
+    # over the rest, having read no further than the closing "---".
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return {}, lines
+    if first.rstrip() != FENCE:
+        return {}, itertools.chain([first], lines)
+
+    fields = {}
+    key = None
+    for number, line in enumerate(lines, start=2):
+        where = f"{path}:{number}"
+        stripped = line.strip()
+        if stripped == FENCE:
+            break
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") or stripped == "-":
+            if key is None or not isinstance(fields[key], list):
+                raise ValueError(f"{where}: list item outside of a list")
+            fields[key].append(_scalar(stripped[1:]))
+            continue
+        name, colon, value = line.partition(":")
+        name = name.strip()
+        if not colon or name not in FIELDS:
+            raise ValueError(f"{where}: expected one of {', '.join(FIELDS)}")
+        if name in fields:
+            raise ValueError(f"{where}: {name} is set twice")
+        key = name
+        # "key:" on its own starts a list of "- item" lines.
+        fields[name] = _value(value) if value.strip() else []
+    else:
+        raise ValueError(f"{path}: front matter has no closing {FENCE}")
+
+    return {key: _check(key, value, path) for key, value in fields.items()}, lines
+
+
+def read_header(path):
+    # The front matter and title (the text of the first h1) of the page at
+    # path, reading only as far into the file as the title.
+    with open(path, "r") as f:
+        fields, lines = split_front_matter(markdown_lines(f), path)
+        fields["title"] = page_title(lines)
+    return fields
@@ -1,31 +1,59 @@
+# Props that hold a URL and go through the serializer's rewrite_url hook.
+URL_PROPS = ("href", "src")
+
+
 class HTMLNode:
+    # Pages are made of a great many small nodes, so they carry no __dict__.
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
         self.children = children
         self.props = props
 
-    def to_html(self):
+    def to_html(self, rewrite_url=None):
         raise NotImplementedError("to_html method not implemented")
 
-    def props_to_html(self):
+    def emit_html(self, emit, rewrite_url=None):
+        # Hands the html to emit (a list's append, a stream's write) one
+        # top-level child at a time, so a page is never held as one string.
+        if not isinstance(self, ParentNode):
+            emit(self.to_html(rewrite_url))
+            return
+        self.check()
+        emit(f"<{self.tag}{self.props_to_html(rewrite_url)}>")
+        for child in self.children:
+            emit(child.to_html(rewrite_url))
+        emit(f"</{self.tag}>")
+
+    def join_html(self, rewrite_url=None):
+        return self.to_html(rewrite_url)
+
+    def write_html(self, stream, rewrite_url=None):
+        self.emit_html(stream.write, rewrite_url)
+
+    def props_to_html(self, rewrite_url=None):
         if self.props is None:
             return ""
-        props_html = ""
-        for prop in self.props:
-            props_html += f' {prop}="{self.props[prop]}"'
-        return props_html
+        if rewrite_url is None:
+            return "".join(f' {prop}="{value}"' for prop, value in self.props.items())
+        return "".join(
+            f' {prop}="{rewrite_url(value) if prop in URL_PROPS else value}"'
+            for prop, value in self.props.items()
+        )
 
     def __repr__(self):
         return f"HTMLNode({self.tag}, {self.value}, children: {self.children}, {self.props})"
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
-        super().__init__(tag, value)
-        self.props = props
+        super().__init__(tag, value, None, props)
 
-    def to_html(self):
+    def to_html(self, rewrite_url=None):
         if self.value is None:
             raise ValueError("value is required")
 
@@ -35,22 +63,49 @@ class LeafNode(HTMLNode):
         if self.props is None:
             return f"<{self.tag}>{self.value}</{self.tag}>"
         else:
-            return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+            return f"<{self.tag}{self.props_to_html(rewrite_url)}>{self.value}</{self.tag}>"
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
-        super().__init__(tag, children, props)
-        self.props = props
-        self.children = children
+        super().__init__(tag, None, children, props)
 
-    def to_html(self):
+    def check(self):
         if self.tag is None:
             raise ValueError("Parent Node must have a tag")
         if self.children is None:
             raise ValueError("Parent Node must have children")
-        else:
-            children_html = ""
-            for child in self.children:
-                children_html += child.to_html()
-            return f"<{self.tag}>{children_html}</{self.tag}>"
+
+    def to_html(self, rewrite_url=None):
+        # Joining each subtree recursively is the fastest way to build the
+        # string; only a tree too deep for that is walked with a stack.
+        try:
+            return self.join_html(rewrite_url)
+        except RecursionError:
+            parts = []
+            self.walk_html(parts.append, rewrite_url)
+            return "".join(parts)
+
+    def join_html(self, rewrite_url=None):
+        self.check()
+        children = "".join([child.join_html(rewrite_url) for child in self.children])
+        return f"<{self.tag}{self.props_to_html(rewrite_url)}>{children}</{self.tag}>"
+
+    def walk_html(self, emit, rewrite_url=None):
+        self.check()
+        emit(f"<{self.tag}{self.props_to_html(rewrite_url)}>")
+        stack = [(self.tag, iter(self.children))]
+        while stack:
+            tag, children = stack[-1]
+            for child in children:
+                if isinstance(child, ParentNode):
+                    child.check()
+                    emit(f"<{child.tag}{child.props_to_html(rewrite_url)}>")
+                    stack.append((child.tag, iter(child.children)))
+                    break
+                emit(child.to_html(rewrite_url))
+            else:
+                stack.pop()
+                emit(f"</{tag}>")
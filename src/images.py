@@ -0,0 +1,154 @@
+import os
+import struct
+from urllib.parse import unquote
+
+from htmlnode import LeafNode
+
+IMAGE_EXTENSIONS = {".gif", ".jpeg", ".jpg", ".png", ".webp"}
+
+# JPEG start-of-frame markers, the segments that carry the image size.
+# C4, C8 and CC share the range but mean something else.
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def read_image_size(path):
+    # (width, height) from the file header, or None for anything that isn't
+    # a PNG, GIF, WebP or JPEG we can make sense of. Only the first few
+    # bytes are read, except for JPEG, which seeks from segment to segment.
+    try:
+        with open(path, "rb") as f:
+            head = f.read(30)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp_size(head)
+            if head[:2] == b"\xff\xd8":
+                f.seek(2)
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _jpeg_size(f):
+    while True:
+        byte = f.read(1)
+        while byte == b"\xff":
+            marker = f.read(1)
+            if marker != b"\xff":
+                break
+        else:
+            return None
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Standalone markers carry no length.
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image, or the start of scan data: no frame header.
+            return None
+        (length,) = struct.unpack(">H", f.read(2))
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+class ImageSizes:
+    # Looks up the size of an image by the site URL a page links it with,
+    # reading it from the file under static_path. known maps source paths
+    # to sizes worked out by an earlier build (see scan_images), so those
+    # files aren't opened at all. Picklable, to reach worker processes.
+    def __init__(self, static_path, known=None):
+        self.static_path = static_path
+        self.sizes = dict(known or {})
+
+    def __call__(self, url):
+        if not url.startswith("/") or url.startswith("//"):
+            return None
+        parts = unquote(url.split("?", 1)[0].split("#", 1)[0]).split("/")
+        if any(part in (".", "..") for part in parts):
+            return None
+        path = os.path.join(self.static_path, *parts[1:])
+        if path not in self.sizes:
+            size = read_image_size(path) if is_image(path) else None
+            self.sizes[path] = size
+        return self.sizes[path]
+
+
+def scan_images(outputs, previous=None):
+    # Sizes of every image asset in a build manifest's outputs, keyed by
+    # content hash so an unchanged image is never read twice across builds.
+    previous = previous or {}
+    by_hash = {}
+    for entry in outputs.values():
+        if entry.get("kind") != "asset" or not is_image(entry["source"]):
+            continue
+        digest = entry["hash"]
+        size = previous.get(digest)
+        if size is None:
+            size = read_image_size(entry["source"])
+        if size is not None:
+            by_hash[digest] = list(size)
+    return by_hash
+
+
+def known_sizes(outputs, by_hash):
+    # scan_images' result keyed by source path, for ImageSizes.
+    return {
+        entry["source"]: tuple(by_hash[entry["hash"]])
+        for entry in outputs.values()
+        if entry.get("kind") == "asset" and entry.get("hash") in by_hash
+    }
+
+
+class PageImages:
+    # Adds sizes and lazy loading to the images of one page, in document
+    # order. The first image is usually above the fold, so it is left to
+    # load eagerly; the rest wait until they are scrolled near.
+    def __init__(self, image_size=None):
+        self.image_size = image_size
+        self.seen = 0
+
+    def decorate(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                stack.extend(reversed(node.children))
+            elif isinstance(node, LeafNode) and node.tag == "img":
+                self.add_attributes(node)
+
+    def add_attributes(self, node):
+        size = None
+        if self.image_size is not None:
+            size = self.image_size(node.props.get("src", ""))
+        if size is not None:
+            node.props["width"] = str(size[0])
+            node.props["height"] = str(size[1])
+        if self.seen:
+            node.props["loading"] = "lazy"
+            node.props["decoding"] = "async"
+        self.seen += 1
@@ -0,0 +1,161 @@
+import json
+import os
+import posixpath
+from collections import Counter
+from itertools import chain
+from urllib.parse import unquote, urlsplit
+
+from assets import replace_if_changed
+from manifest import hash_bytes
+from search import page_url
+
+# A graph of the links between a site's pages and outputs, checked against
+# what the build produced rather than by crawling the html it wrote. Pages
+# hand back the hrefs and srcs they render (see textnode.PageMetadata),
+# and each is reduced to a key: the site path it names, resolved against
+# the page and without slashes at either end.
+#
+#   /blog/tom, /blog/tom/, ../tom#top (on /blog/majesty/)  ->  blog/tom
+#
+# A key resolves when key, key.html or key/index.html is an output, or an
+# asset under the name it had before --fingerprint. Every key that
+# resolves is put in one set, so checking a link is a set lookup.
+#
+# The graph is kept in .links.json along with the outputs it was checked
+# against, so an incremental build only checks again the pages it rendered
+# and the pages linking to outputs that came or went.
+
+LINKS_NAME = ".links.json"
+GRAPH_VERSION = 1
+
+
+def _site_path(rel_path):
+    return rel_path.replace(os.sep, "/")
+
+
+def link_key(url, page):
+    # The key for a link on the page output at page, or None for links
+    # that leave the site or stay on the same page.
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path.startswith("/"):
+        path = posixpath.join(posixpath.dirname(page_url(page, "/")), path)
+    return posixpath.normpath(path).strip("/")
+
+
+def page_links(page, result):
+    # The keys of everything a page links to, from its render_page result.
+    urls = result["links"] + [image["src"] for image in result["images"]]
+    keys = {link_key(url, page) for url in urls}
+    keys.discard(None)
+    return sorted(keys)
+
+
+def link_targets(outputs, assets=None):
+    # Every output path a link can resolve to. assets is the
+    # fingerprint asset map, whose original names links still use.
+    targets = {_site_path(rel_path) for rel_path in outputs}
+    if assets:
+        targets.update(url[1:] for url in assets)
+    return targets
+
+
+def target_keys(target):
+    # The keys that resolve to target.
+    keys = [target]
+    if target.endswith(".html"):
+        keys.append(target[: -len(".html")])
+    if target == "index.html":
+        keys.append("")
+    elif target.endswith("/index.html"):
+        keys.append(target[: -len("/index.html")])
+    return keys
+
+
+def resolvable_keys(targets):
+    keys = set()
+    for target in targets:
+        keys.update(target_keys(target))
+    return keys
+
+
+class LinkGraph:
+    def __init__(self):
+        self.targets = set()
+        self.links = {}
+        self.broken = {}
+
+    @classmethod
+    def load(cls, dest_path):
+        # The graph a previous build saved in dest_path, or None.
+        try:
+            with open(os.path.join(dest_path, LINKS_NAME), "r") as f:
+                data = json.load(f)
+            if data.get("version") != GRAPH_VERSION:
+                return None
+            graph = cls()
+            graph.targets = set(data["targets"])
+            graph.links = data["links"]
+            graph.broken = data["broken"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        return graph
+
+    def update(self, rendered, removed, targets):
+        # rendered maps the pages that were just rendered to their keys,
+        # removed lists pages that are gone and targets is every output of
+        # the build. Returns how many pages were checked.
+        for page in removed:
+            self.links.pop(page, None)
+            self.broken.pop(page, None)
+        self.links.update(rendered)
+        check = set(rendered)
+        changed = resolvable_keys(self.targets ^ targets)
+        if changed and len(check) < len(self.links):
+            for page, keys in self.links.items():
+                if not changed.isdisjoint(keys):
+                    check.add(page)
+        self.targets = targets
+        known = resolvable_keys(targets)
+        for page in check:
+            keys = self.links[page]
+            if known.issuperset(keys):
+                self.broken.pop(page, None)
+            else:
+                self.broken[page] = [key for key in keys if key not in known]
+        return len(check)
+
+    def orphans(self, pages):
+        # The pages no other page links to. The home page needs none.
+        inbound = Counter(chain.from_iterable(self.links.values()))
+        orphans = []
+        for page in sorted(pages):
+            if page == "index.html":
+                continue
+            # Linking to yourself doesn't count.
+            own = self.links.get(page, ())
+            if not any(inbound[key] > (key in own) for key in target_keys(page)):
+                orphans.append(page)
+        return orphans
+
+    def save(self, dest_path):
+        # Returns the manifest entry.
+        text = json.dumps(
+            {
+                "version": GRAPH_VERSION,
+                "targets": sorted(self.targets),
+                "links": self.links,
+                "broken": self.broken,
+            },
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+        text += "\n"
+        path = os.path.join(dest_path, LINKS_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        replace_if_changed(tmp_path, path)
+        return {"kind": "generated", "hash": hash_bytes(text.encode())}
@@ -0,0 +1,272 @@
+import html
+import json
+import os
+
+from assets import replace_if_changed
+from frontmatter import read_header
+from htmlnode import LeafNode, ParentNode
+from manifest import hash_bytes
+from search import page_url
+from textnode import slugify
+
+# Listing pages generated from the front matter of the posts, the pages
+# under blog/ that have a date and aren't drafts, newest first:
+#
+#   blog/                   every post
+#   blog/page/<n>/          ... and its further pages
+#   tags/                   every tag, with how many posts have it
+#   tags/<tag>/             the posts with a tag, paged the same way
+#   archive/                every post, under the year it came out
+#
+# A page in content/ with the same output path wins over a generated one.
+#
+# Each post's header (see frontmatter.read_header) is kept in .headers.json
+# under the size and mtime of its source, so a build only reads the
+# headers of posts that changed, and never a post's body.
+
+HEADERS_NAME = ".headers.json"
+HEADERS_VERSION = 1
+BLOG_DIR = "blog"
+TAGS_DIR = "tags"
+ARCHIVE_DIR = "archive"
+DEFAULT_PER_PAGE = 10
+
+
+class HeaderCache:
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self.used = {}
+        self.reads = 0
+
+    @classmethod
+    def load(cls, dest_path):
+        try:
+            with open(os.path.join(dest_path, HEADERS_NAME), "r") as f:
+                data = json.load(f)
+            if data.get("version") != HEADERS_VERSION:
+                return cls()
+            return cls(data["headers"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return cls()
+
+    def header(self, source):
+        stat = os.stat(source)
+        entry = self.entries.get(source)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime"] != stat.st_mtime_ns
+        ):
+            entry = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "header": read_header(source),
+            }
+            self.reads += 1
+        self.used[source] = entry
+        return entry["header"]
+
+    def save(self, dest_path):
+        # Keeps only the headers asked for since load, and returns the
+        # manifest entry.
+        text = json.dumps(
+            {"version": HEADERS_VERSION, "headers": self.used},
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+        text += "\n"
+        path = os.path.join(dest_path, HEADERS_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        replace_if_changed(tmp_path, path)
+        return {"kind": "generated", "hash": hash_bytes(text.encode())}
+
+
+def is_post(rel_path):
+    rel_path = rel_path.replace(os.sep, "/")
+    return (
+        rel_path.startswith(BLOG_DIR + "/")
+        and rel_path.endswith(".html")
+        and rel_path != BLOG_DIR + "/index.html"
+    )
+
+
+def is_listing(rel_path):
+    # Whether a generated output is one of the listing pages.
+    rel_path = rel_path.replace(os.sep, "/")
+    return rel_path.startswith((BLOG_DIR + "/", TAGS_DIR + "/", ARCHIVE_DIR + "/"))
+
+
+def collect_posts(sources, cache):
+    # sources maps page outputs to their markdown. Returns the posts, newest
+    # first.
+    posts = []
+    for rel_path, source in sources.items():
+        if not is_post(rel_path):
+            continue
+        header = cache.header(source)
+        if header.get("draft") or "date" not in header:
+            continue
+        if header["title"] is None:
+            raise Exception(f"{source}: post has no h1 heading to list it by")
+        posts.append(
+            {
+                "path": rel_path.replace(os.sep, "/"),
+                "url": page_url(rel_path, "/"),
+                "title": header["title"],
+                "date": header["date"],
+                "tags": header.get("tags", []),
+                "summary": header.get("summary"),
+            }
+        )
+    posts.sort(key=lambda post: post["url"])
+    posts.sort(key=lambda post: post["date"], reverse=True)
+    return posts
+
+
+def _pages(root, count):
+    # (output path, url) of each page of a listing at root.
+    return [
+        (
+            f"{root}/index.html" if number == 1 else f"{root}/page/{number}/index.html",
+            f"/{root}/" if number == 1 else f"/{root}/page/{number}/",
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def _text(text):
+    return LeafNode(None, html.escape(text, quote=False))
+
+
+def _post_item(post, tag_urls):
+    children = [
+        LeafNode("a", html.escape(post["title"], quote=False), {"href": post["url"]}),
+        _text(" "),
+        LeafNode("time", post["date"], {"datetime": post["date"]}),
+    ]
+    if post["summary"]:
+        children.append(LeafNode("p", html.escape(post["summary"], quote=False)))
+    if post["tags"]:
+        tags = []
+        for tag in post["tags"]:
+            if tags:
+                tags.append(_text(", "))
+            tags.append(
+                LeafNode("a", html.escape(tag, quote=False), {"href": tag_urls[tag]})
+            )
+        children.append(ParentNode("p", tags, {"class": "tags"}))
+    return ParentNode("li", children)
+
+
+def _post_list(posts, tag_urls):
+    return ParentNode("ul", [_post_item(post, tag_urls) for post in posts])
+
+
+def _nav(pages, index):
+    links = []
+    if index > 0:
+        links.append(
+            LeafNode("a", "Newer posts", {"href": pages[index - 1][1], "rel": "prev"})
+        )
+    links.append(_text(f" Page {index + 1} of {len(pages)} "))
+    if index + 1 < len(pages):
+        links.append(
+            LeafNode("a", "Older posts", {"href": pages[index + 1][1], "rel": "next"})
+        )
+    return ParentNode("nav", links)
+
+
+def _paginate(root, title, posts, per_page, body):
+    # The pages of one listing as {output path: (title, node)}. body turns
+    # one page's posts into its nodes.
+    chunks = [
+        posts[start : start + per_page] for start in range(0, len(posts), per_page)
+    ]
+    pages = _pages(root, len(chunks))
+    listing = {}
+    for index, chunk in enumerate(chunks):
+        page_title = title if index == 0 else f"{title} (page {index + 1})"
+        children = [LeafNode("h1", html.escape(page_title, quote=False))]
+        children.extend(body(chunk))
+        if len(pages) > 1:
+            children.append(_nav(pages, index))
+        listing[pages[index][0]] = (page_title, ParentNode("div", children))
+    return listing
+
+
+def node_links(node):
+    # The hrefs in a listing page, in the shape of a render_page result
+    # for links.page_links.
+    hrefs = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.props and "href" in node.props:
+            hrefs.append(node.props["href"])
+        if node.children:
+            stack.extend(reversed(node.children))
+    return {"links": hrefs, "images": []}
+
+
+def listing_pages(posts, per_page=DEFAULT_PER_PAGE):
+    # Every listing page for posts as {output path: (title, node)}, with
+    # output paths using "/".
+    if not posts:
+        return {}
+    tags = {}
+    tag_urls = {}
+    for post in posts:
+        for tag in post["tags"]:
+            slug = slugify(tag)
+            tags.setdefault(slug, (tag, []))[1].append(post)
+            tag_urls[tag] = f"/{TAGS_DIR}/{slug}/"
+
+    def post_list(chunk):
+        return [_post_list(chunk, tag_urls)]
+
+    def front_page(chunk):
+        # The blog is where readers find the rest of the listings.
+        more = [LeafNode("a", "Archive", {"href": f"/{ARCHIVE_DIR}/"})]
+        if tags:
+            more.append(_text(" "))
+            more.append(LeafNode("a", "Tags", {"href": f"/{TAGS_DIR}/"}))
+        return [_post_list(chunk, tag_urls), ParentNode("p", more)]
+
+    def by_year(chunk):
+        nodes = []
+        for post in chunk:
+            year = post["date"][:4]
+            if not nodes or nodes[-2].value != year:
+                nodes.append(LeafNode("h2", year))
+                nodes.append(ParentNode("ul", []))
+            nodes[-1].children.append(_post_item(post, tag_urls))
+        return nodes
+
+    listing = _paginate(BLOG_DIR, "Blog", posts, per_page, front_page)
+    listing.update(_paginate(ARCHIVE_DIR, "Archive", posts, per_page, by_year))
+    items = []
+    for slug, (tag, tagged) in sorted(tags.items()):
+        listing.update(
+            _paginate(
+                f"{TAGS_DIR}/{slug}", f"Posts tagged {tag}", tagged, per_page, post_list
+            )
+        )
+        items.append(
+            ParentNode(
+                "li",
+                [
+                    LeafNode(
+                        "a", html.escape(tag, quote=False), {"href": tag_urls[tag]}
+                    ),
+                    _text(f" ({len(tagged)})"),
+                ],
+            )
+        )
+    if items:
+        listing[f"{TAGS_DIR}/index.html"] = (
+            "Tags",
+            ParentNode("div", [LeafNode("h1", "Tags"), ParentNode("ul", items)]),
+        )
+    return listing
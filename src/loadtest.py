@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import sys
+import time
+
+# Hammers a running server with keep-alive connections and reports
+# throughput and latency percentiles.
+#
+#   python3 src/main.py serve &
+#   python3 src/loadtest.py --connections 64 --duration 10 / /index.css
+
+
+async def fetch(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def client(host, port, requests, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    index = 0
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await fetch(reader, writer, requests[index % len(requests)])
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+            index += 1
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    index = min(len(values) - 1, int(len(values) * fraction))
+    return values[index]
+
+
+async def run(args):
+    requests = [
+        (
+            f"GET {path} HTTP/1.1\r\nHost: {args.host}\r\n"
+            f"Accept-Encoding: {args.accept_encoding}\r\n\r\n"
+        ).encode("latin-1")
+        for path in args.paths
+    ]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *(
+            client(args.host, args.port, requests, deadline, latencies, errors)
+            for _ in range(args.connections)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies, errors
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="loadtest.py")
+    parser.add_argument("paths", nargs="*", default=["/"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--accept-encoding", default="gzip")
+    args = parser.parse_args(argv)
+
+    elapsed, latencies, errors = asyncio.run(run(args))
+    if not latencies:
+        print("no requests completed")
+        return 1
+    print(f"{len(latencies)} requests over {args.connections} connections")
+    print(f"requests/sec: {len(latencies) / elapsed:.0f}")
+    for label, fraction in [("p50", 0.50), ("p90", 0.90), ("p99", 0.99)]:
+        print(f"{label} latency: {percentile(latencies, fraction) * 1000:.2f} ms")
+    if errors:
+        print(f"error responses: {len(errors)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,142 +1,1370 @@
+import argparse
+import html
+import json
+import logging
 import os
 import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from textnode import markdown_to_html_node
+import daemon
+import server
+import shards
+from assets import (
+    check_tree_paths,
+    copy_file,
+    replace_if_changed,
+    same_contents,
+    sync_file,
+    sync_filetree,
+    walk_files,
+)
+from changes import (
+    CHANGES_NAME,
+    diff_outputs,
+    refresh_outputs,
+    snapshot_outputs,
+    write_changes,
+)
+from compress import VARIANT_SUFFIXES, precompress_tree
+from fingerprint import (
+    AssetRewriter,
+    asset_map,
+    fingerprint_filetree,
+    load_assets,
+    write_asset_files,
+)
+from feeds import FEED_NAME, is_feeds_file, lastmod, write_feed, write_sitemaps
+from frontmatter import read_header, split_front_matter
+from images import ImageSizes, known_sizes, scan_images
+from listings import (
+    DEFAULT_PER_PAGE,
+    HEADERS_NAME,
+    HeaderCache,
+    collect_posts,
+    is_listing,
+    listing_pages,
+    node_links,
+)
+from links import LINKS_NAME, LinkGraph, link_targets, page_links
+import profiling
+from manifest import (
+    GENERATOR_VERSION,
+    PAGE_INPUTS,
+    hash_file,
+    load_manifest,
+    new_manifest,
+    remove_output,
+    save_manifest,
+)
+from render_cache import (
+    forget_block_cache_size,
+    open_block_cache,
+    prune_block_cache,
+)
+from search import (
+    PageTerms,
+    SearchIndex,
+    is_search_file,
+    page_url,
+    write_search_index,
+)
+from shards import in_shard, parse_shard, shard_root
+from template import load_template
+from textnode import markdown_lines, markdown_to_page
+from urls import basepath_rewriter
+from watch import watch
+
+log = logging.getLogger(__name__)
+
+# Where a site's inputs and output live, relative to the working directory.
+STATIC_PATH = "static"
+CONTENT_PATH = "content"
+TEMPLATE_PATH = "template.html"
+DEST_PATH = "docs"
 
 
 # source is either going to be a file or a directory. if it's a file, call shutils to move the file. if it's a directory, call the function on it again with a modified filepath for both the source and the destination.
-def copy_filetree(source, destination, *, is_root=False):
-    # Normalize to absolute paths once
-    source_abs = os.path.abspath(source)
-    dest_abs = os.path.abspath(destination)
-    cwd = os.path.abspath(os.curdir)
-
-    # Safety: Both must be inside cwd
-    if not source_abs.startswith(cwd + os.sep):
-        raise ValueError(f"source outside project: {source_abs}")
-    if not dest_abs.startswith(cwd + os.sep):
-        raise ValueError(f"source outside project: {dest_abs}")
-
-    # Safety: destination must not *contain* source (would recurse into itself)
-    if source_abs.startswith(dest_abs + os.sep):
-        raise ValueError("destination may not be an ancestor of source")
-    if dest_abs.startswith(source_abs + os.sep):
-        raise ValueError("destination may not be inside source")
-
-    if os.path.isfile(source_abs):
-        parent = os.path.dirname(dest_abs)
+# Files that are already there with the same contents are left untouched;
+# removing what the build no longer produces is up to prune_outputs.
+def copy_filetree(source, destination):
+    check_tree_paths(source, destination)
+    with profiling.stage("asset_copy"):
+        _copy_filetree(source, destination)
+
+
+def _copy_filetree(source, destination):
+    if os.path.isfile(source):
+        parent = os.path.dirname(destination)
         if parent and not os.path.exists(parent):
             os.makedirs(parent, exist_ok=True)
-        shutil.copy(source_abs, dest_abs)
+        if not same_contents(source, destination):
+            tmp_path = destination + ".tmp"
+            copy_file(source, tmp_path)
+            os.replace(tmp_path, destination)
         return
 
     # Directory case
-    if is_root:
-        if os.path.exists(destination):
-            shutil.rmtree(destination)
+    if not os.path.exists(destination):
         os.mkdir(destination)
-    else:
-        if not os.path.exists(destination):
-            os.mkdir(destination)
 
     for name in os.listdir(source):
         new_source = os.path.join(source, name)
         new_dest = os.path.join(destination, name)
-        copy_filetree(new_source, new_dest)
+        _copy_filetree(new_source, new_dest)
+
+
+def generate_page(
+    from_path,
+    template_path,
+    dest_path,
+    basepath,
+    rewrite_url=None,
+    cache_dir=None,
+    image_size=None,
+    collect=None,
+):
+    log.debug(
+        "Generating page from %s to %s using %s", from_path, dest_path, template_path
+    )
+    return render_page(
+        from_path,
+        template_path,
+        dest_path,
+        basepath,
+        rewrite_url,
+        cache_dir,
+        image_size,
+        collect,
+    )
+
+
+def write_page(template, dest_path, title, node, rewrite_url):
+    def content(emit):
+        with profiling.stage("serialize"):
+            node.emit_html(emit, rewrite_url)
 
+    parent = os.path.dirname(dest_path)
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent, exist_ok=True)
 
-def extract_title(markdown):
-    block = markdown.lstrip().split("\n\n")[0]
-    first = block.split(" ", maxsplit=1)[0].rstrip()
-    text = block.split(" ", maxsplit=1)[1].strip()
-    tag = f"h{len(first)}"
-    if tag != "h1":
-        raise Exception("first line should be heading, not subheading")
-    return text
+    # Output is streamed, so "write" is opening the file, flushing
+    # whatever the template and serializer left in the buffer, and
+    # putting the file in place if it came out different.
+    tmp_path = dest_path + ".tmp"
+    with profiling.stage("write"):
+        try:
+            with open(tmp_path, "w") as f:
+                with profiling.stage("template"):
+                    template.write(f, {"Title": title, "Content": content})
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        replace_if_changed(tmp_path, dest_path)
 
 
-def generate_pages_recursive(
-    from_path, template_path, dest_path, basepath, *, is_root=False
+def render_page(
+    from_path,
+    template_path,
+    dest_path,
+    basepath,
+    rewrite_url=None,
+    cache_dir=None,
+    image_size=None,
+    collect=None,
 ):
-    abs_from_path = os.path.abspath(from_path)
-    abs_dest_path = os.path.abspath(dest_path)
-    abs_template_path = os.path.abspath(template_path)
-    cwd = os.path.abspath(os.curdir)
-
-    # Safety: Both must be inside cwd
-    if not abs_from_path.startswith(cwd + os.sep):
-        raise ValueError(f"source outside project: {abs_from_path}")
-    if not abs_dest_path.startswith(cwd + os.sep):
-        raise ValueError(f"source outside project: {abs_dest_path}")
-
-    # Safety: destination must not *contain* source (would recurse into itself)
-    if abs_from_path.startswith(abs_dest_path + os.sep):
-        raise ValueError("destination may not be an ancestor of source")
-    if abs_dest_path.startswith(abs_from_path + os.sep):
-        raise ValueError("destination may not be inside source")
-
-    if os.path.isfile(abs_from_path):
-        parent = os.path.dirname(abs_dest_path)
-        if parent and not os.path.exists(parent):
-            os.makedirs(parent, exist_ok=True)
-        dest_root, dest_ext = os.path.splitext(abs_dest_path)
-        if dest_ext == ".md":
-            abs_dest_path = dest_root + ".html"
-        generate_page(abs_from_path, abs_template_path, abs_dest_path, basepath)
-        return
+    # Returns the page's metadata (see textnode.PageMetadata), along with
+    # the result of collect, a collector class for markdown_to_page such as
+    # search.PageTerms, when one is given.
+    with profiling.page(os.path.relpath(from_path)):
+        block_cache = None
+        if cache_dir is not None:
+            block_cache = open_block_cache(cache_dir, basepath, rewrite_url)
+        rewrite_url = basepath_rewriter(basepath, rewrite_url)
+        with profiling.stage("template"):
+            template = load_template(template_path, rewrite_url)
+        collector = collect() if collect is not None else None
+        # The page is parsed as it is read, a line at a time, so the whole
+        # source is never in memory.
+        with open(from_path, "r") as f:
+            with profiling.stage("read"):
+                _, lines = split_front_matter(markdown_lines(f), from_path)
+            node, metadata = markdown_to_page(lines, block_cache, image_size, collector)
+        title = metadata.title
+        if title is None:
+            raise Exception("page has no h1 heading to take its title from")
+
+        write_page(template, dest_path, title, node, rewrite_url)
+
+    page = metadata.result()
+    if collector is not None:
+        page.update(collector.result())
+    return page
+
+
+def _render_page_job(job):
+    # Runs in a worker process. Errors are handed back as text so the parent
+    # can report them in page order rather than in completion order, along
+    # with the page's stage timings when the build is being profiled and
+    # whatever the page's collector gathered.
+    *job, profiled = job
+    if profiled and profiling.active() is None:
+        profiling.start()
+    error = result = None
+    try:
+        result = render_page(*job)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    stages = None
+    if profiled:
+        stages = profiling.active().pages.pop(os.path.relpath(job[0]), None)
+    return error, stages, result
+
+
+def generate_pages(
+    pages,
+    template_path,
+    basepath,
+    *,
+    jobs=1,
+    rewrite_url=None,
+    cache_dir=None,
+    image_size=None,
+    collect=None,
+):
+    # Returns what render_page returned for each page, in order.
+    if jobs <= 1 or len(pages) <= 1:
+        return [
+            generate_page(
+                from_path,
+                template_path,
+                dest_path,
+                basepath,
+                rewrite_url,
+                cache_dir,
+                image_size,
+                collect,
+            )
+            for from_path, dest_path in pages
+        ]
+
+    # rewrite_url and image_size have to be picklable (module-level functions
+    # or objects) to reach the workers.
+    profile = profiling.active()
+    page_jobs = [
+        (
+            from_path,
+            template_path,
+            dest_path,
+            basepath,
+            rewrite_url,
+            cache_dir,
+            image_size,
+            collect,
+            profile is not None,
+        )
+        for from_path, dest_path in pages
+    ]
+    chunksize = max(1, len(page_jobs) // (jobs * 4))
+    failures = []
+    collected = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(_render_page_job, page_jobs, chunksize=chunksize)
+        for (from_path, dest_path), (error, stages, result) in zip(pages, results):
+            log.debug(
+                "Generating page from %s to %s using %s",
+                from_path,
+                dest_path,
+                template_path,
+            )
+            if stages is not None:
+                profile.merge_page(os.path.relpath(from_path), stages)
+            if error is not None:
+                failures.append(f"{from_path}: {error}")
+            collected.append(result)
+
+    if cache_dir is not None:
+        forget_block_cache_size(cache_dir)
+    if failures:
+        raise Exception(
+            f"failed to generate {len(failures)} page(s):\n" + "\n".join(failures)
+        )
+    return collected
+
+
+def page_output_path(rel_path):
+    root, ext = os.path.splitext(rel_path)
+    if ext == ".md":
+        return root + ".html"
+    return rel_path
+
+
+def collect_pages(from_path, dest_path):
+    pages = []
+    with profiling.stage("walk"):
+        for rel_path in walk_files(from_path):
+            source = os.path.join(from_path, rel_path)
+            dest = os.path.join(dest_path, page_output_path(rel_path))
+            pages.append((source, dest))
+    return pages
+
+
+def update_search(
+    dest_path, basepath, pages, results, removed=(), index=None, outputs=None
+):
+    # Folds the pages just rendered, with what search.PageTerms collected
+    # from them, and the page outputs that are gone into index (a new one by
+    # default), writes it to dest_path and returns its manifest entries.
+    # outputs are the manifest's from before, for the shards left as they
+    # were.
+    with profiling.stage("search"):
+        if index is None:
+            index = SearchIndex()
+        rendered = {}
+        for (_, output), result in zip(pages, results):
+            url = page_url(os.path.relpath(output, dest_path), basepath)
+            rendered[url] = (result["title"], result["terms"])
+        index.update(rendered, [page_url(rel_path, basepath) for rel_path in removed])
+        return write_search_index(dest_path, index, outputs)
+
+
+def load_posts(dest_path, sources):
+    # The posts among sources (page outputs mapped to their markdown, see
+    # listings.py), with the manifest entry for the header cache.
+    with profiling.stage("listings"):
+        cache = HeaderCache.load(dest_path)
+        posts = collect_posts(sources, cache)
+        log.debug("Found %d post(s), read %d header(s)", len(posts), cache.reads)
+        return posts, {HEADERS_NAME: cache.save(dest_path)}
+
+
+def update_listings(
+    dest_path, sources, posts, template_path, basepath, per_page, rewrite_url=None
+):
+    # Writes the listing pages for posts. Returns their manifest entries,
+    # and the pages it wrote with their links, the way generate_pages
+    # would, for update_links.
+    with profiling.stage("listings"):
+        rewrite_url = basepath_rewriter(basepath, rewrite_url)
+        template = load_template(template_path, rewrite_url)
+        entries = {}
+        pages = []
+        results = []
+        for rel_path, (title, node) in listing_pages(posts, per_page).items():
+            if rel_path in sources:
+                continue
+            dest = os.path.join(dest_path, rel_path)
+            # Listing titles are text (a tag can hold "<" or "&"), and the
+            # template puts {{ Title }} in as it is.
+            write_page(
+                template, dest, html.escape(title, quote=False), node, rewrite_url
+            )
+            entries[rel_path] = {"kind": "generated", "hash": hash_file(dest)}
+            pages.append((None, dest))
+            results.append(node_links(node))
+        return entries, pages, results
+
+
+def update_feeds(dest_path, site_url, basepath, lastmods, posts, home=None):
+    # Writes sitemap.xml (see feeds.py) for the pages in lastmods, which
+    # maps them to their lastmod or None, and the Atom feed of posts,
+    # titled after the home page at home. A site without posts gets no
+    # feed. Returns the manifest entries.
+    with profiling.stage("feeds"):
+        entries = write_sitemaps(dest_path, site_url, basepath, lastmods)
+        if posts:
+            title = read_header(home)["title"] if home is not None else None
+            entries[FEED_NAME] = write_feed(
+                dest_path, site_url, basepath, title or site_url, posts, lastmods
+            )
+        return entries
+
+
+def drop_generated(outputs, dest_path, entries, owns):
+    # Removes the generated outputs owns(rel_path) claims that entries,
+    # what replaces them, no longer has. Returns their paths.
+    dropped = []
+    for rel_path, entry in list(outputs.items()):
+        if entry["kind"] == "generated" and owns(rel_path) and rel_path not in entries:
+            del outputs[rel_path]
+            remove_output(dest_path, rel_path)
+            dropped.append(rel_path)
+    return dropped
+
+
+def page_lastmods(outputs):
+    # The pages in a manifest's outputs, listing pages included, mapped to
+    # their lastmod (None for listing pages).
+    return {
+        rel_path: entry.get("lastmod")
+        for rel_path, entry in outputs.items()
+        if entry["kind"] == "page"
+        or (entry["kind"] == "generated" and is_listing(rel_path))
+    }
+
+
+def page_entry(source, previous=None):
+    # The manifest entry for a page. Its lastmod, for sitemap.xml and the
+    # feed, is the mtime the source had when its contents last changed, so
+    # touching a file or checking it out again doesn't move it.
+    entry = {"kind": "page", "source": source, "hash": hash_file(source)}
+    if previous is not None and previous.get("hash") == entry["hash"]:
+        entry["lastmod"] = previous.get("lastmod")
+    if entry.get("lastmod") is None:
+        entry["lastmod"] = lastmod(os.stat(source).st_mtime)
+    return entry
+
+
+def update_links(dest_path, pages, results, targets, removed=(), graph=None):
+    # Folds the links of the pages just rendered into graph (a new one by
+    # default), checks them against targets (see links.link_targets),
+    # reports broken links and orphan pages, saves the graph to dest_path
+    # and returns its manifest entries. removed lists page outputs that
+    # are gone.
+    with profiling.stage("links"):
+        if graph is None:
+            graph = LinkGraph()
+        rendered = {}
+        for (_, output), result in zip(pages, results):
+            page = os.path.relpath(output, dest_path).replace(os.sep, "/")
+            rendered[page] = page_links(page, result)
+        removed = [rel_path.replace(os.sep, "/") for rel_path in removed]
+        checked = graph.update(rendered, removed, targets)
+        all_pages = set(graph.links)
+        orphans = graph.orphans(all_pages)
+        for page, keys in sorted(graph.broken.items()):
+            for key in keys:
+                log.warning("%s: broken link to /%s", page, key)
+        for page in orphans:
+            log.warning("%s: no other page links here", page)
+        log.info(
+            "Checked links on %d of %d page(s): %d broken, %d orphan page(s)",
+            checked,
+            len(all_pages),
+            sum(len(keys) for keys in graph.broken.values()),
+            len(orphans),
+        )
+        return {LINKS_NAME: graph.save(dest_path)}
+
+
+def sync_static(
+    static_path,
+    dest_path,
+    previous=None,
+    *,
+    skip=(),
+    fingerprint=False,
+    rewrite_url=None,
+    verify_hash=False,
+    link=False,
+):
+    # Brings the static assets in dest_path up to date. Returns their
+    # manifest entries and the URL hook pages should be rendered with, which
+    # points links at the fingerprinted names when fingerprint is set.
+    with profiling.stage("asset_copy"):
+        if not fingerprint:
+            entries = sync_filetree(
+                static_path,
+                dest_path,
+                previous,
+                skip=skip,
+                verify_hash=verify_hash,
+                link=link,
+            )
+            return entries, rewrite_url
+        entries, assets = fingerprint_filetree(
+            static_path,
+            dest_path,
+            previous,
+            skip=skip,
+            verify_hash=verify_hash,
+            link=link,
+        )
+        entries.update(write_asset_files(dest_path, assets))
+    return entries, AssetRewriter(assets, rewrite_url)
+
+
+def build_incremental(
+    static_path,
+    from_path,
+    template_path,
+    dest_path,
+    basepath,
+    *,
+    jobs=1,
+    rewrite_url=None,
+    verify_hash=False,
+    link=False,
+    cache_dir=None,
+    fingerprint=False,
+    search=False,
+    check_links=False,
+    listings=None,
+    site_url=None,
+    precompressed=False,
+):
+    check_tree_paths(static_path, dest_path)
+    check_tree_paths(from_path, dest_path)
+
+    old_manifest = load_manifest(dest_path)
+    old_outputs = old_manifest["outputs"] if old_manifest else {}
+    manifest = new_manifest(basepath, hash_file(template_path))
+
+    pages = {}
+    with profiling.stage("walk"):
+        for rel_path in walk_files(from_path):
+            pages[page_output_path(rel_path)] = os.path.join(from_path, rel_path)
+
+    os.makedirs(dest_path, exist_ok=True)
+
+    assets, rewrite_url = sync_static(
+        static_path,
+        dest_path,
+        old_outputs,
+        skip=pages,
+        fingerprint=fingerprint,
+        rewrite_url=rewrite_url,
+        verify_hash=verify_hash,
+        link=link,
+    )
+    manifest["outputs"].update(assets)
+    if fingerprint:
+        manifest["assets"] = rewrite_url.cache_key
+    manifest["images"] = scan_images(
+        manifest["outputs"], old_manifest.get("images") if old_manifest else None
+    )
+    image_size = ImageSizes(
+        static_path, known_sizes(manifest["outputs"], manifest["images"])
+    )
+
+    # Anything that feeds into every page invalidates every page.
+    rebuild_pages = old_manifest is None or any(
+        old_manifest.get(key) != manifest[key] for key in PAGE_INPUTS
+    )
+    # The search index and link graph are updated from the pages that are
+    # rendered, so without one to update every page has to be.
+    index = graph = None
+    if search and not rebuild_pages:
+        index = SearchIndex.load(dest_path)
+        rebuild_pages = index is None
+    if check_links and not rebuild_pages:
+        graph = LinkGraph.load(dest_path)
+        rebuild_pages = graph is None
+
+    stale_pages = []
+    for rel_path, source in pages.items():
+        output = os.path.join(dest_path, rel_path)
+        previous = old_outputs.get(rel_path)
+        entry = page_entry(source, previous)
+        if rebuild_pages or previous != entry or not os.path.exists(output):
+            stale_pages.append((source, output))
+        manifest["outputs"][rel_path] = entry
+    results = generate_pages(
+        stale_pages,
+        template_path,
+        basepath,
+        jobs=jobs,
+        rewrite_url=rewrite_url,
+        cache_dir=cache_dir,
+        image_size=image_size,
+        collect=PageTerms if search else None,
+    )
+    listed_pages = listed = []
+    if listings or site_url:
+        posts, entries = load_posts(dest_path, pages)
+        manifest["outputs"].update(entries)
+    if listings:
+        entries, listed_pages, listed = update_listings(
+            dest_path, pages, posts, template_path, basepath, listings, rewrite_url
+        )
+        manifest["outputs"].update(entries)
+    if site_url:
+        lastmods = page_lastmods(manifest["outputs"])
+        manifest["outputs"].update(
+            update_feeds(
+                dest_path,
+                site_url,
+                basepath,
+                lastmods,
+                posts,
+                pages.get("index.html"),
+            )
+        )
+    removed = [
+        rel_path
+        for rel_path, entry in old_outputs.items()
+        if entry["kind"] == "page" and rel_path not in pages
+    ]
+    if search:
+        manifest["outputs"].update(
+            update_search(
+                dest_path,
+                basepath,
+                stale_pages,
+                results,
+                removed,
+                index,
+                old_outputs,
+            )
+        )
+    if check_links:
+        targets = link_targets(
+            manifest["outputs"], rewrite_url.assets if fingerprint else None
+        )
+        # Listing pages that are gone leave the graph too.
+        removed += [
+            rel_path
+            for rel_path, entry in old_outputs.items()
+            if entry["kind"] == "generated"
+            and is_listing(rel_path)
+            and rel_path not in manifest["outputs"]
+        ]
+        manifest["outputs"].update(
+            update_links(
+                dest_path,
+                stale_pages + listed_pages,
+                results + listed,
+                targets,
+                removed,
+                graph,
+            )
+        )
+
+    if old_manifest is None:
+        # Nothing says what an earlier build (a full one, say) left in
+        # dest_path, so whatever this one didn't write goes, as after a
+        # full build. precompressed keeps the variants finish_build is
+        # about to bring up to date.
+        prune_outputs(dest_path, manifest["outputs"], precompressed=precompressed)
+    for rel_path in sorted(set(old_outputs) - set(manifest["outputs"])):
+        remove_output(dest_path, rel_path)
+
+    save_manifest(dest_path, manifest)
+    return manifest
 
-    if is_root:
-        if os.path.exists(dest_path):
-            shutil.rmtree(dest_path)
-        os.mkdir(dest_path)
-    else:
-        if not os.path.exists(dest_path):
-            os.mkdir(dest_path)
 
-    for name in os.listdir(from_path):
-        new_from_path = os.path.join(from_path, name)
-        new_dest_path = os.path.join(dest_path, name)
-        generate_pages_recursive(
-            new_from_path, abs_template_path, new_dest_path, basepath
+def build_shard(
+    static_path,
+    from_path,
+    template_path,
+    shard_path,
+    basepath,
+    shard,
+    *,
+    jobs=1,
+    rewrite_url=None,
+    link=False,
+    cache_dir=None,
+    fingerprint=False,
+):
+    # Builds one shard of the site into shard_path, a fresh output root: the
+    # pages and assets whose source paths hash to it (see shards.py), and a
+    # manifest for merge_shards to put the shards back together with.
+    check_tree_paths(static_path, shard_path)
+    check_tree_paths(from_path, shard_path)
+    if os.path.exists(shard_path):
+        shutil.rmtree(shard_path)
+    os.makedirs(shard_path)
+
+    manifest = new_manifest(basepath, hash_file(template_path))
+    index, count = shard
+    manifest["shard"] = {"index": index, "count": count}
+
+    pages = {}
+    owned = {}
+    with profiling.stage("walk"):
+        for rel_path in walk_files(from_path):
+            out_rel = page_output_path(rel_path)
+            pages[out_rel] = os.path.join(from_path, rel_path)
+            if in_shard(rel_path, shard):
+                owned[out_rel] = pages[out_rel]
+        # Pages win over assets of the same name, as in a full build.
+        skip = set(pages)
+        skip.update(
+            rel_path
+            for rel_path in walk_files(static_path)
+            if not in_shard(rel_path, shard)
         )
 
+    with profiling.stage("asset_copy"):
+        if fingerprint:
+            # Every shard needs the whole asset map to rewrite its links, but
+            # only copies its own assets.
+            entries, _ = fingerprint_filetree(
+                static_path, shard_path, skip=skip, link=link
+            )
+            assets = asset_map(static_path)
+            if index == 1:
+                entries.update(write_asset_files(shard_path, assets))
+            rewrite_url = AssetRewriter(assets, rewrite_url)
+            manifest["assets"] = rewrite_url.cache_key
+        else:
+            entries = sync_filetree(static_path, shard_path, skip=skip, link=link)
+    manifest["outputs"].update(entries)
+    manifest["images"] = scan_images(manifest["outputs"])
+    image_size = ImageSizes(
+        static_path, known_sizes(manifest["outputs"], manifest["images"])
+    )
+
+    for rel_path, source in owned.items():
+        manifest["outputs"][rel_path] = page_entry(source)
+    generate_pages(
+        [
+            (source, os.path.join(shard_path, rel_path))
+            for rel_path, source in owned.items()
+        ],
+        template_path,
+        basepath,
+        jobs=jobs,
+        rewrite_url=rewrite_url,
+        cache_dir=cache_dir,
+        image_size=image_size,
+    )
+    save_manifest(shard_path, manifest)
+    return manifest
+
 
-def generate_page(from_path, template_path, dest_path, basepath):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    with open(from_path, "r") as f:
-        from_file = f.read()
-        f.close()
+def _relative_to(path, root):
+    rel_path = os.path.relpath(path, root)
+    if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+        return None
+    return rel_path
 
-    with open(template_path, "r") as f:
-        template = f.read()
-        f.close()
 
-    html = markdown_to_html_node(from_file).to_html()
-    title = extract_title(from_file)
-    html = template.replace("{{ Title }}", title).replace("{{ Content }}", html)
-    html = html.replace('href="/', f'href="/{basepath}').replace(
-        'src="/', f'src="/{basepath}'
+def rebuild_paths(
+    manifest,
+    paths,
+    static_path,
+    from_path,
+    template_path,
+    dest_path,
+    basepath,
+    *,
+    jobs=1,
+    rewrite_url=None,
+    link=False,
+    cache_dir=None,
+    fingerprint=False,
+    search=False,
+    check_links=False,
+    listings=None,
+    site_url=None,
+):
+    # Brings the outputs for just these changed source paths up to date,
+    # updating an in-memory manifest from build_incremental as it goes.
+    # Returns the pages it rendered, as (source, output) pairs, and the
+    # outputs it touched (written, removed or given a new manifest entry),
+    # relative to dest_path.
+    outputs = manifest["outputs"]
+    before = dict(outputs)
+    stale_pages = []
+    removed_pages = []
+    removed_listings = []
+    template_changed = False
+    static_changed = False
+
+    for path in paths:
+        if os.path.abspath(path) == os.path.abspath(template_path):
+            template_changed = True
+            continue
+
+        rel_path = _relative_to(path, from_path)
+        if rel_path is not None:
+            out_rel = page_output_path(rel_path)
+            if os.path.exists(path):
+                outputs[out_rel] = page_entry(path, outputs.get(out_rel))
+                stale_pages.append((path, os.path.join(dest_path, out_rel)))
+            elif out_rel in outputs:
+                del outputs[out_rel]
+                remove_output(dest_path, out_rel)
+                removed_pages.append(out_rel)
+            continue
+
+        rel_path = _relative_to(path, static_path)
+        if rel_path is None:
+            continue
+        static_changed = True
+        if fingerprint:
+            # Renamed assets change links on every page; handled below.
+            continue
+        if outputs.get(rel_path, {}).get("kind") == "page":
+            continue
+        if os.path.exists(path):
+            with profiling.stage("asset_copy"):
+                outputs[rel_path], _ = sync_file(
+                    path,
+                    os.path.join(dest_path, rel_path),
+                    outputs.get(rel_path),
+                    link=link,
+                )
+        elif rel_path in outputs:
+            del outputs[rel_path]
+            remove_output(dest_path, rel_path)
+
+    rebuild_all = False
+    if fingerprint and static_changed:
+        page_outputs = {
+            rel_path for rel_path, entry in outputs.items() if entry["kind"] == "page"
+        }
+        entries, rewrite_url = sync_static(
+            static_path,
+            dest_path,
+            outputs,
+            skip=page_outputs,
+            fingerprint=True,
+            rewrite_url=rewrite_url,
+            link=link,
+        )
+        for rel_path in sorted(set(outputs) - page_outputs - set(entries)):
+            del outputs[rel_path]
+            remove_output(dest_path, rel_path)
+        outputs.update(entries)
+    elif fingerprint:
+        rewrite_url = AssetRewriter(load_assets(dest_path), rewrite_url)
+    if fingerprint and manifest.get("assets") != rewrite_url.cache_key:
+        manifest["assets"] = rewrite_url.cache_key
+        rebuild_all = True
+
+    # Pages carry the sizes of the images they show.
+    images = manifest.get("images") or {}
+    if static_changed:
+        images = scan_images(outputs, images)
+    if images != manifest.get("images"):
+        manifest["images"] = images
+        rebuild_all = True
+    image_size = ImageSizes(static_path, known_sizes(outputs, images))
+
+    if template_changed and os.path.exists(template_path):
+        manifest["template"] = hash_file(template_path)
+        rebuild_all = True
+    index = graph = None
+    if search and not rebuild_all:
+        index = SearchIndex.load(dest_path)
+        rebuild_all = index is None
+    if check_links and not rebuild_all:
+        graph = LinkGraph.load(dest_path)
+        rebuild_all = graph is None
+    if rebuild_all:
+        stale_pages = [
+            (entry["source"], os.path.join(dest_path, rel_path))
+            for rel_path, entry in sorted(outputs.items())
+            if entry["kind"] == "page"
+        ]
+
+    results = generate_pages(
+        stale_pages,
+        template_path,
+        basepath,
+        jobs=jobs,
+        rewrite_url=rewrite_url,
+        cache_dir=cache_dir,
+        image_size=image_size,
+        collect=PageTerms if search else None,
+    )
+    listed_pages = listed = []
+    if (listings or site_url) and (stale_pages or removed_pages):
+        sources = {
+            rel_path: entry["source"]
+            for rel_path, entry in outputs.items()
+            if entry["kind"] == "page"
+        }
+        posts, entries = load_posts(dest_path, sources)
+        outputs.update(entries)
+        if listings:
+            entries, listed_pages, listed = update_listings(
+                dest_path,
+                sources,
+                posts,
+                template_path,
+                basepath,
+                listings,
+                rewrite_url,
+            )
+            removed_listings = drop_generated(outputs, dest_path, entries, is_listing)
+            outputs.update(entries)
+        if site_url:
+            lastmods = page_lastmods(outputs)
+            entries = update_feeds(
+                dest_path,
+                site_url,
+                basepath,
+                lastmods,
+                posts,
+                sources.get("index.html"),
+            )
+            drop_generated(outputs, dest_path, entries, is_feeds_file)
+            outputs.update(entries)
+    if search:
+        entries = update_search(
+            dest_path, basepath, stale_pages, results, removed_pages, index, outputs
+        )
+        drop_generated(outputs, dest_path, entries, is_search_file)
+        outputs.update(entries)
+    if check_links:
+        targets = link_targets(outputs, rewrite_url.assets if fingerprint else None)
+        outputs.update(
+            update_links(
+                dest_path,
+                stale_pages + listed_pages,
+                results + listed,
+                targets,
+                removed_pages + removed_listings,
+                graph,
+            )
+        )
+    save_manifest(dest_path, manifest)
+    touched = {
+        rel_path
+        for rel_path in before.keys() | outputs.keys()
+        if before.get(rel_path) != outputs.get(rel_path)
+    }
+    touched.update(os.path.relpath(output, dest_path) for _, output in stale_pages)
+    return stale_pages, sorted(touched)
+
+
+def build_options(args):
+    # The keyword options build_incremental and rebuild_paths share.
+    return {
+        "jobs": args.jobs,
+        "link": args.link,
+        "cache_dir": args.cache_dir,
+        "fingerprint": args.fingerprint,
+        "search": args.search,
+        "check_links": args.check_links,
+        "listings": args.listings,
+        "site_url": args.site_url,
+    }
+
+
+def watch_site(static_path, from_path, template_path, dest_path, args, stop=None):
+    if args.profile is not None:
+        profiling.start()
+    start = time.perf_counter()
+    files = snapshot_outputs(dest_path)
+    previous = load_manifest(dest_path)
+    manifest = build_incremental(
+        static_path,
+        from_path,
+        template_path,
+        dest_path,
+        args.basepath,
+        verify_hash=args.verify_hash,
+        precompressed=args.precompress,
+        **build_options(args),
+    )
+    finish_build(args, dest_path, previous, manifest)
+    report_build(args, dest_path, files, start)
+    print(f"Watching {from_path}, {static_path} and {template_path} for changes")
+    # Nobody knows what a failed rebuild got to write, so the one after it
+    # precompresses and reports on the whole tree again.
+    failed = False
+
+    def on_change(paths):
+        nonlocal failed
+        if args.profile is not None:
+            profiling.start()
+        start = time.perf_counter()
+        try:
+            _, touched = rebuild_paths(
+                manifest,
+                paths,
+                static_path,
+                from_path,
+                template_path,
+                dest_path,
+                args.basepath,
+                **build_options(args),
+            )
+            if failed:
+                touched = None
+            # The manifest is updated in place, so it is also the previous
+            # build's (see finish_build).
+            finish_build(args, dest_path, manifest, manifest, touched=touched)
+        except Exception as e:
+            # Keep watching: the next save will most likely fix it.
+            profiling.stop()
+            failed = True
+            print(f"Rebuild failed: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Rebuilt {len(paths)} changed path(s) in {elapsed:.0f} ms")
+        report_build(args, dest_path, files, start, touched)
+        failed = False
+
+    try:
+        watch([from_path, static_path, template_path], on_change, stop=stop)
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"only rebuild outputs whose inputs changed (generator {GENERATOR_VERSION})",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="render pages in N worker processes (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--verify-hash",
+        action="store_true",
+        help="with --incremental, also compare asset contents, not just size and mtime",
     )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="with --incremental, hard link assets into the output instead of copying",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="copy css, js, images and fonts to name.<hash>.ext, point links at "
+        "them and list them as immutable in _headers",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="write a full-text search index of the pages to search/",
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="report links to pages and files the site doesn't have, and pages "
+        "nothing links to",
+    )
+    parser.add_argument(
+        "--listings",
+        nargs="?",
+        const=DEFAULT_PER_PAGE,
+        type=int,
+        metavar="N",
+        help="generate blog/, tags/ and archive/ pages listing the posts in "
+        f"content/blog/ from their front matter, N to a page (default "
+        f"{DEFAULT_PER_PAGE})",
+    )
+    parser.add_argument(
+        "--site-url",
+        metavar="URL",
+        help="the address the site is served from, such as https://example.com;"
+        " writes sitemap.xml and an Atom feed of the posts, feed.xml",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="write .gz and .zz siblings next to text outputs",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=9,
+        choices=range(1, 10),
+        metavar="1-9",
+        help="compression level for --precompress (default 9)",
+    )
+    parser.add_argument(
+        "--compress-min-size",
+        type=int,
+        default=1024,
+        metavar="BYTES",
+        help="skip outputs smaller than this for --precompress (default 1024)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="cache rendered markdown blocks in DIR between builds",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        metavar="MB",
+        help="size cap for --cache-dir, least recently used blocks go first",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="build incrementally, then rebuild affected outputs as sources change",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile.json",
+        metavar="FILE",
+        help="time each build stage, write the report to FILE (default profile.json)"
+        " and print a summary",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        metavar="N",
+        help="list the N slowest pages in the --profile summary (default 10)",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="build only shard I of N into --shard-dir; `main.py merge` puts "
+        "the shards together",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        default=shards.DEFAULT_SHARD_DIR,
+        metavar="DIR",
+        help=f"where --shard builds go (default {shards.DEFAULT_SHARD_DIR})",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="log every generated page",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        for flag in ["search", "check_links", "listings", "site_url"]:
+            if getattr(args, flag):
+                option = "--" + flag.replace("_", "-")
+                parser.error(f"{option} can't be combined with --shard")
+    return args
 
-    with open(dest_path, "w") as f:
-        if not os.path.exists(os.path.dirname(dest_path)):
-            os.makedirs(os.path.dirname(dest_path))
 
-        f.write(html)
-        f.close()
+def prune_outputs(dest_path, produced, *, precompressed=False):
+    # Removes whatever an earlier build left in dest_path that this one
+    # didn't write, keeping the .gz/.zz siblings of outputs that are still
+    # there when they are about to be brought up to date.
+    for rel_path in walk_files(dest_path):
+        if rel_path in produced:
+            continue
+        if (
+            precompressed
+            and rel_path.endswith(VARIANT_SUFFIXES)
+            and os.path.splitext(rel_path)[0] in produced
+        ):
+            continue
+        remove_output(dest_path, rel_path)
+
+
+def finish_build(
+    args, dest_path, previous=None, manifest=None, produced=None, touched=None
+):
+    # The steps after pages and assets are in place. previous is the
+    # manifest of the build before this one, if there was one; produced
+    # lists what a build without a manifest wrote, and touched what a
+    # rebuild_paths call touched, when only those outputs need looking at.
+    if args.cache_dir is not None:
+        prune_block_cache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if args.precompress:
+        with profiling.stage("compress"):
+            compressed = precompress_tree(
+                dest_path,
+                previous.get("compressed") if previous else None,
+                manifest["outputs"] if manifest is not None else produced or (),
+                paths=touched,
+                level=args.compress_level,
+                min_size=args.compress_min_size,
+                jobs=args.jobs,
+            )
+        if manifest is not None:
+            manifest["compressed"] = compressed
+            save_manifest(dest_path, manifest)
+
+
+def report_build(args, dest_path, files, start, touched=None):
+    # Writes .changes.json for what the build changed in dest_path, and
+    # the profile if one is being taken. files is the snapshot of dest_path
+    # from before the build (see changes.snapshot_outputs); it is brought
+    # up to date in place, by walking the tree or, given the outputs a
+    # rebuild touched, by re-statting just those and their variants.
+    # Returns whether it printed a summary of the build.
+    if touched is None:
+        after = snapshot_outputs(dest_path)
+        changes = diff_outputs(files, after)
+        files.clear()
+        files.update(after)
+    else:
+        paths = list(touched)
+        paths += [
+            rel_path + suffix for rel_path in touched for suffix in VARIANT_SUFFIXES
+        ]
+        changes = refresh_outputs(files, dest_path, paths)
+    write_changes(dest_path, changes)
+    log.info(
+        "%d added, %d modified, %d deleted (see %s)",
+        len(changes["added"]),
+        len(changes["modified"]),
+        len(changes["deleted"]),
+        os.path.join(dest_path, CHANGES_NAME),
+    )
+
+    elapsed = time.perf_counter() - start
+    profile = profiling.stop()
+    if profile is None:
+        return False
+    report = profile.report(elapsed, top=args.profile_top)
+    with open(args.profile, "w") as f:
+        json.dump(report, f, indent=2)
+    print(profiling.format_summary(report))
+    print(f"Wrote profile to {args.profile}")
+    return True
 
 
 def main(argv):
-    basepath = sys.argv[1] if len(argv) > 0 else "/"
+    if argv[:1] == ["serve"]:
+        server.main(argv[1:])
+        return
+    if argv[:1] == ["daemon"]:
+        sys.exit(daemon.main(argv[1:]))
+    if argv[:1] == ["merge"]:
+        sys.exit(shards.main(argv[1:], DEST_PATH))
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s"
+    )
+    basepath = args.basepath
     print(basepath)
-    source = "static"
-    destination = "docs"
-    copy_filetree(source, destination, is_root=True)
-    from_path = "content"
-    dest_path = "docs"
-    template_path = "template.html"
-    generate_pages_recursive(from_path, template_path, dest_path, basepath)
+    source = STATIC_PATH
+    destination = DEST_PATH
+    from_path = CONTENT_PATH
+    dest_path = DEST_PATH
+    template_path = TEMPLATE_PATH
+    if args.watch:
+        watch_site(source, from_path, template_path, dest_path, args)
+        return
+    if args.profile is not None:
+        profiling.start()
+    start = time.perf_counter()
+    if args.shard is not None:
+        dest_path = shard_root(args.shard_dir, args.shard)
+    # Taken before anything is written, to tell deploys what changed.
+    before = snapshot_outputs(dest_path)
+    produced = None
+    if args.shard is not None:
+        previous = None
+        manifest = build_shard(
+            source,
+            from_path,
+            template_path,
+            dest_path,
+            basepath,
+            args.shard,
+            jobs=args.jobs,
+            link=args.link,
+            cache_dir=args.cache_dir,
+            fingerprint=args.fingerprint,
+        )
+    elif args.incremental:
+        previous = load_manifest(dest_path)
+        manifest = build_incremental(
+            source,
+            from_path,
+            template_path,
+            dest_path,
+            basepath,
+            jobs=args.jobs,
+            verify_hash=args.verify_hash,
+            link=args.link,
+            cache_dir=args.cache_dir,
+            fingerprint=args.fingerprint,
+            search=args.search,
+            check_links=args.check_links,
+            listings=args.listings,
+            site_url=args.site_url,
+            precompressed=args.precompress,
+        )
+    else:
+        previous = manifest = None
+        rewrite_url = None
+        image_size = ImageSizes(source)
+        if args.fingerprint:
+            check_tree_paths(source, destination)
+            os.makedirs(destination, exist_ok=True)
+            entries, rewrite_url = sync_static(source, destination, fingerprint=True)
+            produced = set(entries)
+        else:
+            copy_filetree(source, destination)
+            produced = set(walk_files(source))
+        produced.update(
+            page_output_path(rel_path) for rel_path in walk_files(from_path)
+        )
+        listed_pages = listed = []
+        listing_entries = {}
+        if args.listings or args.site_url:
+            sources = {
+                page_output_path(rel_path): os.path.join(from_path, rel_path)
+                for rel_path in walk_files(from_path)
+            }
+            posts, entries = load_posts(dest_path, sources)
+            produced.update(entries)
+        if args.listings:
+            listing_entries, listed_pages, listed = update_listings(
+                dest_path,
+                sources,
+                posts,
+                template_path,
+                basepath,
+                args.listings,
+                rewrite_url,
+            )
+            produced.update(listing_entries)
+        if args.site_url:
+            # No manifest to keep lastmods in, so they are the sources'
+            # mtimes.
+            lastmods = {
+                rel_path: lastmod(os.stat(source).st_mtime)
+                for rel_path, source in sources.items()
+            }
+            lastmods.update(dict.fromkeys(listing_entries))
+            produced.update(
+                update_feeds(
+                    dest_path,
+                    args.site_url,
+                    basepath,
+                    lastmods,
+                    posts,
+                    sources.get("index.html"),
+                )
+            )
+        pages = collect_pages(from_path, dest_path)
+        results = generate_pages(
+            pages,
+            template_path,
+            basepath,
+            jobs=args.jobs,
+            rewrite_url=rewrite_url,
+            cache_dir=args.cache_dir,
+            image_size=image_size,
+            collect=PageTerms if args.search else None,
+        )
+        if args.search:
+            produced.update(update_search(dest_path, basepath, pages, results))
+        if args.check_links:
+            targets = link_targets(
+                produced, rewrite_url.assets if args.fingerprint else None
+            )
+            produced.update(
+                update_links(dest_path, pages + listed_pages, results + listed, targets)
+            )
+        prune_outputs(dest_path, produced, precompressed=args.precompress)
+
+    finish_build(args, dest_path, previous, manifest, produced)
+    if not report_build(args, dest_path, before, start):
+        elapsed = time.perf_counter() - start
+        print(f"Built {dest_path} in {elapsed * 1000:.0f} ms")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+# Bump whenever a change to the generator alters the html it produces, so
+# incremental builds know every page has to be rendered again.
+GENERATOR_VERSION = "4"
+MANIFEST_NAME = ".manifest.json"
+
+# Build-wide inputs that every page depends on.
+PAGE_INPUTS = ("generator", "basepath", "template", "assets", "images")
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def new_manifest(basepath, template_hash):
+    return {
+        "generator": GENERATOR_VERSION,
+        "basepath": basepath,
+        "template": template_hash,
+        "assets": None,
+        "images": None,
+        "outputs": {},
+    }
+
+
+def load_manifest(dest_path):
+    # A missing or unreadable manifest just means nothing can be reused.
+    path = os.path.join(dest_path, MANIFEST_NAME)
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or "outputs" not in manifest:
+        return None
+    return manifest
+
+
+def save_manifest(dest_path, manifest):
+    path = os.path.join(dest_path, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def remove_output(dest_path, rel_path):
+    path = os.path.join(dest_path, rel_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+    # Prune directories left empty, but never the output root itself.
+    parent = os.path.dirname(path)
+    root = os.path.abspath(dest_path)
+    while os.path.abspath(parent) != root and os.path.isdir(parent):
+        if os.listdir(parent):
+            break
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
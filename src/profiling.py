@@ -0,0 +1,213 @@
+import sys
+import time
+from contextlib import nullcontext
+
+# Build stages in report order. Anything else that gets timed is listed
+# after these.
+STAGES = (
+    "walk",
+    "read",
+    "block_split",
+    "block_type",
+    "inline_parse",
+    "block_cache",
+    "serialize",
+    "template",
+    "write",
+    "asset_copy",
+    "search",
+    "links",
+    "listings",
+    "feeds",
+)
+
+_NULL = nullcontext()
+_DONE = object()
+_active = None
+
+
+class Profile:
+    # Wall time, allocated memory blocks and call counts per stage, for the
+    # whole site and for each page. Stages nest, and time spent in an inner
+    # stage is taken off the outer one, so the stages add up to the build.
+    # Allocations are the change in sys.getallocatedblocks(), which is cheap
+    # enough to read on every stage switch, unlike tracemalloc.
+    def __init__(self):
+        self.totals = {}
+        self.pages = {}
+        self.current = None
+        self.stack = []
+
+    def enter(self, name):
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        if self.stack:
+            self.charge(self.stack[-1], now, blocks, 0)
+        self.stack.append([name, now, blocks])
+
+    def exit(self):
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        self.charge(self.stack.pop(), now, blocks, 1)
+        if self.stack:
+            self.stack[-1][1] = now
+            self.stack[-1][2] = blocks
+
+    def charge(self, entry, now, blocks, calls):
+        name, start, start_blocks = entry
+        entry[1] = now
+        entry[2] = blocks
+        add_stage(self.totals, name, now - start, blocks - start_blocks, calls)
+        if self.current is not None:
+            add_stage(self.current, name, now - start, blocks - start_blocks, calls)
+
+    def merge_page(self, path, stages):
+        # Folds in a page profiled somewhere else, e.g. in a worker process.
+        page = self.pages.setdefault(path, {})
+        for name, (seconds, blocks, calls) in stages.items():
+            add_stage(page, name, seconds, blocks, calls)
+            add_stage(self.totals, name, seconds, blocks, calls)
+
+    def report(self, wall_seconds=None, top=10):
+        pages = {
+            path: {"seconds": stages_seconds(stages), "stages": stage_table(stages)}
+            for path, stages in sorted(self.pages.items())
+        }
+        slowest = sorted(pages, key=lambda path: pages[path]["seconds"], reverse=True)
+        report = {
+            "seconds": stages_seconds(self.totals),
+            "stages": stage_table(self.totals),
+            "page_count": len(pages),
+            "slowest_pages": [
+                {"page": path, "seconds": pages[path]["seconds"]}
+                for path in slowest[:top]
+            ],
+            "pages": pages,
+        }
+        if wall_seconds is not None:
+            report["wall_seconds"] = wall_seconds
+        return report
+
+
+class _Stage:
+    __slots__ = ("profile", "name")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.enter(self.name)
+
+    def __exit__(self, *exc):
+        self.profile.exit()
+
+
+class _Page:
+    __slots__ = ("profile", "path", "previous")
+
+    def __init__(self, profile, path):
+        self.profile = profile
+        self.path = path
+
+    def __enter__(self):
+        self.previous = self.profile.current
+        self.profile.current = self.profile.pages.setdefault(self.path, {})
+
+    def __exit__(self, *exc):
+        self.profile.current = self.previous
+
+
+def add_stage(stages, name, seconds, blocks, calls):
+    totals = stages.get(name)
+    if totals is None:
+        stages[name] = [seconds, blocks, calls]
+    else:
+        totals[0] += seconds
+        totals[1] += blocks
+        totals[2] += calls
+
+
+def stages_seconds(stages):
+    return sum(seconds for seconds, _, _ in stages.values())
+
+
+def stage_table(stages):
+    order = [name for name in STAGES if name in stages]
+    order += sorted(name for name in stages if name not in STAGES)
+    return {
+        name: {
+            "seconds": stages[name][0],
+            "allocated_blocks": stages[name][1],
+            "calls": stages[name][2],
+        }
+        for name in order
+    }
+
+
+def start():
+    global _active
+    _active = Profile()
+    return _active
+
+
+def stop():
+    global _active
+    profile, _active = _active, None
+    return profile
+
+
+def active():
+    return _active
+
+
+def stage(name):
+    # A no-op context manager unless a profile has been started, so callers
+    # can leave their stages in place at almost no cost.
+    if _active is None:
+        return _NULL
+    return _Stage(_active, name)
+
+
+def page(path):
+    if _active is None:
+        return _NULL
+    return _Page(_active, path)
+
+
+def timed_iter(name, iterable):
+    # Charges the work done producing each item (a generator's body) to name.
+    if _active is None:
+        return iterable
+    return _timed_iter(name, iter(iterable))
+
+
+def _timed_iter(name, iterator):
+    while True:
+        with stage(name):
+            item = next(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+def format_summary(report):
+    lines = []
+    total = report["seconds"] or 1
+    if "wall_seconds" in report:
+        lines.append(
+            f"Built {report['page_count']} page(s) in "
+            f"{report['wall_seconds'] * 1000:.0f} ms"
+        )
+    lines.append(f"{'stage':<14}{'ms':>10}{'share':>8}{'blocks':>12}{'calls':>10}")
+    for name, row in report["stages"].items():
+        lines.append(
+            f"{name:<14}{row['seconds'] * 1000:>10.1f}"
+            f"{row['seconds'] / total:>8.1%}"
+            f"{row['allocated_blocks']:>12}{row['calls']:>10}"
+        )
+    if report["slowest_pages"]:
+        lines.append("slowest pages:")
+        for row in report["slowest_pages"]:
+            lines.append(f"{row['seconds'] * 1000:>10.1f} ms  {row['page']}")
+    return "\n".join(lines)
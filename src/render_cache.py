@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from manifest import GENERATOR_VERSION
+from urls import basepath_rewriter
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+MEMORY_ENTRIES = 4096
+OPEN_CACHES = 8
+
+# A cache directory name for a cache that is only kept in memory, for
+# long-running processes that weren't given a directory.
+MEMORY_CACHE = ":memory:"
+
+# Bump when what an entry holds changes, so old files are never misread.
+CACHE_FORMAT = "3"
+
+# One cache per (directory, namespace) in each process, so a worker or a
+# watch/daemon process keeps its in-memory layer across pages and builds.
+# Every asset map is a namespace of its own, so only the most recently
+# used OPEN_CACHES are kept.
+_caches = OrderedDict()
+
+# Bytes in each cache directory after this process last pruned it, plus
+# what the process has written there since, so --watch and daemon
+# rebuilds only walk a cache that may have outgrown its limit.
+_sizes = {}
+
+
+class BlockCache:
+    # Rendered html for single markdown blocks, addressed by a hash of the
+    # block's source, the generator version and a namespace naming whatever
+    # else shapes the html (the URL rewriting). Each entry also keeps what
+    # the block adds to its page's metadata (see textnode.block_summary),
+    # and the block's inline nodes as (text, type, url) lists, for
+    # collectors that want the page's text without parsing it again. Hot
+    # entries live in an in-memory LRU; every entry is also a file under
+    # directory, if there is one, so the cache survives between builds and
+    # is shared by worker processes.
+    def __init__(self, directory, namespace="", rewrite_url=None):
+        self.directory = directory
+        self.namespace = namespace
+        self.rewrite_url = rewrite_url
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, lines):
+        digest = hashlib.sha256()
+        digest.update(
+            f"{GENERATOR_VERSION}\0{CACHE_FORMAT}\0{self.namespace}\0".encode()
+        )
+        digest.update("\n".join(lines).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + ".json")
+
+    def get(self, key):
+        # (html, summary, nodes) for the block, or None.
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry
+        if self.directory is None:
+            self.misses += 1
+            return None
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                html, summary, nodes = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # The mtime doubles as the last-used time for prune_block_cache.
+        os.utime(path)
+        entry = (html, summary, nodes)
+        self.remember(key, entry)
+        self.hits += 1
+        return entry
+
+    def put(self, key, html, summary=(0, (), ()), nodes=()):
+        entry = (html, summary, list(nodes))
+        self.remember(key, entry)
+        if self.directory is None:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        data = json.dumps(entry, separators=(",", ":"))
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        directory = os.path.abspath(self.directory)
+        if directory in _sizes:
+            _sizes[directory] += len(data)
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+
+def open_block_cache(directory, basepath="/", rewrite_url=None):
+    # Fragments are cached after URL rewriting, so the basepath and hook are
+    # part of every key. A hook that depends on data (like the asset map)
+    # names that data with a cache_key attribute.
+    hook = ""
+    if hasattr(rewrite_url, "cache_key"):
+        hook = rewrite_url.cache_key
+    elif rewrite_url is not None:
+        hook = f"{rewrite_url.__module__}.{rewrite_url.__qualname__}"
+    namespace = f"{basepath}\0{hook}"
+    if directory == MEMORY_CACHE:
+        key = (None, namespace)
+    else:
+        key = (os.path.abspath(directory), namespace)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = BlockCache(key[0], namespace, basepath_rewriter(basepath, rewrite_url))
+        _caches[key] = cache
+    _caches.move_to_end(key)
+    while len(_caches) > OPEN_CACHES:
+        _caches.popitem(last=False)
+    return cache
+
+
+def prune_block_cache(directory, max_bytes=DEFAULT_MAX_BYTES):
+    # Drops the least recently used entries until the cache fits.
+    if _sizes.get(os.path.abspath(directory), max_bytes + 1) <= max_bytes:
+        return 0
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+    entries.sort()
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    _sizes[os.path.abspath(directory)] = total
+    return removed
+
+
+def forget_block_cache_size(directory):
+    # For when other processes (render workers) may have written to the
+    # cache: the next prune walks it again.
+    _sizes.pop(os.path.abspath(directory), None)
+
+
+def block_cache_stats():
+    # Totals over every cache this process has opened.
+    stats = {"caches": len(_caches), "in_memory": 0, "hits": 0, "misses": 0}
+    for cache in _caches.values():
+        stats["in_memory"] += len(cache.memory)
+        stats["hits"] += cache.hits
+        stats["misses"] += cache.misses
+    return stats
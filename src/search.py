@@ -0,0 +1,304 @@
+import json
+import os
+import re
+
+from assets import replace_if_changed, walk_files
+from manifest import hash_bytes, remove_output
+from textnode import TextType
+from urls import basepath_rewriter
+
+# A full-text index built with the site, for searching without a server.
+# Everything lives under search/ in the output:
+#
+#   search/index.json       {"version", "prefix_length", "shards": [...]}
+#   search/pages.json       [{"url", "title", "shards", "terms"}, ...] by
+#                           page id, null for gaps
+#   search/terms/<s>.json   {term: postings} for the terms in shard s
+#
+# A term's shard is its first PREFIX_LENGTH characters when those are ASCII
+# letters and digits, and otherwise "_" and the hex of their UTF-8, so a
+# client only fetches the shards for the terms it was asked about. Postings
+# are one flat list of numbers per term, for page ids in increasing order:
+#
+#   [id gap, count, position gap, position gap, ..., id gap, count, ...]
+#
+# where positions count words from the top of the page. Gaps keep the
+# numbers small, and the files compress well with --precompress.
+#
+# Page ids are kept from one incremental build to the next, so an edit
+# only reads and rewrites the shards of the terms that page had or has,
+# which pages.json lists with each page.
+
+SEARCH_DIR = "search"
+INDEX_VERSION = 2
+PREFIX_LENGTH = 2
+TERM_PATTERN = re.compile(r"\w+")
+
+# What a reader sees as text; image alt text and URLs are left out.
+INDEXED_TYPES = {
+    TextType.TEXT,
+    TextType.BOLD,
+    TextType.ITALIC,
+    TextType.CODE,
+    TextType.LINK,
+}
+
+
+class PageTerms:
+    # markdown_to_page collector that records where each term appears
+    # on a page. Built in the process that renders the page; only result()
+    # travels back from worker processes.
+    def __init__(self):
+        self.terms = {}
+        self.words = 0
+
+    def add_block(self, block_type, lines, text_nodes):
+        for node in text_nodes:
+            if node.text_type not in INDEXED_TYPES:
+                continue
+            for term in TERM_PATTERN.findall(node.text.lower()):
+                positions = self.terms.get(term)
+                if positions is None:
+                    self.terms[term] = [self.words]
+                else:
+                    positions.append(self.words)
+                self.words += 1
+
+    def result(self):
+        return {"terms": self.terms}
+
+
+def shard_name(term):
+    prefix = term[:PREFIX_LENGTH]
+    if prefix.isascii() and prefix.isalnum():
+        return prefix
+    return "_" + prefix.encode().hex()
+
+
+def page_url(rel_path, basepath):
+    # The URL a reader would visit for a page output.
+    url = "/" + rel_path.replace(os.sep, "/")
+    if url.endswith("/index.html"):
+        url = url[: -len("index.html")]
+    return basepath_rewriter(basepath)(url)
+
+
+def encode_postings(postings):
+    encoded = []
+    last_id = 0
+    for page_id in sorted(postings):
+        positions = postings[page_id]
+        encoded.append(page_id - last_id)
+        encoded.append(len(positions))
+        last_position = 0
+        for position in positions:
+            encoded.append(position - last_position)
+            last_position = position
+        last_id = page_id
+    return encoded
+
+
+def decode_postings(encoded):
+    postings = {}
+    page_id = 0
+    i = 0
+    while i < len(encoded):
+        page_id += encoded[i]
+        count = encoded[i + 1]
+        positions = []
+        position = 0
+        for gap in encoded[i + 2 : i + 2 + count]:
+            position += gap
+            positions.append(position)
+        postings[page_id] = positions
+        i += 2 + count
+    return postings
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), sort_keys=True) + "\n"
+
+
+class SearchIndex:
+    def __init__(self, root=None):
+        self.pages = []
+        self.ids = {}
+        self.postings = {}
+        # A loaded index reads its shards from root as updates need them;
+        # unread are the ones it hasn't yet.
+        self.root = root
+        self.unread = set()
+        # Shards whose terms changed since the index was loaded; None for a
+        # new index, which has every shard still to write.
+        self.touched = None
+
+    @classmethod
+    def load(cls, dest_path):
+        # The index a previous build wrote to dest_path, or None if there
+        # isn't a whole one to build on.
+        root = os.path.join(dest_path, SEARCH_DIR)
+        try:
+            meta = _read_json(os.path.join(root, "index.json"))
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            if meta.get("prefix_length") != PREFIX_LENGTH:
+                return None
+            index = cls(root)
+            index.pages = _read_json(os.path.join(root, "pages.json"))
+            index.unread = set(meta["shards"])
+            index.ids = {
+                page["url"]: page_id
+                for page_id, page in enumerate(index.pages)
+                if page is not None
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        index.touched = set()
+        return index
+
+    def read_shards(self, names):
+        # Reads whichever of the named shards haven't been yet.
+        for name in sorted(self.unread.intersection(names)):
+            self.unread.discard(name)
+            terms = _read_json(os.path.join(self.root, shard_path(name)))
+            for term, encoded in terms.items():
+                self.postings[term] = decode_postings(encoded)
+
+    def lookup(self, term):
+        # The postings of term, by page id.
+        self.read_shards([shard_name(term)])
+        return self.postings.get(term, {})
+
+    def drop(self, page_ids):
+        # Takes the pages out of the postings of the terms they list.
+        for page_id in page_ids:
+            page = self.pages[page_id]
+            self.read_shards(page["shards"])
+            for term in page["terms"]:
+                postings = self.postings.get(term)
+                if postings is None or postings.pop(page_id, None) is None:
+                    continue
+                self.touch(term)
+                if not postings:
+                    del self.postings[term]
+
+    def update(self, pages, removed=()):
+        # pages maps the URL of every page that was rendered to its title
+        # and PageTerms result; removed lists URLs of pages that are gone.
+        gone = [self.ids.pop(url) for url in removed if url in self.ids]
+        self.drop(gone + [self.ids[url] for url in pages if url in self.ids])
+        for page_id in gone:
+            self.pages[page_id] = None
+
+        free = [page_id for page_id, page in enumerate(self.pages) if page is None]
+        free.reverse()
+        for url, (title, terms) in pages.items():
+            page_id = self.ids.get(url)
+            if page_id is None:
+                page_id = free.pop() if free else len(self.pages)
+                if page_id == len(self.pages):
+                    self.pages.append(None)
+                self.ids[url] = page_id
+            shards = sorted({shard_name(term) for term in terms})
+            self.read_shards(shards)
+            self.pages[page_id] = {
+                "url": url,
+                "title": title,
+                "shards": shards,
+                "terms": sorted(terms),
+            }
+            for term, positions in terms.items():
+                self.postings.setdefault(term, {})[page_id] = positions
+                self.touch(term)
+
+        # Trailing gaps would only make pages.json longer.
+        while self.pages and self.pages[-1] is None:
+            self.pages.pop()
+
+    def touch(self, term):
+        if self.touched is not None:
+            self.touched.add(shard_name(term))
+
+    def shard_names(self):
+        return self.unread | {shard_name(term) for term in self.postings}
+
+    def files(self, shards=None):
+        # The files of the index as text, keyed by path under search/: all
+        # of them, or the two top-level ones and the given shards that
+        # still have terms.
+        self.read_shards(self.unread if shards is None else shards)
+        terms = {}
+        for term in self.postings:
+            name = shard_name(term)
+            if shards is None or name in shards:
+                terms.setdefault(name, []).append(term)
+        files = {
+            "index.json": _dumps(
+                {
+                    "version": INDEX_VERSION,
+                    "prefix_length": PREFIX_LENGTH,
+                    "shards": sorted(self.shard_names()),
+                }
+            ),
+            "pages.json": _dumps(self.pages),
+        }
+        for name, shard_terms in terms.items():
+            files[shard_path(name)] = _dumps(
+                {term: encode_postings(self.postings[term]) for term in shard_terms}
+            )
+        return files
+
+
+def shard_path(name):
+    return os.path.join("terms", name + ".json")
+
+
+def is_search_file(rel_path):
+    return rel_path.startswith(SEARCH_DIR + os.sep)
+
+
+def write_search_index(dest_path, index, outputs=None):
+    # Writes the index under dest_path and returns its manifest entries. An
+    # index that was loaded only writes the shards its updates touched and
+    # takes the other shards' entries from outputs, the previous manifest's,
+    # so an edit costs what it changed rather than the whole index. Files
+    # whose contents didn't change are left alone, and shards that are now
+    # empty are removed.
+    names = index.shard_names()
+    shards = None
+    if index.touched is not None and outputs is not None:
+        # A shard the manifest doesn't list can't be trusted to be on disk.
+        shards = index.touched | {
+            name
+            for name in names
+            if os.path.join(SEARCH_DIR, shard_path(name)) not in outputs
+        }
+    entries = {}
+    for name, text in index.files(shards).items():
+        rel_path = os.path.join(SEARCH_DIR, name)
+        path = os.path.join(dest_path, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        replace_if_changed(tmp_path, path)
+        entries[rel_path] = {"kind": "generated", "hash": hash_bytes(text.encode())}
+
+    if shards is None:
+        root = os.path.join(dest_path, SEARCH_DIR)
+        stale = [os.path.join(SEARCH_DIR, rel_path) for rel_path in walk_files(root)]
+    else:
+        for name in names - shards:
+            rel_path = os.path.join(SEARCH_DIR, shard_path(name))
+            entries[rel_path] = outputs[rel_path]
+        stale = [os.path.join(SEARCH_DIR, shard_path(name)) for name in shards - names]
+    for rel_path in stale:
+        if rel_path.endswith(".json") and rel_path not in entries:
+            remove_output(dest_path, rel_path)
+    index.touched = set()
+    return entries
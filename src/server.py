@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import email.utils
+import mimetypes
+import os
+import sys
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from fingerprint import IMMUTABLE
+from manifest import PAGE_INPUTS, hash_bytes, load_manifest
+
+# Precompressed siblings written next to an output, in order of preference.
+ENCODINGS = [("gzip", ".gz"), ("deflate", ".zz")]
+
+SENDFILE_THRESHOLD = 64 * 1024
+CACHE_FILE_LIMIT = 256 * 1024
+CACHE_TOTAL_LIMIT = 64 * 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+}
+
+
+class FileCache:
+    # Least recently used small files, keyed by path and invalidated by
+    # (mtime, size), so hot pages and stylesheets are served from memory.
+    def __init__(self, total_limit=CACHE_TOTAL_LIMIT):
+        self.total_limit = total_limit
+        self.total = 0
+        self.entries = OrderedDict()
+
+    def get(self, path, stat):
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != (stat.st_mtime_ns, stat.st_size):
+            return None
+        self.entries.move_to_end(path)
+        return entry[1]
+
+    def put(self, path, stat, data):
+        old = self.entries.pop(path, None)
+        if old is not None:
+            self.total -= len(old[1])
+        self.entries[path] = ((stat.st_mtime_ns, stat.st_size), data)
+        self.total += len(data)
+        while self.total > self.total_limit and self.entries:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total -= len(evicted)
+
+
+class StaticSite:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.cache = FileCache()
+        self.etags = {}
+        self.manifest = None
+        self.manifest_mtime = None
+
+    def resolve(self, url_path):
+        # Maps a request path onto a file under root, the way the generated
+        # links expect: "/blog/tom" and "/blog/tom/" serve blog/tom/index.html.
+        path = unquote(url_path.split("?", 1)[0].split("#", 1)[0])
+        parts = [part for part in path.split("/") if part not in ("", ".")]
+        # Dotfiles (the build manifest) and anything escaping root stay hidden.
+        if any(
+            part.startswith(".") or os.sep in part or "\0" in part for part in parts
+        ):
+            return None, None
+        rel_path = "/".join(parts)
+        full_path = os.path.join(self.root, *parts)
+        if os.path.isdir(full_path):
+            rel_path = f"{rel_path}/index.html" if rel_path else "index.html"
+            full_path = os.path.join(full_path, "index.html")
+        elif not os.path.exists(full_path) and os.path.isfile(full_path + ".html"):
+            rel_path += ".html"
+            full_path += ".html"
+        if not os.path.isfile(full_path):
+            return None, None
+        return rel_path, full_path
+
+    def refresh_manifest(self):
+        path = os.path.join(self.root, ".manifest.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.manifest_mtime:
+            self.manifest = load_manifest(self.root) if mtime is not None else None
+            self.manifest_mtime = mtime
+            # ETags may have come from the old manifest's hashes.
+            self.etags.clear()
+
+    def manifest_entry(self, rel_path):
+        if self.manifest is None:
+            return None
+        return self.manifest["outputs"].get(rel_path)
+
+    def etag(self, rel_path, full_path, stat):
+        self.refresh_manifest()
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        etag = self.etags.get(key)
+        if etag is not None:
+            return etag
+        entry = self.manifest_entry(rel_path)
+        if (
+            entry is not None
+            and entry["kind"] == "asset"
+            and entry.get("size") == stat.st_size
+            and entry.get("output_mtime", entry.get("mtime")) == stat.st_mtime_ns
+        ):
+            etag = f'"{entry["hash"][:32]}"'
+        elif entry is not None and entry["kind"] == "page":
+            # A page is a function of its source and every build-wide input.
+            inputs = [str(self.manifest.get(key)) for key in PAGE_INPUTS]
+            digest = hash_bytes("\0".join(inputs + [entry["hash"]]).encode())
+            etag = f'"{digest[:32]}"'
+        else:
+            # Hashing the file here would hold up the event loop; builds
+            # leave unchanged outputs alone, so size and mtime are as good.
+            etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.etags[key] = etag
+        return etag
+
+
+def parse_range(header, size):
+    # Single byte ranges only; anything else is served whole. Returns None
+    # for a range to ignore (RFC 9110 says to ignore invalid ones) and
+    # False for one the file can't satisfy (416).
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    if not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        return None
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    first = int(start)
+    last = int(end) if end else size - 1
+    if end and last < first:
+        return None
+    if first >= size:
+        return False
+    return first, min(last, size - 1)
+
+
+def etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        return False
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    method, target, version = parts
+    return method, target, version, headers
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+    lines += [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_file(writer, path, offset, count, site, stat):
+    if count < SENDFILE_THRESHOLD:
+        data = site.cache.get(path, stat) if stat.st_size <= CACHE_FILE_LIMIT else None
+        if data is None:
+            with open(path, "rb") as f:
+                if stat.st_size <= CACHE_FILE_LIMIT:
+                    data = f.read()
+                    site.cache.put(path, stat, data)
+                else:
+                    f.seek(offset)
+                    data = f.read(count)
+                    offset = 0
+        writer.write(data[offset : offset + count])
+        return
+    await writer.drain()
+    with open(path, "rb") as f:
+        # loop.sendfile uses os.sendfile when the transport allows it and
+        # falls back to reading chunks otherwise (e.g. under TLS).
+        await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+
+async def handle_request(site, writer, method, target, headers):
+    base_headers = [
+        ("Date", email.utils.formatdate(usegmt=True)),
+        ("Server", "httpserver"),
+    ]
+    if method not in ("GET", "HEAD"):
+        writer.write(
+            response_head(
+                405, base_headers + [("Allow", "GET, HEAD"), ("Content-Length", "0")]
+            )
+        )
+        return
+
+    rel_path, full_path = site.resolve(target)
+    if full_path is None:
+        body = b"Not Found\n"
+        writer.write(
+            response_head(
+                404,
+                base_headers
+                + [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))],
+            )
+        )
+        if method == "GET":
+            writer.write(body)
+        return
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+    if content_type.startswith("text/"):
+        content_type += "; charset=utf-8"
+    stat = os.stat(full_path)
+    etag = site.etag(rel_path, full_path, stat)
+    response_headers = base_headers + [
+        ("Content-Type", content_type),
+        ("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)),
+        ("Vary", "Accept-Encoding"),
+    ]
+    entry = site.manifest_entry(rel_path)
+    if entry is not None and entry.get("immutable"):
+        response_headers.append(("Cache-Control", IMMUTABLE))
+
+    # A precompressed sibling is only used when it is at least as new as
+    # the file it was made from, and never for range requests.
+    serve_path = full_path
+    serve_stat = stat
+    range_header = headers.get("range")
+    if range_header is None:
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except FileNotFoundError:
+                continue
+            if variant_stat.st_mtime_ns >= stat.st_mtime_ns:
+                serve_path = full_path + suffix
+                serve_stat = variant_stat
+                etag = etag[:-1] + f'-{encoding}"'
+                response_headers.append(("Content-Encoding", encoding))
+                break
+    response_headers.append(("ETag", etag))
+
+    if etag_matches(headers.get("if-none-match", ""), etag):
+        writer.write(response_head(304, response_headers))
+        return
+
+    size = serve_stat.st_size
+    status, offset, count = 200, 0, size
+    response_headers.append(("Accept-Ranges", "bytes"))
+    if range_header is not None and etag_matches(headers.get("if-range", etag), etag):
+        byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            writer.write(
+                response_head(
+                    416,
+                    response_headers
+                    + [("Content-Range", f"bytes */{size}"), ("Content-Length", "0")],
+                )
+            )
+            return
+        if byte_range is not None:
+            status = 206
+            offset, count = byte_range[0], byte_range[1] - byte_range[0] + 1
+            response_headers.append(
+                ("Content-Range", f"bytes {byte_range[0]}-{byte_range[1]}/{size}")
+            )
+
+    response_headers.append(("Content-Length", str(count)))
+    writer.write(response_head(status, response_headers))
+    if method == "GET" and count:
+        await send_file(writer, serve_path, offset, count, site, serve_stat)
+
+
+async def handle_connection(site, reader, writer):
+    try:
+        while True:
+            request = await read_request(reader)
+            if request is None:
+                break
+            if request is False:
+                writer.write(
+                    response_head(
+                        400, [("Content-Length", "0"), ("Connection", "close")]
+                    )
+                )
+                break
+            method, target, version, headers = request
+            await handle_request(site, writer, method, target, headers)
+            await writer.drain()
+            connection = headers.get("connection", "").lower()
+            if connection == "close" or (
+                version == "HTTP/1.0" and connection != "keep-alive"
+            ):
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(root, host="127.0.0.1", port=8888):
+    site = StaticSite(root)
+    return await asyncio.start_server(
+        lambda reader, writer: handle_connection(site, reader, writer), host, port
+    )
+
+
+async def serve(root, host, port):
+    server = await start_server(root, host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Serving {root} on http://{address[0]}:{address[1]}/")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve")
+    parser.add_argument("--root", default="docs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.root, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import os
+import sys
+
+from assets import check_tree_paths, place_file, same_contents, walk_files
+from changes import CHANGES_NAME, diff_outputs, snapshot_outputs, write_changes
+from manifest import (
+    MANIFEST_NAME,
+    hash_file,
+    load_manifest,
+    remove_output,
+    save_manifest,
+)
+
+# A big site can be built on several machines at once:
+#
+#   python3 src/main.py --shard 1/3 /blog/     # on each of three machines,
+#   python3 src/main.py --shard 2/3 /blog/     # into shards/<i>-of-3
+#   python3 src/main.py --shard 3/3 /blog/
+#   python3 src/main.py merge                  # once the shards are gathered
+#
+# The merged docs/ is byte for byte what a single build would have written.
+
+DEFAULT_SHARD_DIR = "shards"
+
+# Build-wide inputs every shard must agree on. The image sizes are not
+# among them: each shard only scans the images it copies, and the merged
+# manifest gets the union.
+SHARED_INPUTS = ("generator", "basepath", "template", "assets")
+
+
+def parse_shard(text):
+    # "i/N", counting shards from 1.
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index = count = 0
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"shard must look like i/N with 1 <= i <= N, not {text!r}")
+    return index, count
+
+
+def shard_of(rel_path, count):
+    # Which of count shards a source file belongs to. Only the path decides,
+    # so every machine agrees without talking to the others, and a file
+    # stays in its shard while it's edited.
+    key = rel_path.replace(os.sep, "/").encode()
+    return int(hashlib.sha256(key).hexdigest()[:16], 16) % count + 1
+
+
+def in_shard(rel_path, shard):
+    index, count = shard
+    return shard_of(rel_path, count) == index
+
+
+def shard_root(shard_dir, shard):
+    index, count = shard
+    return os.path.join(shard_dir, f"{index}-of-{count}")
+
+
+def find_shard_roots(shard_dir):
+    if not os.path.isdir(shard_dir):
+        return []
+    return sorted(
+        os.path.join(shard_dir, name)
+        for name in os.listdir(shard_dir)
+        if "-of-" in name and os.path.isdir(os.path.join(shard_dir, name))
+    )
+
+
+def merge_shards(roots, dest_path, *, link=False):
+    # Combines shard output roots into dest_path, which is replaced, and
+    # returns the merged manifest. Nothing is written unless the shards are
+    # one complete, consistent set and no two of them disagree about a file.
+    problems = []
+    manifests = []
+    for root in roots:
+        manifest = load_manifest(root)
+        if manifest is None or "shard" not in manifest:
+            problems.append(f"{root}: no shard manifest")
+        manifests.append(manifest)
+    if problems:
+        raise Exception("cannot merge shards:\n" + "\n".join(problems))
+
+    counts = {manifest["shard"]["count"] for manifest in manifests}
+    indexes = sorted(manifest["shard"]["index"] for manifest in manifests)
+    if len(counts) != 1 or indexes != list(range(1, max(counts) + 1)):
+        found = ", ".join(
+            f"{m['shard']['index']}/{m['shard']['count']}" for m in manifests
+        )
+        problems.append(f"expected shards 1/N to N/N exactly once, found {found}")
+    for key in SHARED_INPUTS:
+        values = {str(manifest.get(key)) for manifest in manifests}
+        if len(values) > 1:
+            problems.append(f"shards were built with different {key}")
+
+    merged = {key: manifests[0].get(key) for key in SHARED_INPUTS}
+    merged["images"] = {}
+    merged["outputs"] = {}
+    compressed = {}
+    owners = {}
+    for root, manifest in zip(roots, manifests):
+        merged["images"].update(manifest.get("images") or {})
+        compressed.update(manifest.get("compressed") or {})
+        for rel_path, entry in manifest["outputs"].items():
+            existing = merged["outputs"].setdefault(rel_path, entry)
+            if existing != entry:
+                problems.append(f"{rel_path}: built differently by two shards")
+        for rel_path in walk_files(root):
+            if rel_path in (MANIFEST_NAME, CHANGES_NAME):
+                continue
+            if rel_path not in owners:
+                owners[rel_path] = root
+                continue
+            other = owners[rel_path]
+            if hash_file(os.path.join(other, rel_path)) != hash_file(
+                os.path.join(root, rel_path)
+            ):
+                problems.append(f"{rel_path}: differs between {other} and {root}")
+    if problems:
+        raise Exception(
+            f"cannot merge shards, {len(problems)} conflict(s):\n" + "\n".join(problems)
+        )
+    if compressed:
+        merged["compressed"] = compressed
+
+    # Files dest_path already has with the same contents are left alone,
+    # so the changes a merge reports are only what the site changed.
+    for root in roots:
+        check_tree_paths(root, dest_path)
+    os.makedirs(dest_path, exist_ok=True)
+    for rel_path in walk_files(dest_path):
+        if rel_path not in owners and rel_path not in (MANIFEST_NAME, CHANGES_NAME):
+            remove_output(dest_path, rel_path)
+    for rel_path, root in sorted(owners.items()):
+        source = os.path.join(root, rel_path)
+        destination = os.path.join(dest_path, rel_path)
+        if not same_contents(source, destination):
+            place_file(source, destination, link=link)
+    save_manifest(dest_path, merged)
+    return merged
+
+
+def main(argv, dest_path):
+    parser = argparse.ArgumentParser(prog="main.py merge")
+    parser.add_argument(
+        "roots",
+        nargs="*",
+        metavar="ROOT",
+        help="shard output roots (default: every <i>-of-<n> in --shard-dir)",
+    )
+    parser.add_argument("--shard-dir", default=DEFAULT_SHARD_DIR, metavar="DIR")
+    parser.add_argument("--dest", default=dest_path, metavar="DIR")
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="hard link files into the output instead of copying",
+    )
+    args = parser.parse_args(argv)
+    roots = args.roots or find_shard_roots(args.shard_dir)
+    if not roots:
+        print(f"no shards to merge in {args.shard_dir}", file=sys.stderr)
+        return 1
+    before = snapshot_outputs(args.dest)
+    try:
+        merged = merge_shards(roots, args.dest, link=args.link)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    write_changes(args.dest, diff_outputs(before, snapshot_outputs(args.dest)))
+    print(
+        f"Merged {len(roots)} shard(s), {len(merged['outputs'])} outputs, into {args.dest}"
+    )
+    return 0
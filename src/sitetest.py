@@ -0,0 +1,24 @@
+import os
+import tempfile
+import unittest
+
+# Shared by the tests that build a site: each test runs in its own
+# temporary directory, so the site's relative paths (content/, static/,
+# docs/ ...) land there.
+
+
+class SiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, "r") as f:
+            return f.read()
@@ -0,0 +1,72 @@
+import os
+import re
+from collections import OrderedDict
+
+SLOT_PATTERN = re.compile(r"\{\{ (\w+) \}\}")
+# Whole attribute names only: data-src="..." is left alone.
+URL_ATTRIBUTE_PATTERN = re.compile(r'(?<=\s)(href|src)="([^"]*)"')
+
+# Compiled templates by (path, rewrite_url), each tagged with the mtime it
+# was read at. A build reads every template once per process; the least
+# recently used go first, so long-running processes don't keep one for
+# every hook they have seen.
+CACHE_SIZE = 16
+_cache = OrderedDict()
+
+
+def rewrite_urls(html, rewrite_url):
+    if rewrite_url is None:
+        return html
+    return URL_ATTRIBUTE_PATTERN.sub(
+        lambda match: f'{match.group(1)}="{rewrite_url(match.group(2))}"', html
+    )
+
+
+class Template:
+    def __init__(self, text, rewrite_url=None):
+        # Alternating static text and slot names: even indexes are static
+        # (with their links already rewritten), odd indexes name a {{ Slot }}.
+        self.parts = []
+        position = 0
+        for match in SLOT_PATTERN.finditer(text):
+            self.parts.append(rewrite_urls(text[position : match.start()], rewrite_url))
+            self.parts.append(match.group(1))
+            position = match.end()
+        self.parts.append(rewrite_urls(text[position:], rewrite_url))
+
+    def emit(self, emit, slots):
+        for index, part in enumerate(self.parts):
+            if index % 2 == 0:
+                emit(part)
+                continue
+            value = slots.get(part)
+            if value is None:
+                emit(f"{{{{ {part} }}}}")
+            elif callable(value):
+                value(emit)
+            else:
+                emit(value)
+
+    def render(self, slots):
+        parts = []
+        self.emit(parts.append, slots)
+        return "".join(parts)
+
+    def write(self, stream, slots):
+        self.emit(stream.write, slots)
+
+
+def load_template(path, rewrite_url=None):
+    key = (os.path.abspath(path), rewrite_url)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        _cache.move_to_end(key)
+        return cached[1]
+    with open(path, "r") as f:
+        template = Template(f.read(), rewrite_url)
+    _cache[key] = (mtime, template)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return template
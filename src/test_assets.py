@@ -0,0 +1,95 @@
+import os
+import unittest
+
+from assets import replace_if_changed, sync_file, sync_filetree
+from sitetest import SiteTestCase
+
+
+class TestSyncFile(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("static/index.css", "body {}")
+        self.write("static/images/a.png", "png bytes")
+
+    def test_copies_new_file_and_keeps_mtime(self):
+        entry, copied = sync_file("static/index.css", "docs/index.css")
+        self.assertTrue(copied)
+        self.assertEqual(
+            os.stat("docs/index.css").st_mtime_ns,
+            os.stat("static/index.css").st_mtime_ns,
+        )
+        self.assertEqual(entry["size"], 7)
+        self.assertEqual(len(entry["hash"]), 64)
+
+    def test_skips_unchanged_file(self):
+        entry, _ = sync_file("static/index.css", "docs/index.css")
+        _, copied = sync_file("static/index.css", "docs/index.css", entry)
+        self.assertFalse(copied)
+
+    def test_recopies_when_size_differs(self):
+        sync_file("static/index.css", "docs/index.css")
+        self.write("static/index.css", "body { margin: 0 }")
+        _, copied = sync_file("static/index.css", "docs/index.css")
+        self.assertTrue(copied)
+
+    def test_touched_file_is_not_rewritten(self):
+        entry, _ = sync_file("static/index.css", "docs/index.css")
+        stat = os.stat("docs/index.css")
+        os.utime("static/index.css", ns=(0, stat.st_mtime_ns + 10**9))
+        again, copied = sync_file("static/index.css", "docs/index.css", entry)
+        self.assertFalse(copied)
+        self.assertEqual(os.stat("docs/index.css").st_mtime_ns, stat.st_mtime_ns)
+        self.assertEqual(again["hash"], entry["hash"])
+
+        # The comparison is done once: from now on the output's own mtime
+        # is what's expected, so a same-size edit that keeps the source's
+        # mtime goes unnoticed without verify_hash, like any other file.
+        touched = os.stat("static/index.css")
+        self.write("static/index.css", "body []")
+        os.utime("static/index.css", ns=(touched.st_atime_ns, touched.st_mtime_ns))
+        third, copied = sync_file("static/index.css", "docs/index.css", again)
+        self.assertFalse(copied)
+        self.assertEqual(third, again)
+        _, copied = sync_file(
+            "static/index.css", "docs/index.css", again, verify_hash=True
+        )
+        self.assertTrue(copied)
+        self.assertEqual(self.read("docs/index.css"), "body []")
+
+    def test_verify_hash_catches_same_size_and_mtime(self):
+        sync_file("static/index.css", "docs/index.css")
+        stat = os.stat("docs/index.css")
+        self.write("docs/index.css", "body []")
+        os.utime("docs/index.css", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        _, copied = sync_file("static/index.css", "docs/index.css")
+        self.assertFalse(copied)
+        _, copied = sync_file("static/index.css", "docs/index.css", verify_hash=True)
+        self.assertTrue(copied)
+        self.assertEqual(self.read("docs/index.css"), "body {}")
+
+    def test_link_shares_the_inode(self):
+        sync_file("static/index.css", "docs/index.css", link=True)
+        self.assertEqual(
+            os.stat("docs/index.css").st_ino, os.stat("static/index.css").st_ino
+        )
+
+    def test_replace_if_changed_keeps_identical_file(self):
+        sync_file("static/index.css", "docs/index.css")
+        before = os.stat("docs/index.css")
+        self.write("docs/index.css.tmp", "body {}")
+        self.assertFalse(replace_if_changed("docs/index.css.tmp", "docs/index.css"))
+        self.assertFalse(os.path.exists("docs/index.css.tmp"))
+        self.assertEqual(os.stat("docs/index.css"), before)
+        self.write("docs/index.css.tmp", "body {x}")
+        self.assertTrue(replace_if_changed("docs/index.css.tmp", "docs/index.css"))
+        self.assertEqual(self.read("docs/index.css"), "body {x}")
+
+    def test_sync_filetree_skips_paths(self):
+        entries = sync_filetree("static", "docs", skip={"index.css"})
+        self.assertEqual(list(entries), ["images/a.png"])
+        self.assertFalse(os.path.exists("docs/index.css"))
+        self.assertTrue(os.path.exists("docs/images/a.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from bench_corpus import make_document
+from bench_suite import compare
+from textnode import BlockType, parse_blocks, markdown_lines
+
+
+class TestBenchSuite(unittest.TestCase):
+    def test_corpus_is_deterministic(self):
+        document = make_document(64 * 1024)
+        self.assertEqual(document, make_document(64 * 1024))
+        self.assertNotEqual(document, make_document(64 * 1024, seed=1))
+        self.assertGreaterEqual(len(document), 64 * 1024)
+
+    def test_corpus_covers_every_block_type(self):
+        document = make_document(64 * 1024)
+        block_types = {
+            block_type for block_type, _ in parse_blocks(markdown_lines(document))
+        }
+        self.assertEqual(block_types, set(BlockType))
+
+    def test_compare_scales_by_calibration(self):
+        baseline = {"calibration": 1.0, "cases": {"a": 1.0, "b": 1.0}}
+        results = {"a": 2.4, "b": 2.6, "new": 9.0}
+        self.assertEqual(
+            [name for name, _ in compare(results, 2.0, baseline, 0.25)], ["b"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import tempfile
+import unittest
+import zlib
+
+from compress import is_compressible, precompress_tree
+
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, "images"))
+        self.write("index.html", b"<p>hello</p>" * 200)
+        self.write("index.css", b"body {}" * 200)
+        self.write("small.css", b"a {}")
+        self.write("images/tom.png", b"\x89PNG" * 1000)
+        self.write("archive.tar.gz", b"not ours")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, rel_path):
+        return os.path.join(self.root, rel_path)
+
+    def write(self, rel_path, data):
+        with open(self.path(rel_path), "wb") as f:
+            f.write(data)
+
+    def read(self, rel_path):
+        with open(self.path(rel_path), "rb") as f:
+            return f.read()
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible("blog/tom/index.html"))
+        self.assertFalse(is_compressible("images/tom.png"))
+        self.assertFalse(is_compressible(".manifest.json"))
+
+    def test_writes_variants_for_text_outputs(self):
+        compressed = precompress_tree(self.root)
+        self.assertEqual(sorted(compressed), ["index.css", "index.html"])
+        self.assertEqual(
+            gzip.decompress(self.read("index.html.gz")), self.read("index.html")
+        )
+        self.assertEqual(
+            zlib.decompress(self.read("index.css.zz")), self.read("index.css")
+        )
+        self.assertFalse(os.path.exists(self.path("small.css.gz")))
+        self.assertFalse(os.path.exists(self.path("images/tom.png.gz")))
+
+    def test_output_is_deterministic(self):
+        precompress_tree(self.root)
+        first = self.read("index.html.gz")
+        os.remove(self.path("index.html.gz"))
+        precompress_tree(self.root)
+        self.assertEqual(self.read("index.html.gz"), first)
+
+    def test_skips_up_to_date_outputs(self):
+        compressed = precompress_tree(self.root)
+        stat = os.stat(self.path("index.html.gz"))
+        self.write("index.css", b"body { margin: 0 }" * 200)
+        again = precompress_tree(self.root, compressed, jobs=2)
+        self.assertEqual(
+            os.stat(self.path("index.html.gz")).st_ctime_ns, stat.st_ctime_ns
+        )
+        self.assertEqual(
+            gzip.decompress(self.read("index.css.gz")), b"body { margin: 0 }" * 200
+        )
+        self.assertEqual(again["index.html"], compressed["index.html"])
+
+    def test_level_change_recompresses(self):
+        compressed = precompress_tree(self.root, level=9)
+        stat = os.stat(self.path("index.html.gz"))
+        precompress_tree(self.root, compressed, level=1)
+        self.assertNotEqual(
+            os.stat(self.path("index.html.gz")).st_ctime_ns, stat.st_ctime_ns
+        )
+
+    def test_removes_orphaned_variants_only(self):
+        precompress_tree(self.root)
+        os.remove(self.path("index.css"))
+        precompress_tree(self.root)
+        self.assertFalse(os.path.exists(self.path("index.css.gz")))
+        self.assertFalse(os.path.exists(self.path("index.css.zz")))
+        self.assertTrue(os.path.exists(self.path("archive.tar.gz")))
+
+    def test_only_looks_at_given_paths(self):
+        compressed = precompress_tree(self.root)
+        self.write("index.css", b"body { margin: 0 }" * 200)
+        self.write("late.css", b"p {}" * 1000)
+        os.remove(self.path("index.html"))
+        again = precompress_tree(
+            self.root, compressed, paths=["index.css", "index.html"]
+        )
+        self.assertEqual(
+            gzip.decompress(self.read("index.css.gz")), b"body { margin: 0 }" * 200
+        )
+        self.assertFalse(os.path.exists(self.path("index.html.gz")))
+        self.assertFalse(os.path.exists(self.path("late.css.gz")))
+        self.assertEqual(sorted(again), ["index.css"])
+
+    def test_keeps_shipped_variants(self):
+        self.write("sitemap.xml.gz", b"shipped")
+        self.write("index.css.gz", b"also shipped")
+        outputs = {"index.html", "index.css", "index.css.gz", "sitemap.xml.gz"}
+        compressed = precompress_tree(self.root, None, outputs)
+        self.assertEqual(self.read("sitemap.xml.gz"), b"shipped")
+        self.assertEqual(self.read("index.css.gz"), b"also shipped")
+        self.assertEqual(compressed["index.css"]["variants"], [".zz"])
+        self.assertTrue(os.path.exists(self.path("index.html.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+
+import main as site
+from changes import CHANGES_NAME
+from daemon import BuildDaemon, run_daemon, send_command
+from render_cache import MEMORY_CACHE
+from sitetest import SiteTestCase
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+
+class TestBuildDaemon(SiteTestCase, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.write("template.html", TEMPLATE)
+        self.write("static/index.css", "body {}")
+        self.write("content/index.md", "# Home\n\nWelcome")
+        self.write("content/blog/post/index.md", "# Post\n\nSome text")
+        self.daemon = BuildDaemon(site, site.parse_args(["/"]))
+        self.socket_path = os.path.join(self.tmp.name, "build.sock")
+        ready = asyncio.Event()
+        self.task = asyncio.create_task(
+            run_daemon(self.daemon, self.socket_path, ready.set)
+        )
+        await ready.wait()
+
+    async def asyncTearDown(self):
+        if not self.task.done():
+            await self.send({"command": "stop"})
+        await self.task
+
+    async def send(self, request):
+        with redirect_stdout(io.StringIO()):
+            return await asyncio.to_thread(send_command, self.socket_path, request)
+
+    async def test_build_only_renders_changed_pages(self):
+        response = await self.send({"command": "build"})
+        self.assertTrue(response["ok"])
+        self.assertTrue(os.path.exists("docs/blog/post/index.html"))
+
+        response = await self.send({"command": "build"})
+        self.assertEqual(response["result"]["pages"], [])
+
+        self.write("content/index.md", "# Home\n\nEdited")
+        response = await self.send({"command": "build"})
+        self.assertEqual(response["result"]["changed"], ["content/index.md"])
+        self.assertEqual(response["result"]["pages"], ["docs/index.html"])
+        self.assertIn("Edited", self.read("docs/index.html"))
+        with open(os.path.join("docs", CHANGES_NAME)) as f:
+            changes = json.load(f)
+        self.assertEqual(
+            changes, {"added": [], "modified": ["index.html"], "deleted": []}
+        )
+
+    async def test_rebuild_path_and_status(self):
+        await self.send({"command": "build"})
+        self.write("content/blog/post/index.md", "# Post\n\nNew")
+        path = os.path.abspath("content/blog/post/index.md")
+        response = await self.send({"command": "rebuild-path", "paths": [path]})
+        self.assertEqual(response["result"]["pages"], ["docs/blog/post/index.html"])
+        # Already up to date, so the next build finds nothing to do.
+        response = await self.send({"command": "build"})
+        self.assertEqual(response["result"]["changed"], [])
+
+        status = (await self.send({"command": "status"}))["result"]
+        # Without --cache-dir, rendered blocks are kept in memory.
+        self.assertEqual(self.daemon.build_options()["cache_dir"], MEMORY_CACHE)
+        self.assertEqual(status["builds"], 3)
+        self.assertEqual(status["pages"], 2)
+        self.assertEqual(status["pid"], os.getpid())
+
+    async def test_rebuild_path_takes_directories(self):
+        await self.send({"command": "build"})
+        self.write("content/blog/new/index.md", "# New\n\nHello")
+        os.remove("content/blog/post/index.md")
+        self.write("static/images/a.png", "png")
+        paths = [os.path.abspath("content/blog"), os.path.abspath("static")]
+        response = await self.send({"command": "rebuild-path", "paths": paths})
+        self.assertTrue(response["ok"], response.get("error"))
+        self.assertEqual(response["result"]["pages"], ["docs/blog/new/index.html"])
+        self.assertFalse(os.path.exists("docs/blog/post/index.html"))
+        self.assertTrue(os.path.exists("docs/images/a.png"))
+
+        # The index saw all of that, so a build has nothing left to do.
+        response = await self.send({"command": "build"})
+        self.assertEqual(response["result"]["changed"], [])
+
+    async def test_errors_are_reported(self):
+        response = await self.send({"command": "explode"})
+        self.assertFalse(response["ok"])
+        self.assertIn("unknown command", response["error"])
+        response = await self.send({"command": "rebuild-path", "paths": []})
+        self.assertFalse(response["ok"])
+
+    async def test_stop_removes_socket(self):
+        await self.send({"command": "stop"})
+        await self.task
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
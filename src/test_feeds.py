@@ -0,0 +1,209 @@
+import io
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from contextlib import redirect_stdout
+
+import feeds
+import main
+from feeds import lastmod, write_feed, write_sitemaps
+from manifest import load_manifest
+from sitetest import SiteTestCase
+
+NS = {"s": feeds.SITEMAP_NS, "a": feeds.ATOM_NS}
+
+
+class TestSitemaps(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.max_urls = feeds.MAX_URLS
+
+    def tearDown(self):
+        feeds.MAX_URLS = self.max_urls
+        self.tmp.cleanup()
+
+    def parse(self, name):
+        return ET.parse(os.path.join(self.tmp.name, name)).getroot()
+
+    def test_single_sitemap(self):
+        entries = write_sitemaps(
+            self.tmp.name,
+            "https://example.com/",
+            "site/",
+            {"index.html": "2024-03-01T00:00:00Z", "blog/index.html": None},
+        )
+        self.assertEqual(list(entries), ["sitemap.xml"])
+        urls = self.parse("sitemap.xml").findall("s:url", NS)
+        self.assertEqual(
+            [url.findtext("s:loc", namespaces=NS) for url in urls],
+            ["https://example.com/site/blog/", "https://example.com/site/"],
+        )
+        self.assertIsNone(urls[0].find("s:lastmod", NS))
+        self.assertEqual(
+            urls[1].findtext("s:lastmod", namespaces=NS), "2024-03-01T00:00:00Z"
+        )
+
+    def test_large_sites_get_an_index(self):
+        feeds.MAX_URLS = 2
+        pages = {f"{i}.html": f"2024-03-0{i}T00:00:00Z" for i in range(1, 6)}
+        entries = write_sitemaps(self.tmp.name, "https://example.com", "/", pages)
+        self.assertEqual(
+            sorted(entries),
+            ["sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml", "sitemap.xml"],
+        )
+        sitemaps = self.parse("sitemap.xml").findall("s:sitemap", NS)
+        self.assertEqual(
+            [sitemap.findtext("s:loc", namespaces=NS) for sitemap in sitemaps],
+            [f"https://example.com/sitemap-{n}.xml" for n in (1, 2, 3)],
+        )
+        self.assertEqual(
+            sitemaps[1].findtext("s:lastmod", namespaces=NS), "2024-03-04T00:00:00Z"
+        )
+        self.assertEqual(len(self.parse("sitemap-3.xml").findall("s:url", NS)), 1)
+
+    def test_feed(self):
+        posts = [
+            {
+                "path": "blog/tom/index.html",
+                "url": "/blog/tom/",
+                "title": "Tom & Goldberry",
+                "date": "2024-03-01",
+                "tags": ["hobbits"],
+                "summary": "Hey dol!",
+            }
+        ]
+        lastmods = {"blog/tom/index.html": lastmod(1712000000)}
+        write_feed(self.tmp.name, "https://example.com", "/", "Fans", posts, lastmods)
+        feed = self.parse("feed.xml")
+        self.assertEqual(feed.findtext("a:title", namespaces=NS), "Fans")
+        self.assertEqual(
+            feed.findtext("a:updated", namespaces=NS), "2024-04-01T19:33:20Z"
+        )
+        entry = feed.find("a:entry", NS)
+        self.assertEqual(entry.findtext("a:title", namespaces=NS), "Tom & Goldberry")
+        self.assertEqual(
+            entry.findtext("a:id", namespaces=NS), "https://example.com/blog/tom/"
+        )
+        self.assertEqual(entry.find("a:category", NS).get("term"), "hobbits")
+
+
+class TestFeedsBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        os.makedirs("static")
+        self.write("content/index.md", "# Fan Club\n\n[Tom](/blog/tom)")
+        self.write(
+            "content/blog/tom/index.md", "---\ndate: 2024-03-01\n---\n# Tom\n\nHey dol!"
+        )
+        os.utime("content/blog/tom/index.md", (1712000000, 1712000000))
+
+    def build(self, *argv):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main"):
+            main.main(["/", "--site-url", "https://example.com", *argv])
+
+    def test_unchanged_site_gives_identical_files(self):
+        self.build("--incremental")
+        sitemap = self.read("docs/sitemap.xml")
+        feed = self.read("docs/feed.xml")
+        self.assertIn("<lastmod>2024-04-01T19:33:20Z</lastmod>", sitemap)
+        self.assertIn("<title>Fan Club</title>", feed)
+        self.assertIn("<title>Tom</title>", feed)
+
+        # Touched but not changed, so lastmod stays put.
+        os.utime("content/blog/tom/index.md")
+        self.build("--incremental")
+        self.assertEqual(self.read("docs/sitemap.xml"), sitemap)
+        self.assertEqual(self.read("docs/feed.xml"), feed)
+
+        self.write(
+            "content/blog/tom/index.md", "---\ndate: 2024-03-01\n---\n# Tom\n\nHey!"
+        )
+        self.build("--incremental")
+        self.assertNotIn("2024-04-01T19:33:20Z", self.read("docs/sitemap.xml"))
+        entry = load_manifest("docs")["outputs"]["blog/tom/index.html"]
+        self.assertIn(
+            f"<lastmod>{entry['lastmod']}</lastmod>", self.read("docs/sitemap.xml")
+        )
+
+    def test_full_build_uses_source_mtimes(self):
+        self.write("static/blog/tom/pipe.txt", "not a page")
+        self.build("--listings")
+        sitemap = self.read("docs/sitemap.xml")
+        self.assertIn(
+            "<url><loc>https://example.com/blog/tom/</loc>"
+            "<lastmod>2024-04-01T19:33:20Z</lastmod></url>",
+            sitemap,
+        )
+        self.assertIn("<url><loc>https://example.com/blog/</loc></url>", sitemap)
+        self.assertNotIn("pipe.txt", sitemap)
+        self.assertTrue(os.path.exists("docs/feed.xml"))
+
+    def test_no_posts_no_feed(self):
+        self.build("--incremental")
+        self.assertIn("feed.xml", load_manifest("docs")["outputs"])
+
+        # Without a date, the last post is just a page.
+        self.write("content/blog/tom/index.md", "# Tom\n\nHey dol!")
+        self.build("--incremental")
+        self.assertFalse(os.path.exists("docs/feed.xml"))
+        self.assertNotIn("feed.xml", load_manifest("docs")["outputs"])
+        self.assertTrue(os.path.exists("docs/sitemap.xml"))
+
+        self.build()
+        self.assertFalse(os.path.exists("docs/feed.xml"))
+
+    def test_rebuild_paths_drops_empty_feed(self):
+        with redirect_stdout(io.StringIO()):
+            manifest = main.build_incremental(
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                site_url="https://example.com",
+            )
+            self.assertTrue(os.path.exists("docs/feed.xml"))
+            os.remove("content/blog/tom/index.md")
+            main.rebuild_paths(
+                manifest,
+                ["content/blog/tom/index.md"],
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                site_url="https://example.com",
+            )
+        self.assertFalse(os.path.exists("docs/feed.xml"))
+        self.assertNotIn("feed.xml", manifest["outputs"])
+        self.assertEqual(load_manifest("docs"), manifest)
+
+    def test_rebuild_paths_updates_sitemap(self):
+        with redirect_stdout(io.StringIO()):
+            manifest = main.build_incremental(
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                site_url="https://example.com",
+            )
+            self.write("content/contact.md", "# Contact")
+            main.rebuild_paths(
+                manifest,
+                ["content/contact.md"],
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                site_url="https://example.com",
+            )
+        self.assertIn("https://example.com/contact.html", self.read("docs/sitemap.xml"))
+        self.assertEqual(load_manifest("docs"), manifest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import pickle
+import unittest
+
+from fingerprint import (
+    AssetRewriter,
+    fingerprint_filetree,
+    fingerprinted_path,
+    headers_file,
+)
+from sitetest import SiteTestCase
+from urls import basepath_rewriter
+
+ASSETS = {"/index.css": "/index.0123456789.css"}
+
+
+class TestAssetRewriter(unittest.TestCase):
+    def test_rewrites_known_assets_only(self):
+        rewrite = AssetRewriter(ASSETS)
+        self.assertEqual(rewrite("/index.css"), "/index.0123456789.css")
+        self.assertEqual(rewrite("/index.css?v=2#top"), "/index.0123456789.css?v=2#top")
+        self.assertEqual(rewrite("/blog/tom"), "/blog/tom")
+        self.assertEqual(
+            rewrite("https://example.com/index.css"), "https://example.com/index.css"
+        )
+
+    def test_runs_before_the_basepath(self):
+        rewrite = basepath_rewriter("site/", AssetRewriter(ASSETS))
+        self.assertEqual(rewrite("/index.css"), "/site/index.0123456789.css")
+
+    def test_equal_maps_are_equal_hooks(self):
+        self.assertEqual(AssetRewriter(dict(ASSETS)), AssetRewriter(ASSETS))
+        self.assertNotEqual(AssetRewriter({}), AssetRewriter(ASSETS))
+        copy = pickle.loads(pickle.dumps(AssetRewriter(ASSETS)))
+        self.assertEqual(copy.cache_key, AssetRewriter(ASSETS).cache_key)
+
+
+class TestFingerprintFiletree(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("static/index.css", "body {}")
+        self.write("static/images/a.png", "png")
+        self.write("static/robots.txt", "User-agent: *")
+
+    def test_only_linked_types_are_renamed(self):
+        entries, assets = fingerprint_filetree("static", "docs")
+        self.assertIn("robots.txt", entries)
+        self.assertTrue(os.path.exists("docs/robots.txt"))
+        self.assertEqual(sorted(assets), ["/images/a.png", "/index.css"])
+        for url in assets.values():
+            self.assertTrue(entries[url[1:]]["immutable"])
+            self.assertTrue(os.path.exists("docs" + url))
+        self.assertEqual(headers_file(assets).count("immutable"), 2)
+
+    def test_hash_is_reused_while_source_is_unchanged(self):
+        entries, _ = fingerprint_filetree("static", "docs")
+        css = [path for path in entries if path.endswith(".css")][0]
+        entries[css]["hash"] = "f" * 64
+        again, assets = fingerprint_filetree("static", "docs", entries)
+        self.assertEqual(
+            assets["/index.css"], "/" + fingerprinted_path("index.css", "f" * 64)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
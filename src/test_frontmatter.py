@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from frontmatter import read_header, split_front_matter
+from textnode import page_title
+
+
+class TestFrontMatter(unittest.TestCase):
+    def test_fields(self):
+        lines = [
+            "---",
+            "date: 2024-03-01",
+            "tags: [elves, 'the ring']",
+            'summary: "Why: Glorfindel"',
+            "# a comment",
+            "draft: false",
+            "---",
+            "# Glorfindel",
+        ]
+        fields, rest = split_front_matter(lines)
+        self.assertEqual(
+            fields,
+            {
+                "date": "2024-03-01",
+                "tags": ["elves", "the ring"],
+                "summary": "Why: Glorfindel",
+                "draft": False,
+            },
+        )
+        self.assertEqual(list(rest), ["# Glorfindel"])
+
+    def test_block_list(self):
+        fields, _ = split_front_matter(
+            ["---", "tags:", "  - elves", "  - elves", "---"]
+        )
+        self.assertEqual(fields, {"tags": ["elves"]})
+
+    def test_no_front_matter(self):
+        fields, rest = split_front_matter(["# Title", "", "text"])
+        self.assertEqual(fields, {})
+        self.assertEqual(list(rest), ["# Title", "", "text"])
+
+    def test_errors(self):
+        for lines, message in [
+            (["---", "title: Tom"], "expected one of date, tags"),
+            (["---", "date: yesterday", "---"], "date should look like"),
+            (["---", "draft: maybe", "---"], "draft should be true or false"),
+            (["---", "- elves", "---"], "list item outside of a list"),
+            (["---", "date: 2024-03-01"], "no closing ---"),
+        ]:
+            with self.subTest(lines=lines):
+                with self.assertRaisesRegex(ValueError, message):
+                    split_front_matter(lines, "post.md")
+
+    def test_page_title(self):
+        lines = [
+            "```",
+            "# not a heading",
+            "```",
+            "",
+            "## Sub",
+            "",
+            "# The **One**",
+            "Ring",
+        ]
+        self.assertEqual(page_title(lines), "The One Ring")
+        self.assertIsNone(page_title(["## Only a subheading"]))
+
+    def test_read_header_stops_at_the_title(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "post.md")
+            with open(path, "w") as f:
+                f.write("---\ndate: 2024-03-01\n---\n\n# Tom\n\n*unclosed _delimiters")
+            self.assertEqual(read_header(path), {"date": "2024-03-01", "title": "Tom"})
+
+
+if __name__ == "__main__":
+    unittest.main()
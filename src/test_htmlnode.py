@@ -1,3 +1,5 @@
+import io
+import sys
 import unittest
 from htmlnode import HTMLNode, LeafNode, ParentNode
 
@@ -69,6 +71,69 @@ class TestHTMLNode(unittest.TestCase):
             "<div><span><b>grandchild</b></span></div>",
         )
 
+    def test_parent_with_props_to_html(self):
+        node = ParentNode("div", [LeafNode(None, "text")], {"class": "x"})
+        self.assertEqual(node.to_html(), '<div class="x">text</div>')
+
+    def test_parent_without_children_raises(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", None).to_html()
+
+    def test_write_html_matches_to_html(self):
+        node = ParentNode(
+            "div",
+            [
+                ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")]),
+                LeafNode("a", "link", {"href": "/home"}),
+            ],
+        )
+        stream = io.StringIO()
+        node.write_html(stream)
+        self.assertEqual(stream.getvalue(), node.to_html())
+        self.assertEqual(
+            stream.getvalue(),
+            '<div><p><b>bold</b> text</p><a href="/home">link</a></div>',
+        )
+
+    def test_deep_tree_does_not_recurse(self):
+        depth = sys.getrecursionlimit() * 2
+        node = LeafNode(None, "leaf")
+        for _ in range(depth):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertEqual(html, "<span>" * depth + "leaf" + "</span>" * depth)
+
+    def test_rewrite_url_applies_to_url_props(self):
+        node = ParentNode(
+            "p",
+            [
+                LeafNode("a", "home", {"href": "/", "class": "/nav"}),
+                LeafNode("img", "", {"src": "/tom.png", "alt": "/tom"}),
+                LeafNode(None, 'href="/literal"'),
+            ],
+        )
+        html = node.to_html(lambda url: "/site" + url)
+        self.assertEqual(
+            html,
+            '<p><a href="/site/" class="/nav">home</a>'
+            '<img src="/site/tom.png" alt="/tom"></img>href="/literal"</p>',
+        )
+
+    def test_nodes_are_slotted(self):
+        for node in [
+            HTMLNode("div"),
+            LeafNode("b", "bold"),
+            ParentNode("p", [LeafNode(None, "text")]),
+        ]:
+            self.assertFalse(hasattr(node, "__dict__"))
+            with self.assertRaises(AttributeError):
+                node.extra = 1
+
+    def test_parent_node_value_is_none(self):
+        node = ParentNode("p", [LeafNode(None, "text")])
+        self.assertIsNone(node.value)
+        self.assertIsNone(node.props)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,116 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from images import ImageSizes, read_image_size, scan_images
+from render_cache import BlockCache
+from textnode import markdown_to_html_node
+
+
+def png(width, height):
+    return (
+        b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+        + struct.pack(">II", width, height)
+        + b"\x08\x06\x00\x00\x00"
+    )
+
+
+def jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + bytes(3)
+    return b"\xff\xd8" + app0 + b"\xff\xdb\x00\x04\x00\x00" + sof0 + b"\xff\xda"
+
+
+def webp(chunk, payload):
+    return b"RIFF" + struct.pack("<I", 100) + b"WEBP" + chunk + payload
+
+
+class TestReadImageSize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def size_of(self, data):
+        path = os.path.join(self.tmp.name, "image")
+        with open(path, "wb") as f:
+            f.write(data)
+        return read_image_size(path)
+
+    def test_png(self):
+        self.assertEqual(self.size_of(png(1344, 896)), (1344, 896))
+
+    def test_gif(self):
+        self.assertEqual(self.size_of(b"GIF89a" + struct.pack("<HH", 40, 30)), (40, 30))
+
+    def test_jpeg_skips_to_frame_header(self):
+        self.assertEqual(self.size_of(jpeg(640, 480)), (640, 480))
+        self.assertIsNone(self.size_of(b"\xff\xd8\xff\xda"))
+
+    def test_webp_variants(self):
+        lossy = bytes(4) + bytes(3) + b"\x9d\x01\x2a" + struct.pack("<HH", 300, 200)
+        self.assertEqual(self.size_of(webp(b"VP8 ", lossy)), (300, 200))
+        bits = (300 - 1) | ((200 - 1) << 14)
+        lossless = bytes(4) + b"\x2f" + bits.to_bytes(4, "little")
+        self.assertEqual(self.size_of(webp(b"VP8L", lossless)), (300, 200))
+        extended = bytes(8) + (299).to_bytes(3, "little") + (199).to_bytes(3, "little")
+        self.assertEqual(self.size_of(webp(b"VP8X", extended)), (300, 200))
+
+    def test_unknown_and_missing(self):
+        self.assertIsNone(self.size_of(b"not an image at all"))
+        self.assertIsNone(read_image_size(os.path.join(self.tmp.name, "missing")))
+
+
+class TestImageAttributes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static, "images"))
+        for name, size in [("a.png", (10, 20)), ("b.png", (30, 40))]:
+            with open(os.path.join(self.static, "images", name), "wb") as f:
+                f.write(png(*size))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_image_sizes_by_url(self):
+        sizes = ImageSizes(self.static)
+        self.assertEqual(sizes("/images/a.png?v=1"), (10, 20))
+        self.assertIsNone(sizes("https://example.com/images/a.png"))
+        self.assertIsNone(sizes("/../static/images/a.png"))
+        self.assertIsNone(sizes("/images/missing.png"))
+
+    def test_first_image_loads_eagerly(self):
+        markdown = (
+            "# T\n\n![a](/images/a.png)\n\ntext\n\n![b](/images/b.png) ![c](/c.png)"
+        )
+        html = markdown_to_html_node(markdown, None, ImageSizes(self.static)).to_html()
+        self.assertIn('<img src="/images/a.png" alt="a" width="10" height="20">', html)
+        self.assertIn(
+            '<img src="/images/b.png" alt="b" width="30" height="40" '
+            'loading="lazy" decoding="async">',
+            html,
+        )
+        self.assertIn(
+            '<img src="/c.png" alt="c" loading="lazy" decoding="async">', html
+        )
+
+    def test_blocks_with_images_are_not_cached(self):
+        cache = BlockCache(os.path.join(self.tmp.name, "cache"))
+        markdown = "![a](/images/a.png)\n\ntext"
+        for _ in range(2):
+            html = markdown_to_html_node(markdown, cache, ImageSizes(self.static))
+        self.assertIn('width="10"', html.to_html())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_scan_images_reuses_sizes_by_hash(self):
+        source = os.path.join(self.static, "images", "a.png")
+        outputs = {"images/a.png": {"kind": "asset", "source": source, "hash": "h"}}
+        self.assertEqual(scan_images(outputs), {"h": [10, 20]})
+        self.assertEqual(scan_images(outputs, {"h": [1, 2]}), {"h": [1, 2]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+import main
+from links import LinkGraph, link_key, link_targets, page_links, resolvable_keys
+from sitetest import SiteTestCase
+
+
+class TestLinkKeys(unittest.TestCase):
+    def test_link_key(self):
+        page = "blog/majesty/index.html"
+        for url, key in [
+            ("/blog/tom", "blog/tom"),
+            ("/blog/tom/", "blog/tom"),
+            ("../tom#top", "blog/tom"),
+            ("/images/a%20b.png?v=2", "images/a b.png"),
+            ("/", ""),
+            ("/../..", ""),
+            ("#top", None),
+            ("https://www.boot.dev", None),
+            ("//cdn.example.com/x.js", None),
+            ("mailto:tom@example.com", None),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(link_key(url, page), key)
+        self.assertEqual(link_key("contact", "about.html"), "contact")
+
+    def test_page_links(self):
+        result = {
+            "links": ["/blog/tom", "/blog/tom/", "https://example.com"],
+            "images": [{"src": "/images/tom.png", "alt": "Tom"}],
+        }
+        self.assertEqual(
+            page_links("index.html", result), ["blog/tom", "images/tom.png"]
+        )
+
+    def test_resolvable_keys(self):
+        keys = resolvable_keys(
+            link_targets(
+                ["index.html", "blog/tom/index.html", "about.html", "index.2b1f.css"],
+                {"/index.css": "/index.2b1f.css"},
+            )
+        )
+        for key in ["", "blog/tom", "about", "about.html", "index.css"]:
+            self.assertIn(key, keys)
+        for key in ["blog", "blog/ring", "index.js"]:
+            self.assertNotIn(key, keys)
+
+
+class TestLinkGraph(unittest.TestCase):
+    def test_changed_targets_recheck_their_linkers(self):
+        graph = LinkGraph()
+        targets = {"index.html", "a/index.html", "b/index.html"}
+        checked = graph.update(
+            {"index.html": ["a", "b"], "a/index.html": [""], "b/index.html": ["c"]},
+            [],
+            targets,
+        )
+        self.assertEqual(checked, 3)
+        self.assertEqual(graph.broken, {"b/index.html": ["c"]})
+        self.assertEqual(graph.orphans(graph.links), [])
+
+        # b is gone and c turned up: only index.html links to either.
+        targets = {"index.html", "a/index.html", "c.html"}
+        checked = graph.update({}, ["b/index.html"], targets)
+        self.assertEqual(checked, 1)
+        self.assertEqual(graph.broken, {"index.html": ["b"]})
+        self.assertEqual(graph.orphans(graph.links), [])
+
+    def test_orphans(self):
+        graph = LinkGraph()
+        graph.update(
+            {"index.html": ["a"], "a/index.html": ["a", ""], "b/index.html": ["b"]},
+            [],
+            {"index.html", "a/index.html", "b/index.html"},
+        )
+        # Linking to yourself doesn't count.
+        self.assertEqual(graph.orphans(graph.links), ["b/index.html"])
+
+
+class TestCheckLinksBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write("static/index.css", "body {}")
+        self.write("content/index.md", "# Home\n\n[Tom](/blog/tom) [Ring](/ring)")
+        self.write("content/blog/tom/index.md", "# Tom\n\n[Home](/)")
+        self.write("content/blog/lost/index.md", "# Lost\n\n[Tom](../tom)")
+
+    def build(self, *argv):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main") as cm:
+            main.main(["/", "--check-links", *argv])
+        return [record.getMessage() for record in cm.records]
+
+    def test_broken_links_and_orphans_are_reported(self):
+        for options in [(), ("--incremental",), ("--fingerprint", "--jobs", "2")]:
+            with self.subTest(options=options):
+                messages = self.build(*options)
+                self.assertIn("index.html: broken link to /ring", messages)
+                self.assertIn(
+                    "blog/lost/index.html: no other page links here", messages
+                )
+
+    def test_incremental_build_checks_affected_pages(self):
+        self.build("--incremental")
+        self.write("content/ring.md", "# Ring\n\n[Lost](/blog/lost/)")
+        messages = self.build("--incremental")
+        self.assertIn(
+            "Checked links on 2 of 4 page(s): 0 broken, 0 orphan page(s)", messages
+        )
+
+        os.remove("content/blog/tom/index.md")
+        messages = self.build("--incremental")
+        self.assertIn("blog/lost/index.html: broken link to /blog/tom", messages)
+        self.assertIn("index.html: broken link to /blog/tom", messages)
+        self.assertIn(
+            "Checked links on 2 of 3 page(s): 2 broken, 0 orphan page(s)", messages
+        )
+
+    def test_rebuild_paths_checks_links(self):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main") as cm:
+            manifest = main.build_incremental(
+                "static", "content", "template.html", "docs", "/", check_links=True
+            )
+            self.write("content/blog/lost/index.md", "# Lost\n\n[Gone](/gone)")
+            main.rebuild_paths(
+                manifest,
+                ["content/blog/lost/index.md"],
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                check_links=True,
+            )
+        messages = [record.getMessage() for record in cm.records]
+        self.assertIn("blog/lost/index.html: broken link to /gone", messages)
+        self.assertEqual(
+            LinkGraph.load("docs").broken,
+            {"blog/lost/index.html": ["gone"], "index.html": ["ring"]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+import main
+from listings import HeaderCache, collect_posts, listing_pages
+from manifest import load_manifest
+from sitetest import SiteTestCase
+
+TEMPLATE = "<title>{{ Title }}</title>{{ Content }}"
+
+
+def post(day, tags="[elves]", extra=""):
+    return f"---\ndate: 2024-03-{day:02}\ntags: {tags}\n{extra}---\n\n# Post {day}\n"
+
+
+class TestListingPages(unittest.TestCase):
+    def setUp(self):
+        self.posts = [
+            {
+                "url": f"/blog/{day}/",
+                "title": f"Post {day}",
+                "date": f"{2024 - day % 2}-01-{day:02}",
+                "tags": ["Elves"] if day % 2 else [],
+                "summary": None,
+            }
+            for day in range(5, 0, -1)
+        ]
+
+    def test_paths(self):
+        listing = listing_pages(self.posts, per_page=2)
+        self.assertEqual(
+            sorted(listing),
+            [
+                "archive/index.html",
+                "archive/page/2/index.html",
+                "archive/page/3/index.html",
+                "blog/index.html",
+                "blog/page/2/index.html",
+                "blog/page/3/index.html",
+                "tags/elves/index.html",
+                "tags/elves/page/2/index.html",
+                "tags/index.html",
+            ],
+        )
+        self.assertEqual(listing_pages([]), {})
+
+    def test_pages_link_to_each_other(self):
+        listing = listing_pages(self.posts, per_page=2)
+        title, node = listing["blog/page/2/index.html"]
+        html = node.to_html()
+        self.assertEqual(title, "Blog (page 2)")
+        self.assertIn('<a href="/blog/" rel="prev">Newer posts</a>', html)
+        self.assertIn('<a href="/blog/page/3/" rel="next">Older posts</a>', html)
+        self.assertIn('<a href="/tags/elves/">Elves</a>', html)
+        _, node = listing["archive/index.html"]
+        html = node.to_html()
+        self.assertLess(html.index("<h2>2023</h2>"), html.index("<h2>2024</h2>"))
+
+
+class TestListingsBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", TEMPLATE)
+        os.makedirs("static")
+        self.write("content/index.md", "# Home\n\n[Blog](/blog)")
+        self.write("content/blog/a/index.md", post(1))
+        self.write("content/blog/b/index.md", post(2, "[elves, rings]"))
+        self.write("content/blog/c/index.md", post(3, extra="draft: true\n"))
+
+    def build(self, *argv):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main"):
+            main.main(["/", "--listings", *argv])
+
+    def test_full_and_incremental_builds_agree(self):
+        self.build()
+        blog = self.read("docs/blog/index.html")
+        self.assertLess(blog.index("Post 2"), blog.index("Post 1"))
+        self.assertNotIn("Post 3", blog)
+        self.assertIn("Post 2", self.read("docs/tags/rings/index.html"))
+        # Front matter never reaches the page.
+        self.assertNotIn("date:", self.read("docs/blog/a/index.html"))
+        self.build("--incremental")
+        self.assertEqual(self.read("docs/blog/index.html"), blog)
+
+    def test_tag_titles_are_escaped(self):
+        self.write("content/blog/d/index.md", post(4, "['<b> & co']"))
+        self.build()
+        page = self.read("docs/tags/b-co/index.html")
+        self.assertIn("<title>Posts tagged &lt;b&gt; &amp; co</title>", page)
+        self.assertIn("<h1>Posts tagged &lt;b&gt; &amp; co</h1>", page)
+
+    def test_new_post_reads_only_its_own_header(self):
+        self.build("--incremental")
+        self.write("content/blog/d/index.md", post(4, "[rings]"))
+        cache = HeaderCache.load("docs")
+        posts = collect_posts(
+            {
+                "blog/a/index.html": "content/blog/a/index.md",
+                "blog/d/index.html": "content/blog/d/index.md",
+            },
+            cache,
+        )
+        self.assertEqual([post["title"] for post in posts], ["Post 4", "Post 1"])
+        self.assertEqual(cache.reads, 1)
+
+        self.build("--incremental")
+        self.assertIn("Post 4", self.read("docs/tags/rings/index.html"))
+
+        os.remove("content/blog/a/index.md")
+        os.remove("content/blog/b/index.md")
+        self.build("--incremental")
+        # No post has the elves tag any more.
+        self.assertFalse(os.path.exists("docs/tags/elves/index.html"))
+        self.assertNotIn("tags/elves/index.html", load_manifest("docs")["outputs"])
+
+    def test_rebuild_paths_updates_listings(self):
+        with redirect_stdout(io.StringIO()):
+            manifest = main.build_incremental(
+                "static", "content", "template.html", "docs", "/", listings=10
+            )
+            self.write("content/blog/b/index.md", post(2, "[elves]"))
+            main.rebuild_paths(
+                manifest,
+                ["content/blog/b/index.md"],
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                listings=10,
+            )
+        self.assertFalse(os.path.exists("docs/tags/rings/index.html"))
+        self.assertEqual(load_manifest("docs"), manifest)
+
+    def test_listing_pages_count_as_links(self):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main") as cm:
+            main.main(["/", "--listings", "--check-links"])
+        messages = [record.getMessage() for record in cm.records]
+        # Only the draft is left unlisted.
+        self.assertIn(
+            "Checked links on 9 of 9 page(s): 0 broken, 1 orphan page(s)", messages
+        )
+        self.assertIn("blog/c/index.html: no other page links here", messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,364 @@
+import io
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+
+import main
+import profiling
+from assets import walk_files
+from changes import CHANGES_NAME
+from main import build_incremental, collect_pages, generate_pages, rebuild_paths
+from manifest import MANIFEST_NAME, load_manifest
+from sitetest import SiteTestCase
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+
+class TestIncrementalBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", TEMPLATE)
+        self.write("static/index.css", "body {}")
+        self.write("content/index.md", "# Home\n\nWelcome")
+        self.write("content/blog/post/index.md", "# Post\n\nSome text")
+
+    def build(self, basepath="/", **kwargs):
+        return build_incremental(
+            "static", "content", "template.html", "docs", basepath, **kwargs
+        )
+
+    def mark(self, path):
+        # Overwrite an output so we can tell whether the build touched it.
+        self.write(path, "untouched")
+
+    def test_first_build_writes_everything(self):
+        self.build()
+        self.assertEqual(self.read("docs/index.css"), "body {}")
+        self.assertIn("<p>Welcome</p>", self.read("docs/index.html"))
+        self.assertIn("<title>Post</title>", self.read("docs/blog/post/index.html"))
+        manifest = load_manifest("docs")
+        self.assertEqual(
+            sorted(manifest["outputs"]),
+            ["blog/post/index.html", "index.css", "index.html"],
+        )
+
+    def test_only_changed_page_is_rebuilt(self):
+        self.build()
+        self.mark("docs/index.html")
+        asset = os.stat("docs/index.css")
+        self.write("content/blog/post/index.md", "# Post\n\nFixed a typo")
+        self.build()
+        self.assertEqual(self.read("docs/index.html"), "untouched")
+        self.assertEqual(os.stat("docs/index.css").st_ctime_ns, asset.st_ctime_ns)
+        self.assertIn("Fixed a typo", self.read("docs/blog/post/index.html"))
+
+    def test_template_change_rebuilds_pages_only(self):
+        self.build()
+        asset = os.stat("docs/index.css")
+        self.write("template.html", "<h1>new</h1>" + TEMPLATE)
+        self.build()
+        self.assertEqual(os.stat("docs/index.css").st_ctime_ns, asset.st_ctime_ns)
+        self.assertIn("<h1>new</h1>", self.read("docs/index.html"))
+        self.assertIn("<h1>new</h1>", self.read("docs/blog/post/index.html"))
+
+    def test_basepath_change_rebuilds_pages(self):
+        self.build()
+        self.mark("docs/index.html")
+        self.build("site/")
+        self.assertNotEqual(self.read("docs/index.html"), "untouched")
+
+    def test_missing_output_is_restored(self):
+        self.build()
+        os.remove("docs/index.css")
+        self.build()
+        self.assertEqual(self.read("docs/index.css"), "body {}")
+
+    def test_modified_asset_is_recopied(self):
+        self.build()
+        self.write("static/index.css", "body { color: red }")
+        self.build()
+        self.assertEqual(self.read("docs/index.css"), "body { color: red }")
+
+    def test_removed_asset_deletes_output(self):
+        self.build()
+        os.remove("static/index.css")
+        self.build()
+        self.assertFalse(os.path.exists("docs/index.css"))
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        os.remove("content/blog/post/index.md")
+        self.build()
+        self.assertFalse(os.path.exists("docs/blog/post/index.html"))
+        self.assertFalse(os.path.exists("docs/blog"))
+        self.assertNotIn("blog/post/index.html", load_manifest("docs")["outputs"])
+
+    def test_build_without_manifest_prunes_what_it_did_not_write(self):
+        # As left by a full build, which writes no manifest.
+        self.write("docs/index.css", "body {}")
+        self.write("docs/index.css.gz", b"gz")
+        self.write("docs/index.html.gz", b"gz")
+        self.write("docs/old/index.html", "gone")
+        manifest = self.build(fingerprint=True)
+        self.assertFalse(os.path.exists("docs/index.css"))
+        self.assertFalse(os.path.exists("docs/index.css.gz"))
+        self.assertFalse(os.path.exists("docs/index.html.gz"))
+        self.assertFalse(os.path.exists("docs/old"))
+        self.assertEqual(
+            sorted(walk_files("docs")), sorted([*manifest["outputs"], MANIFEST_NAME])
+        )
+
+    def test_build_without_manifest_keeps_variants_when_precompressing(self):
+        self.write("docs/index.html.gz", b"gz")
+        self.write("docs/gone.html.gz", b"gz")
+        self.build(precompressed=True)
+        self.assertTrue(os.path.exists("docs/index.html.gz"))
+        self.assertFalse(os.path.exists("docs/gone.html.gz"))
+
+    def rebuild(self, manifest, paths, **kwargs):
+        rendered, self.touched = rebuild_paths(
+            manifest,
+            paths,
+            "static",
+            "content",
+            "template.html",
+            "docs",
+            "/",
+            **kwargs,
+        )
+        return rendered
+
+    def test_rebuild_paths_renders_one_page(self):
+        manifest = self.build()
+        self.mark("docs/index.html")
+        self.write("content/blog/post/index.md", "# Post\n\nEdited")
+        rendered = self.rebuild(manifest, ["content/blog/post/index.md"])
+        self.assertEqual(
+            rendered, [("content/blog/post/index.md", "docs/blog/post/index.html")]
+        )
+        self.assertEqual(self.read("docs/index.html"), "untouched")
+        self.assertIn("Edited", self.read("docs/blog/post/index.html"))
+        self.assertEqual(load_manifest("docs"), manifest)
+        self.assertEqual(self.touched, ["blog/post/index.html"])
+
+        os.remove("content/blog/post/index.md")
+        os.remove("static/index.css")
+        self.rebuild(manifest, ["content/blog/post/index.md", "static/index.css"])
+        self.assertEqual(self.touched, ["blog/post/index.html", "index.css"])
+
+    def test_rebuild_paths_template_renders_every_page(self):
+        manifest = self.build()
+        self.write("template.html", "<h1>new</h1>" + TEMPLATE)
+        rendered = self.rebuild(manifest, ["template.html"])
+        self.assertEqual(len(rendered), 2)
+        self.assertIn("<h1>new</h1>", self.read("docs/index.html"))
+
+    def test_rebuild_paths_handles_added_and_removed_files(self):
+        manifest = self.build()
+        self.write("static/app.js", "run()")
+        os.remove("content/blog/post/index.md")
+        self.rebuild(manifest, ["content/blog/post/index.md", "static/app.js"])
+        self.assertEqual(self.read("docs/app.js"), "run()")
+        self.assertFalse(os.path.exists("docs/blog/post/index.html"))
+        self.assertEqual(
+            sorted(manifest["outputs"]), ["app.js", "index.css", "index.html"]
+        )
+
+    def test_changed_image_size_rebuilds_pages(self):
+        png = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+        self.write("static/tom.png", png + bytes([0, 0, 0, 10, 0, 0, 0, 20]))
+        self.write("content/index.md", "# Home\n\n![tom](/tom.png)")
+        manifest = self.build()
+        self.assertIn('width="10" height="20"', self.read("docs/index.html"))
+        self.write("static/tom.png", png + bytes([0, 0, 0, 30, 0, 0, 0, 40]))
+        rendered = self.rebuild(manifest, ["static/tom.png"])
+        self.assertEqual(len(rendered), 2)
+        self.assertIn('width="30" height="40"', self.read("docs/index.html"))
+
+    def fingerprinted_css(self, manifest):
+        return [
+            rel_path
+            for rel_path, entry in manifest["outputs"].items()
+            if entry.get("immutable")
+        ]
+
+    def test_fingerprinted_assets_are_linked(self):
+        self.write("template.html", '<link href="/index.css" />' + TEMPLATE)
+        manifest = self.build(fingerprint=True)
+        [css] = self.fingerprinted_css(manifest)
+        self.assertRegex(css, r"^index\.[0-9a-f]{10}\.css$")
+        self.assertFalse(os.path.exists("docs/index.css"))
+        self.assertIn(f'href="/{css}"', self.read("docs/index.html"))
+        self.assertIn(f"/{css}\n  Cache-Control:", self.read("docs/_headers"))
+
+        # New contents, new name: the old file goes and every page relinks.
+        self.write("static/index.css", "body { color: red }")
+        self.mark("docs/blog/post/index.html")
+        manifest = self.build(fingerprint=True)
+        [new_css] = self.fingerprinted_css(manifest)
+        self.assertNotEqual(new_css, css)
+        self.assertFalse(os.path.exists(f"docs/{css}"))
+        self.assertIn(new_css, self.read("docs/blog/post/index.html"))
+
+    def test_rebuild_paths_relinks_changed_fingerprinted_asset(self):
+        self.write("template.html", '<link href="/index.css" />' + TEMPLATE)
+        manifest = self.build(fingerprint=True)
+        [css] = self.fingerprinted_css(manifest)
+        rendered = self.rebuild(manifest, ["content/index.md"], fingerprint=True)
+        self.assertEqual(len(rendered), 1)
+        self.assertIn(css, self.read("docs/index.html"))
+
+        self.write("static/index.css", "body { color: red }")
+        rendered = self.rebuild(manifest, ["static/index.css"], fingerprint=True)
+        [new_css] = self.fingerprinted_css(manifest)
+        self.assertEqual(len(rendered), 2)
+        self.assertFalse(os.path.exists(f"docs/{css}"))
+        self.assertIn(new_css, self.read("docs/index.html"))
+        self.assertEqual(load_manifest("docs"), manifest)
+
+
+class TestParallelBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", TEMPLATE)
+        for name in ["c", "a", "b"]:
+            self.write(f"content/{name}/index.md", f"# Page {name}\n\nBody of {name}")
+
+    def test_collect_pages_is_sorted(self):
+        self.assertEqual(
+            collect_pages("content", "docs"),
+            [
+                ("content/a/index.md", "docs/a/index.html"),
+                ("content/b/index.md", "docs/b/index.html"),
+                ("content/c/index.md", "docs/c/index.html"),
+            ],
+        )
+
+    def test_parallel_matches_serial(self):
+        pages = collect_pages("content", "serial")
+        with self.assertLogs("main", level="DEBUG"):
+            generate_pages(pages, "template.html", "/", jobs=1)
+        pages = collect_pages("content", "parallel")
+        with self.assertLogs("main", level="DEBUG") as logs:
+            generate_pages(pages, "template.html", "/", jobs=2)
+        for name in ["a", "b", "c"]:
+            with open(f"serial/{name}/index.html") as f:
+                serial = f.read()
+            self.assertEqual(self.read(f"parallel/{name}/index.html"), serial)
+        lines = [record.getMessage() for record in logs.records]
+        self.assertEqual([line.split()[3] for line in lines], [p[0] for p in pages])
+
+    def test_parallel_pages_are_profiled(self):
+        pages = collect_pages("content", "docs")
+        profile = profiling.start()
+        try:
+            generate_pages(pages, "template.html", "/", jobs=2)
+        finally:
+            profiling.stop()
+        report = profile.report()
+        self.assertEqual(sorted(report["pages"]), [p[0] for p in pages])
+        for stage in ["read", "serialize", "write"]:
+            self.assertEqual(report["stages"][stage]["calls"], 3)
+
+    def test_parallel_errors_are_reported_in_page_order(self):
+        for name in ["c", "a"]:
+            self.write(f"content/{name}/index.md", "no title here")
+        pages = collect_pages("content", "docs")
+        with self.assertLogs("main", level="DEBUG"):
+            with self.assertRaises(Exception) as cm:
+                generate_pages(pages, "template.html", "/", jobs=2)
+        message = str(cm.exception)
+        self.assertIn("failed to generate 2 page(s)", message)
+        self.assertIn("page has no h1 heading", message)
+        self.assertLess(
+            message.index("content/a/index.md"), message.index("content/c/index.md")
+        )
+
+
+class TestFullBuildChanges(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", TEMPLATE)
+        self.write("static/index.css", "body {}")
+        self.write("static/old.css", "p {}\n" * 100)
+        self.write("content/index.md", "# Home\n\n" + "Welcome " * 100)
+        self.write("content/blog/post/index.md", "# Post\n\nSome text")
+
+    def build(self, *argv):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main") as logs:
+            main.main(["/", *argv])
+        with open(os.path.join("docs", CHANGES_NAME)) as f:
+            return json.load(f), logs.output
+
+    def test_unchanged_outputs_are_not_rewritten(self):
+        changes, _ = self.build()
+        self.assertEqual(
+            changes["added"],
+            ["blog/post/index.html", "index.css", "index.html", "old.css"],
+        )
+        before = {path: os.stat(f"docs/{path}") for path in changes["added"]}
+        changes, logs = self.build()
+        self.assertEqual(changes, {"added": [], "modified": [], "deleted": []})
+        self.assertIn("0 added, 0 modified, 0 deleted", logs[-1])
+        for path, stat in before.items():
+            self.assertEqual(os.stat(f"docs/{path}").st_mtime_ns, stat.st_mtime_ns)
+
+    def test_changes_list_what_the_deploy_needs(self):
+        self.build("--precompress", "--compress-min-size", "1")
+        self.write("content/index.md", "# Home\n\n" + "Welcome back " * 100)
+        os.remove("static/old.css")
+        self.write("docs/stray.txt", "left over")
+        changes, _ = self.build("--precompress", "--compress-min-size", "1")
+        self.assertEqual(changes["added"], [])
+        self.assertEqual(
+            changes["modified"], ["index.html", "index.html.gz", "index.html.zz"]
+        )
+        self.assertEqual(
+            changes["deleted"], ["old.css", "old.css.gz", "old.css.zz", "stray.txt"]
+        )
+        self.assertFalse(os.path.exists("docs/stray.txt"))
+        self.assertTrue(os.path.exists("docs/index.html.gz"))
+        self.assertFalse(any(path.endswith(".tmp") for path in os.listdir("docs")))
+
+    def test_touched_inputs_change_nothing(self):
+        for argv in [[], ["--fingerprint"]]:
+            with self.subTest(argv=argv):
+                self.build("--incremental", *argv)
+                os.utime("static/index.css", ns=(0, 10**18))
+                changes, _ = self.build("--incremental", *argv)
+                self.assertEqual(changes, {"added": [], "modified": [], "deleted": []})
+
+    def test_precompress_keeps_shipped_variants(self):
+        self.write("static/sitemap.xml.gz", b"shipped")
+        for argv in [[], [], ["--incremental"], ["--incremental"]]:
+            self.build("--precompress", "--compress-min-size", "1", *argv)
+            with open("docs/sitemap.xml.gz", "rb") as f:
+                self.assertEqual(f.read(), b"shipped")
+        self.assertTrue(os.path.exists("docs/index.html.gz"))
+
+    def test_watch_rebuilds_finish_like_builds(self):
+        args = main.parse_args(["/", "--watch", "--precompress"])
+        args.compress_min_size = 1
+        edits = iter(["# Home\n\n" + "Welcome back " * 100])
+
+        def stop():
+            text = next(edits, None)
+            if text is None:
+                return True
+            self.write("content/index.md", text)
+            return False
+
+        with redirect_stdout(io.StringIO()), self.assertLogs("main"):
+            main.watch_site("static", "content", "template.html", "docs", args, stop)
+        with open(os.path.join("docs", CHANGES_NAME)) as f:
+            changes = json.load(f)
+        self.assertEqual(
+            changes["modified"], ["index.html", "index.html.gz", "index.html.zz"]
+        )
+        manifest = load_manifest("docs")
+        self.assertIn("index.html", manifest["compressed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
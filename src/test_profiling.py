@@ -0,0 +1,68 @@
+import time
+import unittest
+
+import profiling
+from textnode import markdown_to_html_node
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.profile = profiling.start()
+
+    def tearDown(self):
+        profiling.stop()
+
+    def test_inactive_profile_is_a_no_op(self):
+        profiling.stop()
+        items = [1, 2]
+        self.assertIs(profiling.timed_iter("x", items), items)
+        with profiling.stage("x"), profiling.page("p"):
+            pass
+
+    def test_nested_stage_time_is_exclusive(self):
+        with profiling.stage("outer"):
+            time.sleep(0.02)
+            with profiling.stage("inner"):
+                time.sleep(0.05)
+        stages = self.profile.report()["stages"]
+        self.assertLess(stages["outer"]["seconds"], 0.05)
+        self.assertGreaterEqual(stages["inner"]["seconds"], 0.05)
+        self.assertEqual(stages["inner"]["calls"], 1)
+
+    def test_stages_are_charged_to_the_current_page(self):
+        with profiling.page("a.md"):
+            with profiling.stage("read"):
+                time.sleep(0.01)
+        with profiling.page("b.md"):
+            with profiling.stage("read"):
+                pass
+        with profiling.stage("asset_copy"):
+            pass
+        report = self.profile.report(top=1)
+        self.assertEqual(report["page_count"], 2)
+        self.assertEqual(list(report["pages"]["a.md"]["stages"]), ["read"])
+        self.assertEqual(report["slowest_pages"][0]["page"], "a.md")
+        self.assertEqual(len(report["slowest_pages"]), 1)
+        self.assertEqual(list(report["stages"]), ["read", "asset_copy"])
+        self.assertIn("slowest pages:", profiling.format_summary(report))
+
+    def test_merge_page(self):
+        self.profile.merge_page("a.md", {"read": [0.5, 10, 1]})
+        self.profile.merge_page("a.md", {"read": [0.25, 2, 1]})
+        report = self.profile.report()
+        self.assertEqual(report["pages"]["a.md"]["seconds"], 0.75)
+        self.assertEqual(
+            report["stages"]["read"],
+            {"seconds": 0.75, "allocated_blocks": 12, "calls": 2},
+        )
+
+    def test_markdown_stages(self):
+        markdown_to_html_node("# Title\n\nSome *text*\n\n- a\n- b")
+        stages = self.profile.report()["stages"]
+        self.assertEqual(stages["block_split"]["calls"], 4)
+        self.assertEqual(stages["block_type"]["calls"], 3)
+        self.assertEqual(stages["inline_parse"]["calls"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+
+from render_cache import (
+    MEMORY_CACHE,
+    OPEN_CACHES,
+    BlockCache,
+    open_block_cache,
+    prune_block_cache,
+)
+from search import PageTerms
+from textnode import markdown_to_html_node, markdown_to_page
+from urls import basepath_rewriter
+
+MARKDOWN = """# Title
+
+A paragraph with a [link](/blog/tom) and **bold** text.
+
+- one
+- two
+
+```
+code with a [link](/x)
+```
+"""
+
+
+def shout(url):
+    return url.upper()
+
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "blocks")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cached_render_matches_uncached(self):
+        rewrite_url = basepath_rewriter("site/")
+        expected = markdown_to_html_node(MARKDOWN).to_html(rewrite_url)
+        cache = BlockCache(self.directory, "site/", rewrite_url)
+        cold = markdown_to_html_node(MARKDOWN, cache).to_html(rewrite_url)
+        warm = markdown_to_html_node(MARKDOWN, cache).to_html(rewrite_url)
+        self.assertEqual(cold, expected)
+        self.assertEqual(warm, expected)
+        # Headings get page-wide ids, so they are never cached.
+        self.assertEqual((cache.misses, cache.hits), (3, 3))
+
+    def test_cached_blocks_carry_their_metadata(self):
+        _, expected = markdown_to_page(MARKDOWN)
+        cache = BlockCache(self.directory)
+        markdown_to_page(MARKDOWN, cache)
+        # Nodes that can't be rebuilt show that a hit without a collector
+        # never tries.
+        for key, (html, summary, _) in list(cache.memory.items()):
+            cache.memory[key] = (html, summary, [["x", "no such type", None]])
+        _, metadata = markdown_to_page(MARKDOWN, cache)
+        self.assertEqual(metadata.result(), expected.result())
+        with self.assertRaises(ValueError):
+            markdown_to_page(MARKDOWN, cache, collector=PageTerms())
+
+    def test_cache_persists_on_disk(self):
+        rewrite_url = basepath_rewriter("/")
+        markdown_to_html_node(MARKDOWN, BlockCache(self.directory, "", rewrite_url))
+        fresh = BlockCache(self.directory, "", rewrite_url)
+        markdown_to_html_node(MARKDOWN, fresh)
+        self.assertEqual((fresh.misses, fresh.hits), (0, 3))
+
+    def test_only_edited_block_is_rendered(self):
+        cache = BlockCache(self.directory)
+        markdown_to_html_node(MARKDOWN, cache)
+        edited = MARKDOWN.replace("- two", "- three")
+        html = markdown_to_html_node(edited, cache).to_html()
+        self.assertIn("<li>three</li>", html)
+        self.assertEqual(cache.misses, 4)
+
+    def test_basepath_and_hook_separate_entries(self):
+        plain = open_block_cache(self.directory, "/")
+        based = open_block_cache(self.directory, "site/")
+        hooked = open_block_cache(self.directory, "site/", shout)
+        self.assertIs(open_block_cache(self.directory, "/"), plain)
+        keys = {cache.key(["same block"]) for cache in (plain, based, hooked)}
+        self.assertEqual(len(keys), 3)
+        html = markdown_to_html_node("[a](/b)", hooked).to_html()
+        self.assertEqual(html, '<div><p><a href="/site/B">a</a></p></div>')
+
+    def test_memory_cache_writes_no_files(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+        cache = open_block_cache(MEMORY_CACHE, "memory/")
+        self.assertIs(open_block_cache(MEMORY_CACHE, "memory/"), cache)
+        markdown_to_html_node(MARKDOWN, cache)
+        markdown_to_html_node(MARKDOWN, cache)
+        self.assertEqual((cache.misses, cache.hits), (3, 3))
+        self.assertEqual(os.listdir(), [])
+
+    def test_least_recently_opened_caches_are_closed(self):
+        first = open_block_cache(self.directory, "/")
+        opened = []
+        for index in range(OPEN_CACHES):
+            opened.append(open_block_cache(self.directory, f"site{index}/"))
+            # Reopening keeps a cache open.
+            self.assertIs(open_block_cache(self.directory, "/"), first)
+        self.assertIsNot(open_block_cache(self.directory, "site0/"), opened[0])
+        self.assertIs(open_block_cache(self.directory, "/"), first)
+
+    def test_prune_drops_least_recently_used(self):
+        cache = BlockCache(self.directory)
+        for index in range(3):
+            key = cache.key([f"block {index}"])
+            cache.put(key, "x" * 100)
+            os.utime(cache.path(key), ns=(index, index))
+        removed = prune_block_cache(self.directory, max_bytes=250)
+        self.assertEqual(removed, 1)
+        self.assertFalse(os.path.exists(cache.path(cache.key(["block 0"]))))
+        self.assertTrue(os.path.exists(cache.path(cache.key(["block 2"]))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import main
+from manifest import load_manifest
+from render_cache import BlockCache
+from sitetest import SiteTestCase
+from search import (
+    PageTerms,
+    SearchIndex,
+    decode_postings,
+    encode_postings,
+    page_url,
+    shard_name,
+    write_search_index,
+)
+from textnode import markdown_to_html_node
+
+MARKDOWN = """# The Ring
+
+One **ring** to rule them _all_, see [the ring](/ring).
+
+![A ring image](/ring.png)
+
+```
+ring = forge()
+```
+"""
+
+
+def terms_of(markdown, block_cache=None):
+    collector = PageTerms()
+    markdown_to_html_node(markdown, block_cache, collector=collector)
+    return collector.result()
+
+
+class TestPageTerms(unittest.TestCase):
+    def test_positions_follow_the_text(self):
+        result = terms_of(MARKDOWN)
+        self.assertEqual(result["terms"]["ring"], [1, 3, 10, 11])
+        self.assertEqual(result["terms"]["forge"], [12])
+        # Alt text and URLs aren't text a reader sees.
+        self.assertNotIn("image", result["terms"])
+
+    def test_cached_blocks_give_the_same_terms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BlockCache(directory)
+            cold = terms_of(MARKDOWN, cache)
+            warm = terms_of(MARKDOWN, BlockCache(directory))
+        self.assertEqual(cold, terms_of(MARKDOWN))
+        self.assertEqual(warm, cold)
+
+    def test_shard_names(self):
+        self.assertEqual(shard_name("ring"), "ri")
+        self.assertEqual(shard_name("a"), "a")
+        self.assertEqual(shard_name("éowyn"), "_c3a96f")
+        self.assertEqual(shard_name("_id"), "_5f69")
+
+    def test_page_url(self):
+        self.assertEqual(page_url("index.html", "/"), "/")
+        self.assertEqual(page_url("blog/tom/index.html", "site/"), "/site/blog/tom/")
+        self.assertEqual(page_url("about.html", "/"), "/about.html")
+
+
+class TestSearchIndex(unittest.TestCase):
+    def test_postings_round_trip(self):
+        postings = {7: [3, 9, 10], 2: [0], 40: [5, 100]}
+        encoded = encode_postings(postings)
+        self.assertEqual(encoded, [2, 1, 0, 5, 3, 3, 6, 1, 33, 2, 5, 95])
+        self.assertEqual(decode_postings(encoded), postings)
+
+    def test_update_keeps_ids_and_reuses_gaps(self):
+        index = SearchIndex()
+        index.update(
+            {
+                "/a/": ("A", {"ring": [0]}),
+                "/b/": ("B", {"ring": [1], "tom": [0]}),
+                "/c/": ("C", {"tom": [2]}),
+            }
+        )
+        index.update({"/b/": ("B", {"gold": [0]})}, removed=["/a/"])
+        self.assertEqual(index.pages[0], None)
+        self.assertEqual(index.postings, {"gold": {1: [0]}, "tom": {2: [2]}})
+        index.update({"/d/": ("D", {"tom": [4]})})
+        self.assertEqual(
+            index.pages[0],
+            {"url": "/d/", "title": "D", "shards": ["to"], "terms": ["tom"]},
+        )
+        self.assertEqual(index.postings["tom"], {0: [4], 2: [2]})
+
+
+class TestSearchBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        os.makedirs("static")
+        self.write("content/index.md", "# Home\n\nWelcome to the shire")
+        self.write("content/blog/tom/index.md", "# Tom\n\nTom Bombadil sings")
+        self.write("content/blog/ring/index.md", MARKDOWN)
+
+    def build(self, *argv):
+        with redirect_stdout(io.StringIO()), self.assertLogs("main"):
+            main.main(["/", "--search", *argv])
+        with open("docs/.changes.json") as f:
+            return json.load(f)
+
+    def search(self, term):
+        index = SearchIndex.load("docs")
+        return sorted(index.pages[page_id]["url"] for page_id in index.lookup(term))
+
+    def test_full_and_parallel_builds_agree(self):
+        self.build()
+        serial = SearchIndex.load("docs").files()
+        self.assertEqual(self.search("tom"), ["/blog/tom/"])
+        self.assertEqual(self.search("ring"), ["/blog/ring/"])
+        self.build("--jobs", "2")
+        self.assertEqual(SearchIndex.load("docs").files(), serial)
+
+    def test_incremental_build_rewrites_only_touched_shards(self):
+        self.build("--incremental")
+        self.write("content/blog/tom/index.md", "# Tom\n\nTom Bombadil dances")
+        changes = self.build("--incremental")
+        self.assertEqual(
+            changes,
+            {
+                "added": ["search/terms/da.json"],
+                "modified": [
+                    "blog/tom/index.html",
+                    "search/index.json",
+                    "search/pages.json",
+                ],
+                "deleted": ["search/terms/si.json"],
+            },
+        )
+        self.assertEqual(self.search("dances"), ["/blog/tom/"])
+        self.assertEqual(self.search("sings"), [])
+
+        os.remove("content/blog/tom/index.md")
+        self.build("--incremental")
+        self.assertEqual(self.search("tom"), [])
+        pages = SearchIndex.load("docs").pages
+        self.assertEqual([page and page["url"] for page in pages], ["/", "/blog/ring/"])
+
+    def test_only_touched_shards_are_written(self):
+        self.build("--incremental")
+        outputs = load_manifest("docs")["outputs"]
+        index = SearchIndex.load("docs")
+        index.update({"/blog/tom/": ("Tom", {"tom": [0], "dances": [1]})})
+        self.assertEqual(index.touched, {"to", "bo", "si", "da"})
+        # Only the shards of the terms the page had or has were read.
+        self.assertFalse(index.unread & {"to", "bo", "si"})
+        self.assertIn("sh", index.unread)
+        # Left for the untouched shard to be written from, if it were.
+        os.remove("docs/search/terms/sh.json")
+        entries = write_search_index("docs", index, outputs)
+        self.assertFalse(os.path.exists("docs/search/terms/sh.json"))
+        self.assertEqual(
+            entries["search/terms/sh.json"], outputs["search/terms/sh.json"]
+        )
+        self.assertNotIn("search/terms/bo.json", entries)
+        self.assertFalse(os.path.exists("docs/search/terms/bo.json"))
+        self.assertIn("search/terms/da.json", entries)
+        self.assertEqual(index.touched, set())
+
+    def test_rebuild_paths_updates_the_index(self):
+        with redirect_stdout(io.StringIO()):
+            manifest = main.build_incremental(
+                "static", "content", "template.html", "docs", "/", search=True
+            )
+            self.write("content/index.md", "# Home\n\nWelcome to Bree")
+            os.remove("content/blog/ring/index.md")
+            main.rebuild_paths(
+                manifest,
+                ["content/index.md", "content/blog/ring/index.md"],
+                "static",
+                "content",
+                "template.html",
+                "docs",
+                "/",
+                search=True,
+            )
+        self.assertEqual(self.search("bree"), ["/"])
+        self.assertEqual(self.search("ring"), [])
+        self.assertEqual(load_manifest("docs"), manifest)
+        self.assertNotIn("search/terms/ri.json", manifest["outputs"])
+        for rel_path in manifest["outputs"]:
+            self.assertTrue(os.path.exists(os.path.join("docs", rel_path)))
+
+    def test_missing_index_renders_every_page(self):
+        self.build("--incremental")
+        with open("docs/search/index.json") as f:
+            before = f.read()
+        os.remove("docs/search/index.json")
+        self.build("--incremental")
+        with open("docs/search/index.json") as f:
+            self.assertEqual(f.read(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
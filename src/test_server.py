@@ -0,0 +1,172 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from server import SENDFILE_THRESHOLD, accepted_encodings, parse_range, start_server
+
+
+class TestServerHelpers(unittest.TestCase):
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+        self.assertFalse(parse_range("bytes=100-", 100))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(parse_range("lines=1-2", 100))
+        # Invalid ranges are ignored, not refused.
+        self.assertIsNone(parse_range("bytes=5-2", 100))
+        self.assertIsNone(parse_range("bytes=-", 100))
+        self.assertIsNone(parse_range("bytes=a-2", 100))
+        self.assertFalse(parse_range("bytes=-0", 100))
+        self.assertIsNone(parse_range("bytes=200-100", 100))
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            accepted_encodings("gzip;q=0, deflate, br;q=0.5"), {"deflate", "br"}
+        )
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, "blog/tom"))
+        self.write("index.html", b"<h1>home</h1>")
+        self.write("blog/tom/index.html", b"<h1>tom</h1>")
+        self.write("index.css", b"body {}" * 100)
+        self.write("index.css.gz", gzip.compress(b"body {}" * 100))
+        self.write("big.bin", bytes(range(256)) * (SENDFILE_THRESHOLD // 128))
+        self.write(".manifest.json", b"{}")
+        self.server = await start_server(root, port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmp.cleanup()
+
+    def write(self, path, data):
+        with open(os.path.join(self.tmp.name, path), "wb") as f:
+            f.write(data)
+
+    async def request(self, path, headers=None, method="GET"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        lines = [f"{method} {path} HTTP/1.1", "Host: test", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode().split("\r\n")
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            response_headers[name.lower()] = value.strip()
+        return int(status_line.split()[1]), response_headers, body
+
+    async def test_serves_directory_index(self):
+        for path in ["/", "/blog/tom", "/blog/tom/"]:
+            status, headers, body = await self.request(path)
+            self.assertEqual(status, 200)
+            self.assertTrue(headers["content-type"].startswith("text/html"))
+        self.assertEqual(body, b"<h1>tom</h1>")
+
+    async def test_missing_and_hidden_files_are_404(self):
+        for path in ["/nope", "/.manifest.json", "/../etc/passwd", "/%2e%2e/x"]:
+            status, _, _ = await self.request(path)
+            self.assertEqual(status, 404)
+
+    async def test_etag_and_not_modified(self):
+        _, headers, _ = await self.request("/")
+        etag = headers["etag"]
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        status, _, body = await self.request("/", {"If-None-Match": etag})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b"")
+
+    async def test_etag_uses_asset_hash_only_for_the_same_file(self):
+        stat = os.stat(os.path.join(self.tmp.name, "index.css"))
+        manifest = os.path.join(self.tmp.name, ".manifest.json")
+        entry = {"kind": "asset", "size": stat.st_size, "hash": "ab" * 32}
+        for mtime, expected in [(0, False), (stat.st_mtime_ns, True)]:
+            entry["mtime"] = mtime
+            outputs = {"index.css": entry}
+            self.write(".manifest.json", json.dumps({"outputs": outputs}).encode())
+            # A new manifest mtime makes the server read it again.
+            os.utime(manifest, ns=(mtime + 1, mtime + 1))
+            _, headers, _ = await self.request("/index.css")
+            self.assertEqual(headers["etag"] == f'"{"ab" * 16}"', expected)
+
+    async def test_precompressed_variant(self):
+        status, headers, body = await self.request(
+            "/index.css", {"Accept-Encoding": "gzip, deflate"}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), b"body {}" * 100)
+        _, plain, body = await self.request("/index.css")
+        self.assertNotIn("content-encoding", plain)
+        self.assertEqual(body, b"body {}" * 100)
+        self.assertNotEqual(plain["etag"], headers["etag"])
+
+    async def test_fingerprinted_assets_are_immutable(self):
+        self.write("app.0123456789.js", b"run()")
+        manifest = {
+            "outputs": {"app.0123456789.js": {"kind": "asset", "immutable": True}}
+        }
+        self.write(".manifest.json", json.dumps(manifest).encode())
+        _, headers, _ = await self.request("/app.0123456789.js")
+        self.assertIn("immutable", headers["cache-control"])
+        _, headers, _ = await self.request("/index.css")
+        self.assertNotIn("cache-control", headers)
+
+    async def test_range_request(self):
+        status, headers, body = await self.request("/index.css", {"Range": "bytes=0-3"})
+        self.assertEqual(status, 206)
+        self.assertEqual(headers["content-range"], "bytes 0-3/700")
+        self.assertEqual(body, b"body")
+        status, _, _ = await self.request("/index.css", {"Range": "bytes=900-"})
+        self.assertEqual(status, 416)
+        status, _, body = await self.request("/index.css", {"Range": "bytes=5-2"})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body), 700)
+
+    async def test_large_file_uses_full_body(self):
+        expected = bytes(range(256)) * (SENDFILE_THRESHOLD // 128)
+        status, headers, body = await self.request("/big.bin")
+        self.assertEqual(status, 200)
+        self.assertEqual(int(headers["content-length"]), len(expected))
+        self.assertEqual(body, expected)
+        status, _, body = await self.request(
+            "/big.bin", {"Range": f"bytes=1000-{SENDFILE_THRESHOLD * 2 - 1}"}
+        )
+        self.assertEqual(status, 206)
+        self.assertEqual(body, expected[1000:])
+
+    async def test_head_has_no_body(self):
+        status, headers, body = await self.request("/", method="HEAD")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-length"], "13")
+        self.assertEqual(body, b"")
+
+    async def test_other_methods_are_rejected(self):
+        status, headers, _ = await self.request("/", method="POST")
+        self.assertEqual(status, 405)
+        self.assertEqual(headers["allow"], "GET, HEAD")
+
+    async def test_keep_alive_serves_several_requests(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"GET / HTTP/1.1\r\nHost: t\r\n\r\n" * 2)
+        writer.write(b"GET /blog/tom HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        self.assertEqual(response.count(b"HTTP/1.1 200 OK"), 3)
+        self.assertTrue(response.endswith(b"<h1>tom</h1>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
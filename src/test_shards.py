@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+
+import main
+from assets import walk_files
+from changes import CHANGES_NAME
+from manifest import MANIFEST_NAME, load_manifest, save_manifest
+from shards import merge_shards, parse_shard, shard_of
+from sitetest import SiteTestCase
+
+TEMPLATE = (
+    '<title>{{ Title }}</title><link href="/index.css" /><body>{{ Content }}</body>'
+)
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x03\x00\x00\x00\x02"
+
+
+class TestShardOf(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/3"), (2, 3))
+        for text in ["0/3", "4/3", "3", "a/b", "1/0"]:
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_shard_of_is_stable_and_in_range(self):
+        paths = [f"blog/post-{i}/index.md" for i in range(200)]
+        shards = [shard_of(path, 4) for path in paths]
+        self.assertEqual(shards, [shard_of(path, 4) for path in paths])
+        self.assertEqual(set(shards), {1, 2, 3, 4})
+        self.assertEqual(shard_of("blog/post-7/index.md", 4), 1)
+
+
+class TestShardedBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("template.html", TEMPLATE)
+        self.write("static/index.css", "body {}")
+        self.write("static/images/a.png", PNG)
+        self.write("static/robots.txt", "User-agent: *")
+        for i in range(12):
+            self.write(
+                f"content/blog/post-{i}/index.md",
+                f"# Post {i}\n\n![a](/images/a.png) and ![b](/images/a.png)",
+            )
+
+    def run_main(self, *argv):
+        with redirect_stdout(io.StringIO()):
+            main.main(list(argv))
+
+    def tree(self, root):
+        files = {}
+        for rel_path in walk_files(root):
+            if rel_path not in (MANIFEST_NAME, CHANGES_NAME):
+                with open(os.path.join(root, rel_path), "rb") as f:
+                    files[rel_path] = f.read()
+        return files
+
+    def build_shards(self, count, *options):
+        for index in range(1, count + 1):
+            self.run_main("/", "--shard", f"{index}/{count}", *options)
+
+    def test_merge_matches_single_build(self):
+        for options in [(), ("--fingerprint",)]:
+            with self.subTest(options=options):
+                self.run_main("/", *options)
+                single = self.tree("docs")
+                self.build_shards(3, *options)
+                pages = [
+                    sum(
+                        entry["kind"] == "page"
+                        for entry in load_manifest(f"shards/{i}-of-3")[
+                            "outputs"
+                        ].values()
+                    )
+                    for i in range(1, 4)
+                ]
+                self.assertEqual(sum(pages), 12)
+                self.assertTrue(all(pages))
+                with redirect_stdout(io.StringIO()):
+                    with self.assertRaises(SystemExit) as cm:
+                        main.main(["merge"])
+                self.assertEqual(cm.exception.code, 0)
+                self.assertEqual(self.tree("docs"), single)
+                # Merged over the single build, so nothing changed.
+                with open(os.path.join("docs", CHANGES_NAME)) as f:
+                    changes = json.load(f)
+                self.assertEqual(changes, {"added": [], "modified": [], "deleted": []})
+
+    def test_merged_manifest_serves_incremental_builds(self):
+        self.build_shards(2)
+        merge_shards(["shards/1-of-2", "shards/2-of-2"], "docs")
+        merged = load_manifest("docs")
+        self.assertNotIn("shard", merged)
+        with redirect_stdout(io.StringIO()):
+            manifest = main.build_incremental(
+                "static", "content", "template.html", "docs", "/"
+            )
+        self.assertEqual(manifest["images"], merged["images"])
+        self.assertEqual(manifest["outputs"], merged["outputs"])
+
+    def test_missing_shard_is_refused(self):
+        self.build_shards(3)
+        with self.assertRaisesRegex(Exception, "exactly once, found 1/3, 3/3"):
+            merge_shards(["shards/1-of-3", "shards/3-of-3"], "docs")
+        self.assertFalse(os.path.exists("docs"))
+
+    def test_conflicts_are_reported(self):
+        self.build_shards(2)
+        # A stray copy of an asset in the shard that doesn't own it.
+        other = 3 - shard_of("index.css", 2)
+        self.write(f"shards/{other}-of-2/index.css", "body { color: red }")
+        manifest = load_manifest("shards/2-of-2")
+        manifest["basepath"] = "/blog/"
+        save_manifest("shards/2-of-2", manifest)
+        with self.assertRaises(Exception) as cm:
+            merge_shards(["shards/1-of-2", "shards/2-of-2"], "docs")
+        message = str(cm.exception)
+        self.assertIn("different basepath", message)
+        self.assertIn("index.css: differs between", message)
+        self.assertFalse(os.path.exists("docs"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import os
+import tempfile
+import unittest
+
+from template import CACHE_SIZE, Template, load_template
+from urls import basepath_rewriter
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render_fills_slots(self):
+        template = Template("<title>{{ Title }}</title><main>{{ Content }}</main>")
+        self.assertEqual(
+            template.render({"Title": "Home", "Content": "<p>hi</p>"}),
+            "<title>Home</title><main><p>hi</p></main>",
+        )
+
+    def test_content_is_not_rescanned_for_placeholders(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}")
+        html = template.render(
+            {"Title": "Home", "Content": "<code>{{ Title }} {{ Content }}</code>"}
+        )
+        self.assertEqual(
+            html, "<title>Home</title><code>{{ Title }} {{ Content }}</code>"
+        )
+
+    def test_unknown_slot_is_left_alone(self):
+        template = Template("{{ Title }} {{ Footer }}")
+        self.assertEqual(template.render({"Title": "Home"}), "Home {{ Footer }}")
+
+    def test_static_links_use_basepath(self):
+        template = Template(
+            '<link href="/index.css" /><img src="/logo.png" /><a href="x">',
+            basepath_rewriter("site/"),
+        )
+        self.assertEqual(
+            template.render({}),
+            '<link href="/site/index.css" /><img src="/site/logo.png" /><a href="x">',
+        )
+
+    def test_only_href_and_src_attributes_are_rewritten(self):
+        template = Template(
+            '<img data-src="/a.png" src="/a.png"><a\nhref="/b">',
+            basepath_rewriter("site/"),
+        )
+        self.assertEqual(
+            template.render({}),
+            '<img data-src="/a.png" src="/site/a.png"><a\nhref="/site/b">',
+        )
+
+    def test_callable_slot_streams(self):
+        template = Template("<main>{{ Content }}</main>")
+        stream = io.StringIO()
+
+        def content(emit):
+            emit("<p>")
+            emit("streamed")
+            emit("</p>")
+
+        template.write(stream, {"Content": content})
+        self.assertEqual(stream.getvalue(), "<main><p>streamed</p></main>")
+
+    def test_load_template_is_cached_until_modified(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("one {{ Title }}")
+            first = load_template(path)
+            self.assertIs(load_template(path), first)
+
+            with open(path, "w") as f:
+                f.write("two {{ Title }}")
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            self.assertEqual(load_template(path).render({"Title": "x"}), "two x")
+
+    def test_load_template_cache_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write('<a href="/">{{ Title }}</a>')
+            first = load_template(path, basepath_rewriter("first/"))
+            for index in range(CACHE_SIZE):
+                load_template(path, basepath_rewriter(f"site{index}/"))
+            self.assertIsNot(load_template(path, basepath_rewriter("first/")), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
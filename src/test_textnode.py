@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from textnode import (
@@ -14,10 +15,10 @@ from textnode import (
     text_to_text_nodes,
     markdown_to_blocks,
     markdown_to_html_node,
+    markdown_to_page,
+    slugify,
 )
 
-from main import extract_title
-
 
 class TestTextNode(unittest.TestCase):
     def test_eq(self):
@@ -197,6 +198,69 @@ class TestTextNode(unittest.TestCase):
             new_nodes,
         )
 
+    def test_text_to_text_nodes_plain_text(self):
+        self.assertListEqual(
+            text_to_text_nodes("just text"), [TextNode("just text", TextType.TEXT)]
+        )
+
+    def test_text_to_text_nodes_skips_empty_delimiters(self):
+        self.assertListEqual(
+            text_to_text_nodes("****a `` b"),
+            [TextNode("a ", TextType.TEXT), TextNode(" b", TextType.TEXT)],
+        )
+
+    def test_text_to_text_nodes_code_keeps_other_delimiters(self):
+        self.assertListEqual(
+            text_to_text_nodes("run `snake_case` now"),
+            [
+                TextNode("run ", TextType.TEXT),
+                TextNode("snake_case", TextType.CODE),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+
+    def test_text_to_text_nodes_link_text_is_not_split(self):
+        self.assertListEqual(
+            text_to_text_nodes("[a_b](/x_y) and **bold**"),
+            [
+                TextNode("a_b", TextType.LINK, "/x_y"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("bold", TextType.BOLD),
+            ],
+        )
+
+    def test_text_to_text_nodes_image_in_link(self):
+        self.assertListEqual(
+            text_to_text_nodes("[![badge](img.png)](https://ci)"),
+            [
+                TextNode("[", TextType.TEXT),
+                TextNode("badge", TextType.IMAGE, "img.png"),
+                TextNode("](https://ci)", TextType.TEXT),
+            ],
+        )
+        self.assertListEqual(
+            text_to_text_nodes("[](![i](p.png)"),
+            [
+                TextNode("[](", TextType.TEXT),
+                TextNode("i", TextType.IMAGE, "p.png"),
+            ],
+        )
+
+    def test_text_to_text_nodes_adjacent_link_ends(self):
+        self.assertListEqual(
+            text_to_text_nodes("[a](b)](c) [[d](e)"),
+            [
+                TextNode("a", TextType.LINK, "b"),
+                TextNode("](c) [", TextType.TEXT),
+                TextNode("d", TextType.LINK, "e"),
+            ],
+        )
+
+    def test_text_to_text_nodes_raises_on_unmatched(self):
+        for text in ["a **b", "a _b", "a `b", "[x](y) **z"]:
+            with self.assertRaises(Exception):
+                text_to_text_nodes(text)
+
     def test_markdown_to_blocks(self):
         md = """
 This is **bolded** paragraph\n
@@ -415,7 +479,7 @@ This is just a normal paragraph under the heading
         html = node.to_html()
         self.assertEqual(
             html,
-            "<div><h1>Heading 1</h1><p>This is just a normal paragraph under the heading</p><h2>Heading 2</h2><h3>Heading 3</h3></div>",
+            '<div><h1 id="heading-1">Heading 1</h1><p>This is just a normal paragraph under the heading</p><h2 id="heading-2">Heading 2</h2><h3 id="heading-3">Heading 3</h3></div>',
         )
 
     def test_heading_with_inline_formatting(self):
@@ -424,58 +488,93 @@ This is just a normal paragraph under the heading
 """
         node = markdown_to_html_node(md)
         html = node.to_html()
-        self.assertEqual(html, "<div><h1><b>Bold</b> Heading</h1></div>")
+        self.assertEqual(
+            html, '<div><h1 id="bold-heading"><b>Bold</b> Heading</h1></div>'
+        )
 
-    def test_extract_title(self):
+    def test_codeblock_with_blank_lines(self):
         md = """
-# Heading
+```
+first line
+
+after a blank line
+```
+
+Paragraph after
 """
-        heading = extract_title(md)
-        self.assertEqual(heading, "Heading")
+        node = markdown_to_html_node(md)
+        self.assertEqual(
+            node.to_html(),
+            "<div><pre><code>first line\n\nafter a blank line\n</code></pre><p>Paragraph after</p></div>",
+        )
 
-    def test_extract_title_ignores_leading_blank_lines(self):
-        md = """
+    def test_codeblock_with_info_string(self):
+        md = "```python\nprint('hi')\n```"
+        node = markdown_to_html_node(md)
+        self.assertEqual(
+            node.to_html(), "<div><pre><code>print('hi')\n</code></pre></div>"
+        )
 
+    def test_markdown_to_blocks_keeps_fenced_code_together(self):
+        md = "intro\n\n```\na\n\nb\n```\n\noutro"
+        self.assertEqual(markdown_to_blocks(md), ["intro", "```\na\n\nb\n```", "outro"])
 
-# Heading
-"""
-        heading = extract_title(md)
-        self.assertEqual(heading, "Heading")
+    def test_markdown_to_html_node_from_lines(self):
+        md = "# Title\n\n- one\n- two\n\n1. first\n2. second\n"
+        from_string = markdown_to_html_node(md).to_html()
+        from_file = markdown_to_html_node(io.StringIO(md)).to_html()
+        self.assertEqual(from_string, from_file)
+        self.assertEqual(
+            from_file,
+            '<div><h1 id="title">Title</h1><ul><li>one</li><li>two</li></ul><ol><li>first</li><li>second</li></ol></div>',
+        )
 
-    def test_extract_title_rejects_non_h1_first_line(self):
-        md = """
-## Subheading
-"""
-        with self.assertRaises(Exception):
-            extract_title(md)
+    def test_out_of_order_list_is_paragraph(self):
+        md = "1. first\n3. third"
+        self.assertEqual(block_to_block_type(md), BlockType.PARAGRAPH)
 
-    def test_extract_title_rejects_non_heading_first_line(self):
-        md = """
-This is not a heading
-"""
-        with self.assertRaises(Exception):
-            extract_title(md)
+    def test_page_metadata(self):
+        md = """Intro before the title, with a [link](/blog/tom).
 
-    def test_extract_title_rejects_empty_markdown(self):
-        md = """
+# The **One** Ring
 
-"""
-        with self.assertRaises(Exception):
-            extract_title(md)
+## Forging
 
-    def test_extract_title_strips_heading_text(self):
-        md = """
-#   Heading with spaces   
-"""
-        heading = extract_title(md)
-        self.assertEqual(heading, "Heading with spaces")
+![The ring](/images/ring.png)
 
-    def test_extract_title_strips_trailing_whitespace(self):
-        md = """
-# Heading   
+## Forging
+
+```
+not = counted
+```
 """
-        heading = extract_title(md)
-        self.assertEqual(heading, "Heading")
+        node, metadata = markdown_to_page(md)
+        self.assertIn('<h2 id="forging-1">Forging</h2>', node.to_html())
+        self.assertEqual(
+            metadata.result(),
+            {
+                "title": "The One Ring",
+                "outline": [
+                    {"level": 1, "text": "The One Ring", "id": "the-one-ring"},
+                    {"level": 2, "text": "Forging", "id": "forging"},
+                    {"level": 2, "text": "Forging", "id": "forging-1"},
+                ],
+                "links": ["/blog/tom"],
+                "images": [{"src": "/images/ring.png", "alt": "The ring"}],
+                "words": 12,
+                "reading_time": 1,
+            },
+        )
+
+    def test_page_without_h1_has_no_title(self):
+        _, metadata = markdown_to_page("## Only a subheading")
+        self.assertIsNone(metadata.title)
+        self.assertEqual(metadata.reading_time(), 1)
+
+    def test_slugify(self):
+        self.assertEqual(slugify("Good vs. Evil!"), "good-vs-evil")
+        self.assertEqual(slugify("  Middle-earth  maps "), "middle-earth-maps")
+        self.assertEqual(slugify("???"), "section")
 
 
 if __name__ == "__main__":
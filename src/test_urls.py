@@ -0,0 +1,30 @@
+import unittest
+
+from urls import basepath_rewriter
+
+
+class TestBasepathRewriter(unittest.TestCase):
+    def test_prefixes_site_absolute_urls(self):
+        rewrite = basepath_rewriter("httpserver/")
+        self.assertEqual(rewrite("/blog/tom"), "/httpserver/blog/tom")
+        self.assertEqual(rewrite("/"), "/httpserver/")
+
+    def test_root_basepath_leaves_urls_alone(self):
+        rewrite = basepath_rewriter("/")
+        self.assertEqual(rewrite("/blog/tom"), "/blog/tom")
+
+    def test_other_urls_are_untouched(self):
+        rewrite = basepath_rewriter("site")
+        for url in ["https://boot.dev", "//cdn.example.com/x.png", "tom.png", "#top"]:
+            self.assertEqual(rewrite(url), url)
+
+    def test_hook_runs_before_basepath(self):
+        rewrite = basepath_rewriter("site", str.lower)
+        self.assertEqual(rewrite("/Blog/Tom"), "/site/blog/tom")
+
+    def test_same_function_per_basepath(self):
+        self.assertIs(basepath_rewriter("site"), basepath_rewriter("site"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+from sitetest import SiteTestCase
+from watch import changed_paths, snapshot, watch
+
+
+class TestWatch(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("content/index.md", "# Home")
+        self.write("content/blog/post.md", "# Post")
+        self.write("template.html", "{{ Content }}")
+
+    def test_snapshot_covers_files_and_directories(self):
+        files = snapshot(["content", "template.html", "missing"])
+        self.assertEqual(
+            sorted(files),
+            ["content/blog/post.md", "content/index.md", "template.html"],
+        )
+
+    def test_changed_paths(self):
+        before = snapshot(["content"])
+        self.write("content/index.md", "# Home, edited")
+        self.write("content/new.md", "# New")
+        os.remove("content/blog/post.md")
+        after = snapshot(["content"])
+        self.assertEqual(
+            changed_paths(before, after),
+            ["content/blog/post.md", "content/index.md", "content/new.md"],
+        )
+
+    def test_watch_reports_changes(self):
+        seen = []
+        polls = []
+
+        def stop():
+            polls.append(None)
+            if len(polls) == 2:
+                self.write("content/new.md", "# New")
+            return len(polls) > 3
+
+        watch(["content"], seen.append, interval=0, stop=stop)
+        self.assertEqual(seen, [["content/new.md"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
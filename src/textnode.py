@@ -1,5 +1,7 @@
 from enum import Enum
 from htmlnode import LeafNode, ParentNode
+from images import PageImages
+from profiling import stage, timed_iter
 import re
 
 
@@ -21,7 +23,16 @@ class BlockType(Enum):
     ORDERED_LIST = "ordered_list"
 
 
+INLINE_TEXT_TYPES = {
+    "bold": TextType.BOLD,
+    "italic": TextType.ITALIC,
+    "code": TextType.CODE,
+}
+
+
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -127,123 +138,349 @@ def split_nodes_link(nodes):
     return new_nodes
 
 
+# Every inline construct in one alternation, so a single left-to-right scan
+# tokenizes a text run. Alternatives are tried in this order at each
+# position; a delimiter that reaches the last one has no closing partner.
+# Link text and URLs stop short of an image, so images win wherever
+# they start, as they did when split_nodes_image ran first.
+INLINE_PATTERN = re.compile(
+    r"!\[(?P<image_alt>[^\]]*)\]\((?P<image_url>[^)]*)\)"
+    r"|(?<!\!)\[(?P<link_text>[^\[\]]*)\]\((?P<link_url>(?:[^)!]|!(?!\[))*)\)"
+    r"|\*\*(?P<bold>.*?)\*\*"
+    r"|_(?P<italic>.*?)_"
+    r"|`(?P<code>.*?)`"
+    r"|(?P<unmatched>\*\*|_|`)"
+)
+
+
 def text_to_text_nodes(text):
-    node = TextNode(text, TextType.TEXT)
-    splits = [
-        ("**", TextType.BOLD),
-        ("_", TextType.ITALIC),
-        ("`", TextType.CODE),
-    ]
-    nodes = [node]
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-    for split in splits:
-        delimiter, text_type = split
-        nodes = split_nodes_delimiter(nodes, delimiter, text_type)
+    nodes = []
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "unmatched":
+            raise Exception(
+                "There must be a matching closing delimiter for each delimiter"
+            )
+        start = match.start()
+        if start > position:
+            nodes.append(TextNode(text[position:start], TextType.TEXT))
+        position = match.end()
+
+        if kind == "image_url":
+            nodes.append(
+                TextNode(match["image_alt"], TextType.IMAGE, match["image_url"])
+            )
+        elif kind == "link_url":
+            nodes.append(TextNode(match["link_text"], TextType.LINK, match["link_url"]))
+        else:
+            content = match[kind]
+            if content:
+                nodes.append(TextNode(content, INLINE_TEXT_TYPES[kind]))
 
+    if position < len(text):
+        nodes.append(TextNode(text[position:], TextType.TEXT))
     return nodes
 
 
+def markdown_lines(markdown):
+    # Accepts the whole document as a string or anything that yields lines,
+    # such as an open file, so callers never need the full text in memory.
+    if isinstance(markdown, str):
+        return markdown.split("\n")
+    return (line.rstrip("\r\n") for line in markdown)
+
+
+def is_fence(line):
+    return line.startswith("```")
+
+
+def parse_blocks(lines):
+    # Single pass over the lines: a block ends at a blank line (or at its
+    # closing fence for code), and its type is worked out line by line as
+    # it is read, so nothing is split or scanned twice.
+    block = []
+    fenced = False
+    quote = unordered = ordered = True
+
+    def finish():
+        with stage("block_type"):
+            block[-1] = block[-1].rstrip()
+            first = block[0].split(" ", maxsplit=1)[0]
+            if first and len(first) <= 6 and first.count("#") == len(first):
+                return BlockType.HEADING, block
+            if quote:
+                return BlockType.QUOTE, block
+            if unordered:
+                return BlockType.UNORDERED_LIST, block
+            if ordered:
+                return BlockType.ORDERED_LIST, block
+            return BlockType.PARAGRAPH, block
+
+    for line in lines:
+        if fenced:
+            block.append(line)
+            if line.strip() == "```":
+                yield BlockType.CODE, block
+                block = []
+                fenced = False
+            continue
+
+        if not line.strip():
+            if block:
+                yield finish()
+                block = []
+                quote = unordered = ordered = True
+            continue
+
+        if not block:
+            line = line.lstrip()
+            if is_fence(line):
+                block.append(line)
+                fenced = True
+                continue
+
+        quote = quote and line[0] == ">"
+        unordered = unordered and line[0] == "-"
+        ordered = ordered and line.startswith(f"{len(block) + 1}.")
+        block.append(line)
+
+    if fenced:
+        yield BlockType.CODE, block
+    elif block:
+        yield finish()
+
+
 def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    blocks = [block.strip() for block in blocks if block != ""]
-    return blocks
+    return ["\n".join(lines) for _, lines in parse_blocks(markdown_lines(markdown))]
 
 
 def block_to_block_type(block):
-    lines = [line for line in block.split("\n") if line != ""]
-    first = lines[0].split(" ", maxsplit=1)[0]
-    last = lines[-1].split(" ", maxsplit=1)[-1]
-
-    if all(char == "#" for char in first) and len(first) <= 6:
-        return BlockType.HEADING
-    elif first == "```" and last == "```":
-        return BlockType.CODE
-    elif all(line[0] == ">" for line in lines):
-        return BlockType.QUOTE
-    elif all(line[0] == "-" for line in lines):
-        return BlockType.UNORDERED_LIST
-    elif all(re.match(rf"^{index + 1}\.\s*", line) for index, line in enumerate(lines)):
-        return BlockType.ORDERED_LIST
-    else:
-        return BlockType.PARAGRAPH
-
-
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    node_children = []
-    for block in blocks:
-        block_type = block_to_block_type(block)
-        match block_type:
-            case BlockType.PARAGRAPH:
-                node_children.append(paragraph_markdown_to_html_node(block))
-                continue
-            case BlockType.HEADING:
-                node_children.append(heading_markdown_to_html_node(block))
-                continue
-            case BlockType.CODE:
-                node_children.append(code_markdown_to_html_node(block))
-                continue
-            case BlockType.QUOTE:
-                node_children.append(quote_markdown_to_html_node(block))
-                continue
-            case BlockType.UNORDERED_LIST:
-                node_children.append(unordered_list_markdown_to_html_node(block))
-                continue
-            case BlockType.ORDERED_LIST:
-                node_children.append(ordered_list_markdown_to_html_node(block))
-                continue
-
-    return ParentNode("div", node_children)
+    for block_type, _ in parse_blocks(markdown_lines(block)):
+        return block_type
+    return BlockType.PARAGRAPH
+
+
+def node_records(text_nodes):
+    # TextNodes as plain lists, the way the block cache stores them.
+    return [[node.text, node.text_type.value, node.url] for node in text_nodes]
+
+
+def nodes_from_records(records):
+    return [TextNode(text, TextType(kind), url) for text, kind, url in records]
+
+
+WORDS_PER_MINUTE = 200
+WORD_PATTERN = re.compile(r"\w+(?:['’]\w+)*")
+SLUG_DROP = re.compile(r"[^\w\s-]")
+SLUG_JOIN = re.compile(r"[\s-]+")
+
+
+def slugify(text):
+    slug = SLUG_JOIN.sub("-", SLUG_DROP.sub("", text.lower())).strip("-")
+    return slug or "section"
+
+
+def block_summary(block_type, text_nodes):
+    # What one block adds to its page's PageMetadata, as a [words, links,
+    # images] list the block cache can keep next to the block's html.
+    # Code is skimmed rather than read, and holds no links or images.
+    if block_type is BlockType.CODE:
+        return [0, [], []]
+    text = []
+    links = []
+    images = []
+    for text_node in text_nodes:
+        text_type = text_node.text_type
+        if text_type is TextType.IMAGE:
+            images.append({"src": text_node.url, "alt": text_node.text})
+            continue
+        if text_type is TextType.LINK:
+            links.append(text_node.url)
+        text.append(text_node.text)
+    return [len(WORD_PATTERN.findall(" ".join(text))), links, images]
+
+
+class PageMetadata:
+    # What a page says about itself, gathered by markdown_to_page from the
+    # same TextNodes the page is rendered from: the title (its first h1),
+    # an outline of its headings with the ids they get in the html, the
+    # links and images it refers to, and how long it takes to read.
+    def __init__(self):
+        self.title = None
+        self.outline = []
+        self.links = []
+        self.images = []
+        self.words = 0
+        self.ids = set()
+
+    def add_heading(self, node, text_nodes):
+        # Gives a heading node an id no other heading on the page has.
+        text = "".join(text_node.text for text_node in text_nodes).strip()
+        level = int(node.tag[1:])
+        slug = base = slugify(text)
+        suffix = 1
+        while slug in self.ids:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        self.ids.add(slug)
+        node.props = {"id": slug}
+        if level == 1 and self.title is None:
+            self.title = text
+        self.outline.append({"level": level, "text": text, "id": slug})
+
+    def add_summary(self, summary):
+        words, links, images = summary
+        self.words += words
+        self.links.extend(links)
+        self.images.extend(images)
+
+    def reading_time(self):
+        # In whole minutes, rounded up.
+        return -(-self.words // WORDS_PER_MINUTE)
+
+    def result(self):
+        return {
+            "title": self.title,
+            "outline": self.outline,
+            "links": self.links,
+            "images": self.images,
+            "words": self.words,
+            "reading_time": self.reading_time(),
+        }
+
+
+def markdown_to_html_node(markdown, block_cache=None, image_size=None, collector=None):
+    node, _ = markdown_to_page(markdown, block_cache, image_size, collector)
+    return node
 
 
-def ordered_list_markdown_to_html_node(block):
-    lines = block.split("\n")
+def markdown_to_page(markdown, block_cache=None, image_size=None, collector=None):
+    # Returns the page's html node and its PageMetadata, from one pass over
+    # the markdown. image_size looks up (width, height) for an image URL;
+    # see images.py. collector, if given, has add_block(block_type, lines,
+    # text_nodes) called for every block in order, with the inline
+    # TextNodes the page was rendered from, so it can gather more without a
+    # second parse.
+    node_children = []
+    images = PageImages(image_size)
+    metadata = PageMetadata()
+    blocks = timed_iter("block_split", parse_blocks(markdown_lines(markdown)))
+    for block_type, lines in blocks:
+        text_nodes = []
+        # Image attributes depend on the image files, and heading ids on
+        # the other headings, so neither kind of block is ever cached.
+        has_images = any("![" in line for line in lines)
+        heading = block_type is BlockType.HEADING
+        if block_cache is None or has_images or heading:
+            with stage("inline_parse"):
+                node = BLOCK_BUILDERS[block_type](lines, text_nodes)
+            if has_images:
+                images.decorate(node)
+            if heading:
+                metadata.add_heading(node, text_nodes)
+            node_children.append(node)
+            summary = block_summary(block_type, text_nodes)
+        else:
+            # A cached block is spliced in as its finished html, without
+            # building any HTMLNodes for it.
+            with stage("block_cache"):
+                key = block_cache.key(lines)
+                entry = block_cache.get(key)
+            if entry is None:
+                with stage("inline_parse"):
+                    node = BLOCK_BUILDERS[block_type](lines, text_nodes)
+                with stage("serialize"):
+                    html = node.to_html(block_cache.rewrite_url)
+                summary = block_summary(block_type, text_nodes)
+                with stage("block_cache"):
+                    block_cache.put(key, html, summary, node_records(text_nodes))
+            else:
+                # The block's metadata comes with it, so only a collector
+                # ever needs its inline nodes back.
+                html, summary, records = entry
+                if collector is not None:
+                    text_nodes = nodes_from_records(records)
+            node_children.append(LeafNode(None, html))
+        metadata.add_summary(summary)
+        if collector is not None:
+            collector.add_block(block_type, lines, text_nodes)
+    return ParentNode("div", node_children), metadata
+
+
+def page_title(lines):
+    # The text of the first h1 in lines, as PageMetadata would have it,
+    # reading no further than that heading; None if there isn't one.
+    for block_type, block in parse_blocks(markdown_lines(lines)):
+        if block_type is BlockType.HEADING and block[0].split(" ", 1)[0] == "#":
+            text_nodes = []
+            heading_markdown_to_html_node(block, text_nodes)
+            return "".join(text_node.text for text_node in text_nodes).strip()
+    return None
+
+
+# The block builders append the TextNodes they build to text_nodes, when
+# it is given, for markdown_to_page's metadata and collector.
+
+
+def ordered_list_markdown_to_html_node(lines, text_nodes=None):
     children = []
-    for line in lines:
-        item_text = re.sub(r"^\d+\.\s*", "", line)
-        children.append(ParentNode("li", text_to_children(item_text)))
+    for index, line in enumerate(lines):
+        item_text = line[len(str(index + 1)) + 1 :].lstrip()
+        children.append(ParentNode("li", text_to_children(item_text, text_nodes)))
     return ParentNode("ol", children)
 
 
-def unordered_list_markdown_to_html_node(block):
-    lines = block.split("\n")
+def unordered_list_markdown_to_html_node(lines, text_nodes=None):
     children = []
     for line in lines:
-        item_text = re.sub(r"^-\s*", "", line)
-        children.append(ParentNode("li", text_to_children(item_text)))
+        item_text = line[1:].lstrip()
+        children.append(ParentNode("li", text_to_children(item_text, text_nodes)))
     return ParentNode("ul", children)
 
 
-def quote_markdown_to_html_node(block):
-    lines = block.split("\n")
-    stripped = [re.sub(r"^>\s*", "", line) for line in lines]
-    item_text = " ".join(stripped)
-    return ParentNode("blockquote", text_to_children(item_text))
+def quote_markdown_to_html_node(lines, text_nodes=None):
+    item_text = " ".join(line[1:].lstrip() for line in lines)
+    return ParentNode("blockquote", text_to_children(item_text, text_nodes))
 
 
-def code_markdown_to_html_node(block):
-    text_node = TextNode(block[4:-3], TextType.CODE)
+def code_markdown_to_html_node(lines, text_nodes=None):
+    closed = len(lines) > 1 and lines[-1].strip() == "```"
+    inner = lines[1:-1] if closed else lines[1:]
+    code = "\n".join(inner) + "\n" if inner else ""
+    text_node = TextNode(code, TextType.CODE)
+    if text_nodes is not None:
+        text_nodes.append(text_node)
     code_node = text_node_to_html_node(text_node)
     return ParentNode("pre", [code_node])
 
 
-def paragraph_markdown_to_html_node(block):
-    children = text_to_children(block)
+def paragraph_markdown_to_html_node(lines, text_nodes=None):
+    children = text_to_children(" ".join(lines), text_nodes)
     return ParentNode("p", children)
 
 
-def heading_markdown_to_html_node(block):
-    first = block.split(" ", maxsplit=1)[0]
-    text = block.split(" ", maxsplit=1)[1]
-    tag = f"h{len(first)}"
-    children = text_to_children(text)
-    node = ParentNode(tag, children)
+def heading_markdown_to_html_node(lines, text_nodes=None):
+    parts = lines[0].split(" ", maxsplit=1)
+    text = " ".join(parts[1:] + lines[1:])
+    children = text_to_children(text, text_nodes)
+    node = ParentNode(f"h{len(parts[0])}", children)
     return node
 
 
-def text_to_children(text):
-    text = " ".join(text.split("\n"))
+BLOCK_BUILDERS = {
+    BlockType.PARAGRAPH: paragraph_markdown_to_html_node,
+    BlockType.HEADING: heading_markdown_to_html_node,
+    BlockType.CODE: code_markdown_to_html_node,
+    BlockType.QUOTE: quote_markdown_to_html_node,
+    BlockType.UNORDERED_LIST: unordered_list_markdown_to_html_node,
+    BlockType.ORDERED_LIST: ordered_list_markdown_to_html_node,
+}
+
+
+def text_to_children(text, collected=None):
     text_nodes = text_to_text_nodes(text)
+    if collected is not None:
+        collected.extend(text_nodes)
     html_nodes = [text_node_to_html_node(text_node) for text_node in text_nodes]
     return html_nodes
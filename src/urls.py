@@ -0,0 +1,20 @@
+import functools
+
+
+@functools.lru_cache(maxsize=32)
+def basepath_rewriter(basepath, rewrite_url=None):
+    # Site-absolute URLs ("/blog/tom") get the basepath in front of them;
+    # relative, external and protocol-relative URLs are left alone. An extra
+    # rewrite_url hook sees the URL first. Cached so every page of a build
+    # shares one function (and so one compiled template); bounded, since a
+    # watch or daemon process sees a new asset map hook on every asset edit.
+    prefix = "/" + basepath.strip("/") + "/" if basepath.strip("/") else "/"
+
+    def rewrite(url):
+        if rewrite_url is not None:
+            url = rewrite_url(url)
+        if url.startswith("/") and not url.startswith("//"):
+            return prefix + url[1:]
+        return url
+
+    return rewrite